@@ -2,51 +2,56 @@ from typing import Dict, Any, List, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.documents import Document
 
-from app.agents.base import BaseAgent
-from app.services.ollama_service import OllamaService
+from app.agents.base import BaseAgent, PreparedPrompt
 from app.core.logger import logger
 
-# Initialize services needed
-ollama_service = OllamaService()
-
 class AdmissionsAgent(BaseAgent):
     """Agent specialized in Concordia Computer Science admissions."""
 
+    # Answers strictly from the retrieved Concordia documents
+    uses_retrieval = True
+    # Faithfulness to long retrieved documents needs the large model
+    model_tier = "large"
+    # Weak signals on their own (could be a job application, a paper deadline, ...) weigh less
+    routing_keywords = {
+        "concordia": 0.8, "admission": 0.8, "admit": 0.8, "admitted": 0.8, "requirement": 0.8,
+        "prerequisite": 0.8, "gpa": 0.8, "r-score": 0.8, "cegep": 0.8, "computer science": 0.8,
+        "bcompsc": 0.8, "tuition": 0.8, "apply": 0.4, "applying": 0.4, "application": 0.4, "deadline": 0.4,
+    }
+    routing_exemplars = [
+        "What are the admission requirements for Computer Science at Concordia?",
+        "What R-score do I need to get into the BCompSc program?",
+        "Which CEGEP math courses are prerequisites for computer science?",
+        "When is the application deadline for undergraduate programs?",
+        "How much is tuition for the computer science degree?",
+        "Can I apply to Concordia as an international student?",
+        "What GPA do I need to transfer into computer science?",
+        "Do I need Calculus and Linear Algebra to be admitted?",
+        "What English proficiency test scores does Concordia accept?",
+        "How do I submit my application to Concordia University?",
+    ]
+
     def get_name(self) -> str:
         return "AdmissionsAgent"
 
     async def should_handle(self, query: str, history: list[Dict[str, str]]) -> float:
         """
         Determines if this agent should handle the query.
-        Higher confidence for admission-related keywords.
+        Higher confidence for admission-related keywords (whole words, weighted).
         """
-        keywords = ["admission", "admit", "apply", "application", "requirement", "prerequisite", "gpa", "r-score", "cegep", "deadline", "tuition", "computer science", "bcompsc"]
-        query_lower = query.lower()
-        score = 0.1
-        if "concordia" in query_lower or any(keyword in query_lower for keyword in keywords):
-            score += 0.8
-            logger.debug(f"{self.get_name()} handling score boosted by keywords.")
-        # TODO: Improve using embeddings against representative admissions queries
+        hits = self.keyword_hits(query)
+        score = 0.1 + hits.score(self.get_name(), cap=0.8)
+        if hits.matched(self.get_name()):
+            logger.debug(f"{self.get_name()} handling score boosted by keywords {hits.phrases(self.get_name())}.")
+        # Embedding-based routing (AgentService.router) is preferred when available
         return min(score, 1.0)
 
-    async def process(self, query: str, history: list[Dict[str, str]], context_docs: list[Document] = None) -> str:
-        """Processes an admissions query using retrieved context documents."""
-        logger.info(f"{self.get_name()} processing query: '{query}'")
-
-        # Context documents (containing scraped info) are passed in by ChatService
-        formatted_context = "\n\n".join([f"Source {i+1} ({doc.metadata.get('source', 'Unknown')}):\n{doc.page_content}" for i, doc in enumerate(context_docs or [])])
-
-        if not formatted_context:
-             logger.warning("AdmissionsAgent received no context documents for RAG.")
-             # Provide a clearer message if context is missing
-             return "I currently lack the specific documents needed to answer that question about Concordia admissions. Please try rephrasing or asking a different question."
-
-
-        # --- Prepare New Prompt ---
-        prompt = ChatPromptTemplate.from_messages([
+    def build_prompt(self) -> ChatPromptTemplate:
+        """Admissions RAG prompt; retrieved documents are passed in as `context`."""
+        return ChatPromptTemplate.from_messages([
             ("system", f"""You are the {self.get_name()}, a specialized AI assistant providing information about **undergraduate Computer Science (BCompSc - General Program)** admissions at Concordia University.
 
-Your task is to answer the user's query based **strictly and solely** on the information contained within the provided 'Context Documents' below. These documents are extracts from the official Concordia University website. Do not use any external knowledge or make assumptions beyond what is stated in the context.
+Your task is to answer the user's query based **strictly and solely** on the information contained within the 'Context Documents' provided right before the user's question. These documents are extracts from the official Concordia University website. Do not use any external knowledge or make assumptions beyond what is stated in the context.
 
 **Instructions:**
 
@@ -54,22 +59,31 @@ Your task is to answer the user's query based **strictly and solely** on the inf
 2.  **Synthesize for General Queries:** If the user asks a general question like \"What are the admission requirements?"", carefully review all provided context documents. Extract the key requirements (e.g., minimum R-score overall, minimum Math R-score, required CEGEP/High School courses like Calculus/Linear Algebra/Physics, English proficiency standards, application deadlines if mentioned) specifically mentioned for the BCompSc General Program. Present these requirements clearly, preferably as a bulleted list.
 3.  **Specific Queries:** Answer specific questions directly using the relevant information found in the context.
 4.  **Missing Information:** If the provided context documents do not contain the specific information needed to answer the user's question about the BCompSc General Program, clearly state that the information is not available in the documents you have access to. Do not attempt to guess or provide information from outside the context.
-5.  **Tone:** Be helpful, accurate, and polite.
-
-Context Documents:
--------------------
-{formatted_context}
--------------------"""),
+5.  **Tone:** Be helpful, accurate, and polite."""),
             MessagesPlaceholder(variable_name="history"),
+            # Per-turn material goes after the history so the prefix above stays identical across turns
+            ("system", "Context Documents:\n-------------------\n{context}\n-------------------"),
             ("human", "{query}"),
         ])
 
+    async def prepare(self, query: str, history: list[Dict[str, str]], context_docs: list[Document] = None) -> PreparedPrompt:
+        """Builds the admissions prompt from the retrieved context documents."""
+        logger.info(f"{self.get_name()} processing query: '{query}'")
+
+        # Context documents (containing scraped info) are passed in by ChatService
+        formatted_context = "\n\n".join([f"Source {i+1} ({doc.metadata.get('source', 'Unknown')}):\n{doc.page_content}" for i, doc in enumerate(context_docs or [])])
+
+        if not formatted_context:
+             logger.warning("AdmissionsAgent received no context documents for RAG.")
+             # Provide a clearer message if context is missing
+             return PreparedPrompt(direct_response="I currently lack the specific documents needed to answer that question about Concordia admissions. Please try rephrasing or asking a different question.")
+
+        # --- Prompt Inputs (the template itself is built once, in build_prompt) ---
         inputs = {
             "query": query,
-            "history": history
-            # Context is injected into system prompt
+            "history": history,
+            "context": formatted_context,
         }
 
-        # --- Call LLM ---
-        response = await ollama_service.generate_response(prompt, inputs)
-        return response 
\ No newline at end of file
+        # LLM call (blocking or streaming) is made by BaseAgent.process / process_stream
+        return PreparedPrompt(prompt=self.prompt, inputs=inputs) 
\ No newline at end of file
@@ -2,45 +2,85 @@ from typing import Dict, Any, List, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
-from app.agents.base import BaseAgent
-from app.services.ollama_service import OllamaService
-from app.services.knowledge_service import KnowledgeService # Uses ArXiv, GitHub
+from app.agents.base import BaseAgent, PreparedPrompt
 from app.core.logger import logger
 
-# Initialize services needed
-ollama_service = OllamaService()
-knowledge_service = KnowledgeService()
-
 class AIExpertAgent(BaseAgent):
     """Agent specialized in AI, ML, and related technical topics."""
 
+    # Technical explanations need the large model
+    model_tier = "large"
+    # "ai", "code" and "paper" also show up in everyday questions, so they weigh less
+    routing_keywords = {
+        "artificial intelligence": 0.8, "machine learning": 0.8, "deep learning": 0.8, "neural network": 0.8,
+        "transformer": 0.8, "llm": 0.8, "arxiv": 0.8, "github": 0.8, "algorithm": 0.8, "pytorch": 0.8,
+        "tensorflow": 0.8, "ai": 0.6, "paper": 0.4, "code": 0.4,
+    }
+    tool_triggers = {
+        "arxiv": {"paper": 1.0, "arxiv": 1.0},
+        # Repository search only on explicit requests
+        "github": {
+            phrase: 1.0 for phrase in (
+                "find github", "search github", "show github", "look for github",
+                "find repository", "find repositories", "search repository", "search repositories",
+                "show repository", "show repositories", "look for repository", "look for repositories",
+            )
+        },
+        # Mentions code without asking for repositories (logged only for now)
+        "code": {"code": 1.0, "implementation": 1.0},
+    }
+    routing_exemplars = [
+        "How does the transformer attention mechanism work?",
+        "Explain the difference between supervised and unsupervised learning.",
+        "Find recent arXiv papers on large language models.",
+        "What is backpropagation in a neural network?",
+        "Show me GitHub repositories for diffusion models.",
+        "How do I fine-tune a model with PyTorch?",
+        "What are the best algorithms for reinforcement learning?",
+        "Compare TensorFlow and PyTorch for deep learning.",
+        "What is retrieval-augmented generation?",
+        "How can I reduce overfitting when training a CNN?",
+    ]
+
     def get_name(self) -> str:
         return "AIExpertAgent"
 
     async def should_handle(self, query: str, history: list[Dict[str, str]]) -> float:
         """
         Determines if this agent should handle the query.
-        Higher confidence for AI/ML terms, papers, code, technical questions.
+        Higher confidence for AI/ML terms, papers, code, technical questions (whole words, weighted).
         """
-        keywords = ["ai", "artificial intelligence", "machine learning", "deep learning", "neural network", "transformer", "llm", "paper", "arxiv", "github", "code", "algorithm", "pytorch", "tensorflow"]
-        query_lower = query.lower()
-        score = 0.1
-        if any(keyword in query_lower for keyword in keywords):
-            score += 0.8
-            logger.debug(f"{self.get_name()} handling score boosted by keywords.")
-        # TODO: Improve using embeddings against representative AI queries
+        hits = self.keyword_hits(query)
+        score = 0.1 + hits.score(self.get_name(), cap=0.8)
+        if hits.matched(self.get_name()):
+            logger.debug(f"{self.get_name()} handling score boosted by keywords {hits.phrases(self.get_name())}.")
+        # Embedding-based routing (AgentService.router) is preferred when available
         return min(score, 1.0)
 
-    async def process(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> str:
-        """Processes an AI/ML query, potentially using ArXiv/GitHub."""
+    def build_prompt(self) -> ChatPromptTemplate:
+        """AI/ML prompt; ArXiv/GitHub results are passed in as `tool_results`."""
+        return ChatPromptTemplate.from_messages([
+            ("system", f"""You are the {self.get_name()}, specializing in AI, Machine Learning, and related technical topics.
+Answer the user's question clearly and concisely based on the conversation history and any provided tool results (ArXiv papers, GitHub repos).
+Explain technical concepts accurately."""),
+            MessagesPlaceholder(variable_name="history"),
+            # Per-turn material goes after the history so the prefix above stays identical across turns
+            ("system", "Tool Results:\n{tool_results}"),
+            ("human", "{query}"),
+        ])
+
+    async def prepare(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> PreparedPrompt:
+        """Prepares an AI/ML query, potentially gathering ArXiv/GitHub results."""
         logger.info(f"{self.get_name()} processing query: '{query}'")
 
         # --- Tool Use ---
         tool_results_str = ""
+        # Same (memoized) scan that scored the agents
+        hits = self.keyword_hits(query)
         # Simple logic: If query asks for papers or code, use tools
-        if "paper" in query.lower() or "arxiv" in query.lower():
+        if hits.matched(self.tool_group("arxiv")):
             logger.debug("AIExpertAgent searching ArXiv...")
-            papers = await knowledge_service.search_arxiv(query, max_results=2)
+            papers = await self.knowledge_service.search_arxiv(query, max_results=2)
             if papers:
                 tool_results_str += "\n\nRelevant ArXiv Papers Found:\n" + "\n---\n".join([
                     f"Title: {p.get('title', 'N/A')}\nAuthors: {', '.join(p.get('authors',[]))}\nURL: {p.get('pdf_url', 'N/A')}\nSummary: {p.get('summary', 'N/A')[:200]}..."
@@ -49,48 +89,29 @@ class AIExpertAgent(BaseAgent):
                 logger.debug("Added ArXiv results to context.")
 
         # Refined logic: Trigger GitHub search on more specific action phrases
-        query_lower = query.lower()
-        github_action_phrases = [
-            "find github", "search github", "show github", "look for github",
-            "find repository", "find repositories", "search repository", "search repositories",
-            "show repository", "show repositories", "look for repository", "look for repositories"
-        ]
-        trigger_github_search = any(phrase in query_lower for phrase in github_action_phrases)
+        trigger_github_search = hits.matched(self.tool_group("github"))
 
         if trigger_github_search:
              logger.debug("AIExpertAgent searching GitHub Repos based on action phrase...")
              # Note: This call is currently blocking
-             repos = await knowledge_service.search_github_repos(query, max_results=2)
+             repos = await self.knowledge_service.search_github_repos(query, max_results=2)
              if repos:
                   tool_results_str += "\n\nRelevant GitHub Repositories Found:\n" + "\n---\n".join([
                      f"Name: {r.get('name', 'N/A')}\nURL: {r.get('url', 'N/A')}\nDescription: {r.get('description', 'N/A')}\nStars: {r.get('stars', 'N/A')}"
                      for r in repos
                   ])
                   logger.debug("Added GitHub repo results to context.")
-        elif "code" in query_lower or "implementation" in query_lower:
+        elif hits.matched(self.tool_group("code")):
              # Optional: Consider adding GitHub code search trigger here if desired later
              # For now, only trigger repo search on specific phrases
-             logger.debug(f"Query mentioned '{query_lower}' but didn't match specific GitHub action phrases; skipping GitHub repo search.")
-
-
-        # --- Prepare Prompt ---
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are the {self.get_name()}, specializing in AI, Machine Learning, and related technical topics.
-Answer the user's question clearly and concisely based on the conversation history and any provided tool results (ArXiv papers, GitHub repos).
-Explain technical concepts accurately.
-
-Tool Results:
-{tool_results_str}"""),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{query}"),
-        ])
+             logger.debug(f"Query mentioned {hits.phrases(self.tool_group('code'))} but didn't match specific GitHub action phrases; skipping GitHub repo search.")
 
+        # --- Prompt Inputs (the template itself is built once, in build_prompt) ---
         inputs = {
             "query": query,
-            "history": history
-            # Tool results injected into system prompt
+            "history": history,
+            "tool_results": tool_results_str,
         }
 
-        # --- Call LLM ---
-        response = await ollama_service.generate_response(prompt, inputs)
-        return response 
\ No newline at end of file
+        # LLM call (blocking or streaming) is made by BaseAgent.process / process_stream
+        return PreparedPrompt(prompt=self.prompt, inputs=inputs) 
\ No newline at end of file
@@ -1,15 +1,119 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, AsyncIterator
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
+from app.core.keywords import KeywordHits, KeywordMatcher
+from app.core.metrics import stage
+
+class PreparedPrompt:
+    """The prompt and inputs an agent wants sent to the LLM, or a direct reply that skips the LLM."""
+
+    def __init__(self, prompt: Optional[ChatPromptTemplate] = None, inputs: Optional[Dict[str, Any]] = None, direct_response: Optional[str] = None):
+        self.prompt = prompt
+        self.inputs = inputs or {}
+        self.direct_response = direct_response
 
 class BaseAgent(ABC):
-    """Abstract base class for all agents."""
+    """
+    Abstract base class for all agents.
+
+    Prompts are laid out for KV-cache reuse in Ollama: fixed instructions first, then the
+    conversation history, then per-turn material (tool results, retrieved documents) and
+    the query. Consecutive turns of a conversation then share everything up to the end of
+    the previous history, and all conversations of an agent share its system prompt.
+    """
+
+    # Shared services, injected by the AgentRegistry; ollama_service makes the final LLM call
+    ollama_service: Any = None
+    knowledge_service: Any = None
+    # Prompt template, built once per agent instance via build_prompt()
+    prompt: Optional[ChatPromptTemplate] = None
+    # Whether ChatService should retrieve RAG context documents for this agent
+    uses_retrieval: bool = False
+    # Representative queries for this agent; their mean embedding is its centroid in the
+    # EmbeddingRouter (overridable per deployment via AGENT_ROUTER_EXEMPLARS_FILE)
+    routing_exemplars: List[str] = []
+    # Keyword -> weight for the lexical should_handle() score
+    routing_keywords: Dict[str, float] = {}
+    # Tool name -> {trigger phrase: weight}; prepare() uses a tool when its triggers match
+    tool_triggers: Dict[str, Dict[str, float]] = {}
+    # Shared matcher over every agent's keywords and triggers, set by AgentService
+    keyword_matcher: Optional[KeywordMatcher] = None
+    # Model tier answering for this agent: "large" (OLLAMA_MODEL_NAME) or "small"
+    # (OLLAMA_SMALL_MODEL_NAME); AGENT_MODEL_TIERS overrides it per deployment
+    model_tier: str = "large"
+
+    def __init__(self, ollama_service: Any, knowledge_service: Any = None):
+        """
+        Args:
+            ollama_service: The process-wide OllamaService.
+            knowledge_service: The process-wide KnowledgeService (external tools), if the agent uses one.
+        """
+        self.ollama_service = ollama_service
+        self.knowledge_service = knowledge_service
+        self.prompt = self.build_prompt()
 
     @abstractmethod
     def get_name(self) -> str:
         """Returns the unique name of the agent."""
         pass
 
+    def keyword_groups(self) -> Dict[str, Dict[str, float]]:
+        """This agent's keyword groups for a KeywordMatcher: its routing keywords and each tool's triggers."""
+        groups = {self.get_name(): dict(self.routing_keywords)}
+        for tool, triggers in self.tool_triggers.items():
+            groups[self.tool_group(tool)] = dict(triggers)
+        return groups
+
+    def tool_group(self, tool: str) -> str:
+        return f"{self.get_name()}.{tool}"
+
+    def keyword_hits(self, query: str) -> KeywordHits:
+        """Keywords of every agent and tool found in the query (one memoized scan shared by all agents)."""
+        if self.keyword_matcher is None:
+            # Agent used on its own, outside AgentService
+            self.keyword_matcher = KeywordMatcher(self.keyword_groups())
+        return self.keyword_matcher.match(query)
+
+    def build_prompt(self) -> Optional[ChatPromptTemplate]:
+        """Builds the agent's prompt template. Called once at construction instead of per request."""
+        return None
+
+    def static_prefix(self) -> List[BaseMessage]:
+        """The leading prompt messages that are identical on every turn (those before the first template variable)."""
+        if self.prompt is None:
+            return []
+        static: List[BaseMessage] = []
+        for message in self.prompt.messages:
+            if isinstance(message, BaseMessage):
+                static.append(message)
+                continue
+            if message.input_variables:
+                break
+            static.extend(message.format_messages())
+        return static
+
+    def warm_up(self):
+        """Renders the prompt template once with placeholder inputs, paying one-off template costs before real traffic."""
+        if self.prompt is None:
+            return
+        placeholders = {name: "warm-up" for name in self.prompt.input_variables if name != "history"}
+        self.prompt.format_messages(history=[], **placeholders)
+
     @abstractmethod
+    async def prepare(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> PreparedPrompt:
+        """Runs everything that happens before the LLM call (tool use, prompt building).
+
+        Args:
+            query: The user's current query.
+            history: A list of past conversation turns.
+            context_docs: Optional list of relevant documents retrieved via RAG.
+
+        Returns:
+            A PreparedPrompt holding the prompt and its inputs, or a direct response.
+        """
+        pass
+
     async def process(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> str:
         """Processes the user query and returns the agent's response.
 
@@ -21,7 +125,43 @@ class BaseAgent(ABC):
         Returns:
             The agent's response as a string.
         """
-        pass
+        with stage("agent_prepare"):
+            prepared = await self.prepare(query, history, context_docs)
+        return await self.respond(prepared)
+
+    async def respond(self, prepared: PreparedPrompt) -> str:
+        """The LLM call for a prepared prompt (or its direct response)."""
+        if prepared.direct_response is not None:
+            return prepared.direct_response
+        return await self.ollama_service.generate_response(prepared.prompt, prepared.inputs, tier=self.model_tier)
+
+    async def process_stream(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> AsyncIterator[str]:
+        """Same as process(), but yields the response incrementally as the LLM produces tokens."""
+        with stage("agent_prepare"):
+            prepared = await self.prepare(query, history, context_docs)
+        async for chunk in self.respond_stream(prepared):
+            yield chunk
+
+    async def respond_stream(self, prepared: PreparedPrompt) -> AsyncIterator[str]:
+        """Streaming variant of respond()."""
+        if prepared.direct_response is not None:
+            yield prepared.direct_response
+            return
+        async for chunk in self.ollama_service.stream_response(prepared.prompt, prepared.inputs, tier=self.model_tier):
+            yield chunk
+
+    @staticmethod
+    def evidence(prepared: PreparedPrompt) -> str:
+        """
+        The material prepare() gathered for the LLM (tool results, context documents), i.e.
+        every text input but the query; or the direct response. Used to judge hedged runs.
+        """
+        if prepared.direct_response is not None:
+            return prepared.direct_response
+        return "\n".join(
+            value for name, value in prepared.inputs.items()
+            if name not in ("query", "history") and isinstance(value, str) and value.strip()
+        )
 
     @abstractmethod
     async def should_handle(self, query: str, history: list[Dict[str, str]]) -> float:
@@ -34,4 +174,4 @@ class BaseAgent(ABC):
         Returns:
             A float score between 0.0 (definitely not) and 1.0 (definitely should).
         """
-        pass 
\ No newline at end of file
+        pass
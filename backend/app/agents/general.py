@@ -2,18 +2,28 @@
 from typing import Dict, Any, List, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
-from app.agents.base import BaseAgent
-from app.services.ollama_service import OllamaService
-from app.services.knowledge_service import KnowledgeService # Uses WebSearch, Wikipedia
+from app.agents.base import BaseAgent, PreparedPrompt
 from app.core.logger import logger
 
-# Initialize services needed
-ollama_service = OllamaService()
-knowledge_service = KnowledgeService()
-
 class GeneralAgent(BaseAgent):
     """Agent for handling general knowledge questions."""
 
+    # Summarizes search results; AGENT_MODEL_TIERS=GeneralAgent=small hands it to the small model
+    model_tier = "large"
+    routing_keywords = {"wikipedia": 0.2, "search": 0.2, "what is": 0.2}
+    routing_exemplars = [
+        "What is the capital of Australia?",
+        "Who wrote Pride and Prejudice?",
+        "Tell me about the history of Montreal.",
+        "What is photosynthesis?",
+        "Search the web for today's weather forecast.",
+        "How many planets are in the solar system?",
+        "Who was the first person to walk on the moon?",
+        "Explain how inflation works.",
+        "What's a good recipe for pancakes?",
+        "Look up the Wikipedia article on the Roman Empire.",
+    ]
+
     def get_name(self) -> str:
         return "GeneralAgent"
 
@@ -25,29 +35,43 @@ class GeneralAgent(BaseAgent):
         # This agent is often the fallback, so starts with a moderate score
         score = 0.5
         # Can add logic to slightly decrease score if AI or Admissions keywords are present
-        if "wikipedia" in query.lower() or "search" in query.lower() or "what is" in query.lower():
-            score = min(score + 0.2, 1.0) # Slightly boost for explicit requests
-            logger.debug(f"{self.get_name()} handling score boosted by keywords.")
+        hits = self.keyword_hits(query)
+        if hits.matched(self.get_name()):
+            score = min(score + hits.score(self.get_name(), cap=0.2), 1.0) # Slightly boost for explicit requests
+            logger.debug(f"{self.get_name()} handling score boosted by keywords {hits.phrases(self.get_name())}.")
 
         # TODO: Reduce score if AI/Admissions keywords are strong?
         return score
 
-    async def process(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> str:
-        """Processes a general query, potentially using Web Search or Wikipedia."""
+    def build_prompt(self) -> ChatPromptTemplate:
+        """General-knowledge prompt; Wikipedia/web results are passed in as `tool_results`."""
+        return ChatPromptTemplate.from_messages([
+            ("system", f"""You are the {self.get_name()}, a helpful AI assistant designed to answer general knowledge questions.
+Use the conversation history and the provided external information (Wikipedia summary or Web Search results) if available and relevant.
+If no external information is provided or relevant, answer based on your general knowledge.
+Be concise and informative."""),
+            MessagesPlaceholder(variable_name="history"),
+            # Per-turn material goes after the history so the prefix above stays identical across turns
+            ("system", "External Information Found:\n{tool_results}"),
+            ("human", "{query}"),
+        ])
+
+    async def prepare(self, query: str, history: list[Dict[str, str]], context_docs: list[Any] = None) -> PreparedPrompt:
+        """Prepares a general query, potentially gathering Web Search or Wikipedia results."""
         logger.info(f"{self.get_name()} processing query: '{query}'")
 
         # --- Tool Use (Example: Prioritize Wikipedia Summary, then Web Search) ---
         tool_results_str = ""
         # 1. Try Wikipedia Summary
         # Note: Blocking call
-        wiki_summary = await knowledge_service.get_wikipedia_summary(query, sentences=3)
+        wiki_summary = await self.knowledge_service.get_wikipedia_summary(query, sentences=3)
         if wiki_summary:
             logger.debug("Found Wikipedia summary, using as context.")
             tool_results_str = f"Wikipedia Summary for '{query}':\n{wiki_summary}"
         else:
             # 2. If no Wiki summary, try Web Search
             logger.debug("No Wikipedia summary found, trying web search...")
-            web_results = await knowledge_service.search_web(query, max_results=3)
+            web_results = await self.knowledge_service.search_web(query, max_results=3)
             if web_results:
                 tool_results_str = "Relevant Web Search Results:\n" + "\n---\n".join([
                     f"Title: {r.get('title', 'N/A')}\nURL: {r.get('href', 'N/A')}\nSnippet: {r.get('body', 'N/A')}"
@@ -58,26 +82,12 @@ class GeneralAgent(BaseAgent):
                  logger.debug("No relevant tool results found for general query.")
                  tool_results_str = "No specific external information found for this query."
 
-
-        # --- Prepare Prompt ---
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are the {self.get_name()}, a helpful AI assistant designed to answer general knowledge questions.
-Use the conversation history and the provided external information (Wikipedia summary or Web Search results) if available and relevant.
-If no external information is provided or relevant, answer based on your general knowledge.
-Be concise and informative.
-
-External Information Found:
-{tool_results_str}"""),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{query}"),
-        ])
-
+        # --- Prompt Inputs (the template itself is built once, in build_prompt) ---
         inputs = {
             "query": query,
-            "history": history
-            # External info injected into system prompt
+            "history": history,
+            "tool_results": tool_results_str,
         }
 
-        # --- Call LLM ---
-        response = await ollama_service.generate_response(prompt, inputs)
-        return response 
\ No newline at end of file
+        # LLM call (blocking or streaming) is made by BaseAgent.process / process_stream
+        return PreparedPrompt(prompt=self.prompt, inputs=inputs) 
\ No newline at end of file
@@ -0,0 +1,129 @@
+# backend/app/agents/registry.py
+import importlib
+from importlib.metadata import entry_points
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
+
+from app.agents.base import BaseAgent
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.ollama_service import MODEL_TIERS
+
+# Entry point group through which installed packages can contribute agents:
+#   [project.entry-points."chatbot.agents"]
+#   MyAgent = "my_package.agents:MyAgent"
+ENTRY_POINT_GROUP = "chatbot.agents"
+
+# Agents shipped with the backend, as "module:Class" so only enabled ones are imported
+BUILTIN_AGENTS: Dict[str, str] = {
+    "GeneralAgent": "app.agents.general:GeneralAgent",
+    "AdmissionsAgent": "app.agents.admissions:AdmissionsAgent",
+    "AIExpertAgent": "app.agents.ai_expert:AIExpertAgent",
+}
+
+class AgentRegistry:
+    """
+    Maps agent names to agent classes, importing a class only when an agent of that name is
+    created. Every agent gets the same shared OllamaService and KnowledgeService instances.
+    """
+
+    def __init__(self, agents: Optional[Dict[str, Union[str, Type[BaseAgent]]]] = None):
+        # name -> agent class, or "module:Class" not imported yet
+        self._agents: Dict[str, Union[str, Type[BaseAgent]]] = dict(agents or {})
+
+    @classmethod
+    def from_settings(cls) -> "AgentRegistry":
+        """The built-in agents, plus those registered under ENTRY_POINT_GROUP if AGENT_ENTRY_POINTS is on."""
+        registry = cls(BUILTIN_AGENTS)
+        if settings.AGENT_ENTRY_POINTS:
+            registry.load_entry_points()
+        return registry
+
+    def register(self, name: str, agent: Union[str, Type[BaseAgent]]):
+        """Registers (or replaces) an agent class, given directly or as "module:Class"."""
+        self._agents[name] = agent
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        try:
+            found = entry_points(group=group)
+        except Exception as e:
+            logger.warning(f"Could not read '{group}' entry points: {e}")
+            return
+        for entry_point in found:
+            # Resolved (imported) only if the agent is enabled
+            self.register(entry_point.name, entry_point.value)
+            logger.debug(f"Registered agent '{entry_point.name}' from entry point {entry_point.value}.")
+
+    def available(self) -> List[str]:
+        return list(self._agents)
+
+    def agent_class(self, name: str) -> Type[BaseAgent]:
+        """The class registered as `name`, importing its module on first use."""
+        agent = self._agents[name]
+        if isinstance(agent, str):
+            module_name, _, attribute = agent.partition(":")
+            agent = getattr(importlib.import_module(module_name), attribute)
+            if not (isinstance(agent, type) and issubclass(agent, BaseAgent)):
+                raise TypeError(f"Agent '{name}' ({self._agents[name]}) is not a BaseAgent subclass.")
+            self._agents[name] = agent
+        return agent
+
+    def create(self, names: Sequence[str], ollama_service: Any, knowledge_service: Any) -> List[BaseAgent]:
+        """
+        Instantiates the named agents, in order, with the shared services. Unknown names and
+        agents that fail to load are logged and skipped.
+
+        Args:
+            names: Agents to create. The first one wins keyword-score ties.
+            ollama_service: The process-wide OllamaService.
+            knowledge_service: The process-wide KnowledgeService.
+
+        Returns:
+            The agent instances.
+
+        Raises:
+            ValueError: AGENT_MODEL_TIERS is malformed or names an unknown tier.
+        """
+        agents: List[BaseAgent] = []
+        tiers = agent_model_tiers()
+        for name in tiers:
+            if name not in names:
+                logger.warning(f"AGENT_MODEL_TIERS sets a tier for '{name}', which is not in ENABLED_AGENTS; ignoring it.")
+        for name in names:
+            if name not in self._agents:
+                logger.error(f"Unknown agent '{name}' in ENABLED_AGENTS (available: {self.available()}); skipping.")
+                continue
+            try:
+                agent = self.agent_class(name)(ollama_service=ollama_service, knowledge_service=knowledge_service)
+            except Exception as e:
+                logger.exception(f"Could not load agent '{name}': {e}")
+                continue
+            if name in tiers:
+                agent.model_tier = tiers[name]
+            elif agent.model_tier not in MODEL_TIERS:
+                logger.error(f"Agent '{name}' declares unknown model tier '{agent.model_tier}' (expected one of {MODEL_TIERS}); skipping.")
+                continue
+            agents.append(agent)
+        return agents
+
+def agent_model_tiers() -> Dict[str, str]:
+    """
+    AGENT_MODEL_TIERS ("Agent=tier,...") as a dict.
+
+    Raises:
+        ValueError: An entry is not "Agent=tier" or names a tier other than MODEL_TIERS.
+    """
+    tiers: Dict[str, str] = {}
+    for item in (settings.AGENT_MODEL_TIERS or "").split(","):
+        if not item.strip():
+            continue
+        name, _, tier = (part.strip() for part in item.partition("="))
+        if not name or not tier:
+            raise ValueError(f"AGENT_MODEL_TIERS entry '{item.strip()}' is not of the form Agent=tier.")
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"AGENT_MODEL_TIERS sets unknown model tier '{tier}' for '{name}' (expected one of {MODEL_TIERS}).")
+        tiers[name] = tier
+    return tiers
+
+def enabled_agent_names() -> List[str]:
+    """ENABLED_AGENTS as a list."""
+    return [name.strip() for name in settings.ENABLED_AGENTS.split(",") if name.strip()]
@@ -1,37 +1,77 @@
 # backend/app/api/v1/endpoints/chat.py
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict # Add Dict for ConnectionManager if uncommenting WS
+from typing import Awaitable, Dict, Any, Optional, Set, Tuple, TypeVar
+import asyncio
+import json
+import uuid
 
 from app.api.v1 import schemas # Import schemas from the same v1 level
 # Import services
 from app.services.chat_service import ChatService
-from app.services.ollama_service import OllamaService # Needed for dependency
-from app.core.database import get_db # Import DB session dependency
+from app.core.container import ServiceContainer, get_container
+from app.core.database import get_db, session_scope # Import DB session dependency
+from app.core.concurrency import LLMOverloadedError
+from app.services.ollama_service import LLMStreamError
+from app.core.config import settings
 from app.core.logger import logger
 
 router = APIRouter()
 
 # --- Dependency Injection Setup ---
 
-# Create a single OllamaService instance (or manage lifecycle as needed)
-# This could also be managed within a more complex dependency system
-# Be mindful of resource usage if OllamaService holds large models/connections
-ollama_service_instance = OllamaService()
-
 # Dependency function to get ChatService instance
 async def get_chat_service(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    container: ServiceContainer = Depends(get_container)
 ) -> ChatService:
-    """Dependency to provide a ChatService instance with DB session and Ollama service."""
-    # Consider if ollama_service needs request-specific state; if not, reusing is fine.
-    return ChatService(db_session=db, ollama_service=ollama_service_instance)
+    """
+    Dependency to provide a ChatService instance for the request.
+    Only the DB session is per-request; the embedding model, FAISS index,
+    agents and knowledge clients come from the app-wide ServiceContainer.
+    """
+    return container.create_chat_service(db)
+
+# --- Client Disconnect Handling ---
+
+T = TypeVar("T")
+
+# Non-standard status (nginx's "client closed request"); nobody receives it, it only shows in access logs
+CLIENT_CLOSED_REQUEST = 499
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the response was ready."""
+
+async def _cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Runs `work` as a task, polling the connection meanwhile. If the client disconnects
+    (tab closed, frontend timeout), the task is cancelled, which stops tool calls and the
+    in-flight Ollama request (its HTTP connection is closed, so Ollama stops generating),
+    and ClientDisconnected is raised.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.CHAT_DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                # Let the turn unwind (and record the user message) before the session is closed
+                await asyncio.gather(task, return_exceptions=True)
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            # This handler itself was cancelled (e.g. server shutdown)
+            task.cancel()
 
 # --- REST Endpoint --- 
 
 @router.post("/", response_model=schemas.ChatMessageOutput)
 async def handle_chat_message(
     chat_input: schemas.ChatMessageInput,
+    request: Request,
     chat_service: ChatService = Depends(get_chat_service) # Inject ChatService
 ):
     """
@@ -42,11 +82,11 @@ async def handle_chat_message(
     logger.debug(f"Query: {chat_input.query}")
 
     try:
-        # Call the ChatService to process the message
-        result_data = await chat_service.process_user_message(
+        # Call the ChatService to process the message (abandoned if the client disconnects)
+        result_data = await _cancel_on_disconnect(request, chat_service.process_user_message(
             query=chat_input.query,
             conversation_id_str=chat_input.conversation_id
-        )
+        ))
 
         # Convert the result dict to the Pydantic output model
         # Ensure keys match the ChatMessageOutput schema fields
@@ -55,83 +95,316 @@ async def handle_chat_message(
              conversation_id=result_data["conversation_id"], # Required field
              agent_name=result_data.get("agent_name"),
              # context_docs=result_data.get("context_docs"), # Uncomment if adding later
-             # debug_info=result_data.get("debug_info") # Uncomment if adding later
+             debug_info=result_data.get("debug_info") # Per-stage timings
          )
 
         logger.info(f"Sending response for conversation: {result.conversation_id}")
         return result
 
+    except ClientDisconnected:
+        logger.info(f"Client disconnected before the answer for conversation {chat_input.conversation_id} was ready; generation cancelled.")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except LLMOverloadedError as e:
+        logger.warning(f"Rejecting chat message, LLM overloaded: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.exception(f"Error processing chat message in API endpoint: {e}")
         # Consider more specific error handling based on service exceptions
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
-# --- WebSocket Endpoint --- (Optional, can be implemented later)
-
-# class ConnectionManager:
-#     def __init__(self):
-#         self.active_connections: Dict[str, WebSocket] = {}
-
-#     async def connect(self, websocket: WebSocket, client_id: str):
-#         await websocket.accept()
-#         self.active_connections[client_id] = websocket
-#         logger.info(f"WebSocket connected: {client_id}")
-
-#     def disconnect(self, client_id: str):
-#         if client_id in self.active_connections:
-#             del self.active_connections[client_id]
-#             logger.info(f"WebSocket disconnected: {client_id}")
-
-#     async def send_personal_message(self, message: str, client_id: str):
-#         if client_id in self.active_connections:
-#             await self.active_connections[client_id].send_text(message)
-
-# manager = ConnectionManager()
-
-# @router.websocket("/ws/{client_id}")
-# async def websocket_endpoint(
-#     websocket: WebSocket, 
-#     client_id: str, 
-#     db: AsyncSession = Depends(get_db)
-#     # TODO: Inject ChatService
-# ):
-#     await manager.connect(websocket, client_id)
-#     try:
-#         while True:
-#             data = await websocket.receive_text()
-#             logger.info(f"Received WebSocket message from {client_id}: {data}")
-#             # Assume data is JSON string like {"query": "...", "conversation_id": "..."}
-#             # Parse input, call chat service, stream response back
-#             try:
-#                 # input_data = ChatMessageInput.parse_raw(data)
-#                 # async for response_chunk in chat_service.process_user_message_stream(...):
-#                 #     await manager.send_personal_message(response_chunk, client_id)
-                
-#                 # Placeholder streaming
-#                 await manager.send_personal_message(f"Processing: {data}", client_id)
-#                 await asyncio.sleep(1)
-#                 await manager.send_personal_message(f"Response to: {data} (Placeholder)", client_id)
-
-#             except Exception as e:
-#                 logger.error(f"Error processing WebSocket message from {client_id}: {e}")
-#                 await manager.send_personal_message(f"Error: {str(e)}", client_id)
-
-#     except WebSocketDisconnect:
-#         manager.disconnect(client_id)
-#     except Exception as e:
-#         logger.error(f"WebSocket error for client {client_id}: {e}")
-#         manager.disconnect(client_id)
-#         # Optionally attempt to close websocket if not already closed
-#         try:
-#             await websocket.close(code=1011) # Internal Error
-#         except RuntimeError:
-#             pass # Already closed
-
-# Placeholder imports for placeholder code above
-# import asyncio
-# import uuid
-
-# TODO: Import services later
-# from app.services.chat_service import ChatService 
-# TODO: Inject ChatService dependency later
-# chat_service: ChatService = Depends(get_chat_service) 
\ No newline at end of file
+@router.get("/queue")
+async def get_llm_queue_stats(container: ServiceContainer = Depends(get_container)) -> Dict[str, Any]:
+    """Current LLM admission queue depth, in-flight calls and wait times."""
+    return container.admission_controller.stats()
+
+@router.get("/cache")
+async def get_llm_cache_stats(container: ServiceContainer = Depends(get_container)) -> Dict[str, Any]:
+    """Hit/miss counters of the prompt-level and semantic answer caches, and KV-cache prefix reuse."""
+    return {
+        "prompt": container.response_cache.stats() if container.response_cache else {"enabled": False},
+        "semantic": container.semantic_cache.stats() if container.semantic_cache else {"enabled": False},
+        "kv_prefix": container.prefix_state.stats(),
+    }
+
+# --- Streaming (SSE) Endpoint ---
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    """Formats a ChatService stream event as a Server-Sent Events frame."""
+    data = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/stream")
+async def handle_chat_message_stream(
+    chat_input: schemas.ChatMessageInput,
+    container: ServiceContainer = Depends(get_container)
+):
+    """
+    Handles incoming chat messages and streams the answer as Server-Sent Events.
+    Emits a 'metadata' event (agent, retrieved docs), then 'token' events,
+    then a final 'done' event (or 'error').
+    """
+    logger.info(f"Received streaming chat message for conversation: {chat_input.conversation_id}")
+    logger.debug(f"Query: {chat_input.query}")
+
+    # Fail fast before the 200 status line is sent if the LLM queue is already full
+    if container.admission_controller.is_saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please retry shortly.",
+            headers={"Retry-After": str(container.admission_controller.retry_after())}
+        )
+
+    async def event_stream():
+        try:
+            # The get_db dependency has exited by the time the body streams,
+            # so the stream owns its session (committed once the stream finishes).
+            async with session_scope() as db:
+                chat_service = container.create_chat_service(db)
+                async for event in chat_service.process_user_message_stream(
+                    query=chat_input.query,
+                    conversation_id_str=chat_input.conversation_id
+                ):
+                    yield _format_sse(event)
+        except LLMOverloadedError as e:
+            logger.warning(f"Streaming chat message rejected, LLM overloaded: {e}")
+            yield _format_sse({"event": "error", "detail": "The assistant is busy right now. Please retry shortly.", "retry_after": e.retry_after})
+        except LLMStreamError as e:
+            # Tokens already sent are a partial answer; nothing was stored for it
+            yield _format_sse({"event": "error", "detail": str(e)})
+        except Exception as e:
+            logger.exception(f"Error streaming chat message in API endpoint: {e}")
+            yield _format_sse({"event": "error", "detail": f"Internal Server Error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- WebSocket Endpoint ---
+#
+# One socket multiplexes several conversations. Client frames (JSON):
+#   {"type": "chat", "query": "...", "conversation_id": "12" | null, "request_id": "optional-client-tag"}
+#   {"type": "cancel", "request_id": "..."}  or  {"type": "cancel", "conversation_id": "12"}
+# Server frames carry the request_id (and conversation_id once known):
+#   accepted, metadata, token, done, cancelled, error
+
+class ClientConnection:
+    """
+    Per-socket state: the outbound queues and the in-flight generations.
+
+    Streamed frames go through a bounded queue, so a slow reader applies backpressure
+    to the generations. Control and terminal frames (accepted, cancelled, errors) go
+    through an unbounded queue that is sent first: queueing them never blocks the
+    receive loop (which must keep reading cancel frames) and never drops them.
+    """
+
+    def __init__(self, websocket: WebSocket, client_id: str, max_queue_size: int):
+        self.websocket = websocket
+        self.client_id = client_id
+        # Bounded buffer of (generation task, frame): when the client reads slowly, generation tasks wait on put()
+        self.send_queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        # Control frames, few and small: unbounded, sent ahead of streamed frames
+        self.control_queue: asyncio.Queue = asyncio.Queue()
+        self._frame_ready = asyncio.Event()
+        # Generations that sent their terminal frame; their still-queued frames are skipped
+        self._ended: Set[asyncio.Task] = set()
+        # request_id -> (conversation_id or None, generation task)
+        self.streams: Dict[str, Tuple[Optional[str], asyncio.Task]] = {}
+        self.sender_task: Optional[asyncio.Task] = None
+
+    async def send(self, frame: Dict[str, Any]):
+        """Queues a streamed frame, waiting while the buffer is full (backpressure)."""
+        await self.send_queue.put((asyncio.current_task(), frame))
+        self._frame_ready.set()
+
+    def send_control(self, frame: Dict[str, Any], ends: Optional[asyncio.Task] = None):
+        """
+        Queues a control frame ahead of streamed frames, without waiting.
+
+        Args:
+            frame: The frame to send.
+            ends: The generation this frame terminates; its frames still in the
+                  streamed queue are dropped so nothing follows the terminal frame.
+        """
+        if ends is not None:
+            self._ended.add(ends)
+        self.control_queue.put_nowait(frame)
+        self._frame_ready.set()
+
+    async def _next_frame(self) -> Dict[str, Any]:
+        while True:
+            if not self.control_queue.empty():
+                return self.control_queue.get_nowait()
+            while not self.send_queue.empty():
+                owner, frame = self.send_queue.get_nowait()
+                if owner not in self._ended:
+                    return frame
+            # Nothing queued, so no stale frames of ended generations remain either
+            self._ended.clear()
+            self._frame_ready.clear()
+            await self._frame_ready.wait()
+
+    async def sender_loop(self):
+        """Drains the queues onto the socket, control frames first."""
+        try:
+            while True:
+                frame = await self._next_frame()
+                await self.websocket.send_text(json.dumps(frame))
+        except (WebSocketDisconnect, RuntimeError) as e:
+            logger.debug(f"WebSocket sender for {self.client_id} stopped: {e}")
+
+    def set_conversation(self, request_id: str, conversation_id: Optional[str]):
+        """Records the conversation a request is streaming for, once a new one has been created."""
+        entry = self.streams.get(request_id)
+        if entry is not None and conversation_id and entry[0] != conversation_id:
+            self.streams[request_id] = (conversation_id, entry[1])
+
+    def find_request(self, request_id: Optional[str], conversation_id: Optional[str]) -> Optional[str]:
+        """Resolves a cancel target by request_id, falling back to conversation_id."""
+        if request_id and request_id in self.streams:
+            return request_id
+        if conversation_id:
+            for rid, (conv_id, _) in self.streams.items():
+                if conv_id == conversation_id:
+                    return rid
+        return None
+
+class ConnectionManager:
+    def __init__(self, max_queue_size: int = settings.WS_SEND_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self.active_connections: Dict[str, ClientConnection] = {}
+
+    async def connect(self, websocket: WebSocket, client_id: str) -> ClientConnection:
+        await websocket.accept()
+        # A reconnect with the same client_id replaces the stale connection
+        await self.disconnect(client_id)
+        connection = ClientConnection(websocket, client_id, self.max_queue_size)
+        connection.sender_task = asyncio.create_task(connection.sender_loop())
+        self.active_connections[client_id] = connection
+        logger.info(f"WebSocket connected: {client_id}")
+        return connection
+
+    async def disconnect(self, client_id: str):
+        """Cancels in-flight generations and the sender for a client."""
+        connection = self.active_connections.pop(client_id, None)
+        if connection is None:
+            return
+        generations = [task for _, task in connection.streams.values()]
+        tasks = generations + ([connection.sender_task] if connection.sender_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"WebSocket disconnected: {client_id} (cancelled {len(generations)} in-flight generation(s))")
+
+manager = ConnectionManager()
+
+async def _run_ws_generation(
+    connection: ClientConnection,
+    request_id: str,
+    chat_input: schemas.ChatMessageInput,
+    container: ServiceContainer
+):
+    """Runs one conversation turn through the shared streaming pipeline and forwards its events."""
+    conversation_id = chat_input.conversation_id
+    try:
+        async with session_scope() as db:
+            chat_service = container.create_chat_service(db)
+            async for event in chat_service.process_user_message_stream(
+                query=chat_input.query,
+                conversation_id_str=chat_input.conversation_id
+            ):
+                if event.get("conversation_id") and event["conversation_id"] != conversation_id:
+                    conversation_id = event["conversation_id"]
+                    # A new conversation's id is only known now; cancel and busy checks match on it
+                    connection.set_conversation(request_id, conversation_id)
+                frame = {key: value for key, value in event.items() if key != "event"}
+                frame.update({"type": event["event"], "request_id": request_id, "conversation_id": conversation_id})
+                await connection.send(frame)
+    except asyncio.CancelledError:
+        logger.info(f"WebSocket generation {request_id} cancelled for {connection.client_id}")
+        connection.send_control({"type": "cancelled", "request_id": request_id, "conversation_id": conversation_id}, ends=asyncio.current_task())
+        raise
+    except LLMOverloadedError as e:
+        logger.warning(f"WebSocket generation {request_id} rejected, LLM overloaded: {e}")
+        connection.send_control({"type": "error", "request_id": request_id, "conversation_id": conversation_id, "detail": "The assistant is busy right now. Please retry shortly.", "retry_after": e.retry_after}, ends=asyncio.current_task())
+    except Exception as e:
+        logger.exception(f"Error processing WebSocket message from {connection.client_id}: {e}")
+        connection.send_control({"type": "error", "request_id": request_id, "conversation_id": conversation_id, "detail": str(e)}, ends=asyncio.current_task())
+    finally:
+        connection.streams.pop(request_id, None)
+
+@router.websocket("/ws/{client_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    client_id: str,
+    container: ServiceContainer = Depends(get_container)
+):
+    connection = await manager.connect(websocket, client_id)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+                if not isinstance(message, dict):
+                    raise ValueError("frame must be a JSON object")
+            except ValueError as e:
+                connection.send_control({"type": "error", "detail": f"Invalid frame: {e}"})
+                continue
+
+            message_type = message.get("type", "chat")
+            request_id = str(message.get("request_id") or uuid.uuid4())
+
+            if message_type == "cancel":
+                target = connection.find_request(message.get("request_id"), message.get("conversation_id"))
+                if target:
+                    connection.streams[target][1].cancel()
+                else:
+                    connection.send_control({"type": "error", "request_id": request_id, "detail": "Nothing to cancel."})
+                continue
+
+            if message_type != "chat":
+                connection.send_control({"type": "error", "request_id": request_id, "detail": f"Unknown frame type '{message_type}'."})
+                continue
+
+            try:
+                chat_input = schemas.ChatMessageInput(
+                    query=message.get("query", ""),
+                    conversation_id=message.get("conversation_id"),
+                    metadata=message.get("metadata")
+                )
+            except ValueError as e:
+                connection.send_control({"type": "error", "request_id": request_id, "detail": f"Invalid chat frame: {e}"})
+                continue
+
+            busy = chat_input.conversation_id and any(
+                conv_id == chat_input.conversation_id for conv_id, _ in connection.streams.values()
+            )
+            if request_id in connection.streams or busy:
+                connection.send_control({"type": "error", "request_id": request_id, "conversation_id": chat_input.conversation_id, "detail": "A response is already streaming for this request/conversation."})
+                continue
+            if len(connection.streams) >= settings.WS_MAX_CONCURRENT_STREAMS:
+                connection.send_control({"type": "error", "request_id": request_id, "detail": "Too many concurrent conversations on this connection."})
+                continue
+
+            logger.info(f"Received WebSocket message from {client_id} (request {request_id}, conversation {chat_input.conversation_id})")
+            connection.send_control({"type": "accepted", "request_id": request_id, "conversation_id": chat_input.conversation_id})
+            task = asyncio.create_task(_run_ws_generation(connection, request_id, chat_input, container))
+            connection.streams[request_id] = (chat_input.conversation_id, task)
+
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket client {client_id} disconnected.")
+    except Exception as e:
+        logger.error(f"WebSocket error for client {client_id}: {e}")
+        try:
+            await websocket.close(code=1011) # Internal Error
+        except RuntimeError:
+            pass # Already closed
+    finally:
+        # Cancels any in-flight generation for this client
+        if manager.active_connections.get(client_id) is connection:
+            await manager.disconnect(client_id)
@@ -0,0 +1,25 @@
+# backend/app/api/v1/endpoints/health.py
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.warmup import warmup_state
+
+router = APIRouter()
+
+@router.get("/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and serving HTTP.
+    Answers immediately, even while the warm-up is still running.
+    """
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 only once the warm-up (embedding model, FAISS index, agent
+    prompts, Ollama model load) has completed, so load balancers skip cold workers.
+    """
+    if warmup_state.ready:
+        return {"status": "ready", "warmup": warmup_state.as_dict()}
+    return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup_state.as_dict()})
@@ -0,0 +1,322 @@
+# backend/app/core/concurrency.py
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import LLM_QUEUE_WAIT, current_request_timings
+
+T = TypeVar("T")
+
+# Conversation the current task is working for. Set by ChatService so that code
+# further down the call stack (e.g. OllamaService) can apply per-conversation policies
+# without threading the ID through every agent signature.
+current_conversation_key: ContextVar[Optional[str]] = ContextVar("current_conversation_key", default=None)
+
+# Scheduling priority for LLM calls made by the current task (lower is served first)
+current_llm_priority: ContextVar[int] = ContextVar("current_llm_priority", default=0)
+
+# Priority levels used across the app
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+# --- CPU inference executor ---
+
+_inference_executor: Optional[ThreadPoolExecutor] = None
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """
+    Bounded thread pool for CPU-bound inference (SentenceTransformer encoding, FAISS search).
+
+    Kept separate from the default executor so embedding work can neither starve other
+    to_thread() users nor spawn more concurrent encodes than there are cores to run them.
+    """
+    global _inference_executor
+    if _inference_executor is None:
+        workers = settings.INFERENCE_MAX_WORKERS or min(4, os.cpu_count() or 1)
+        _inference_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        logger.info(f"Inference executor started with {workers} workers.")
+    return _inference_executor
+
+async def run_inference(func: Callable[..., T], *args: Any) -> T:
+    """Runs func(*args) on the inference executor without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(get_inference_executor(), func, *args)
+
+def shutdown_inference_executor():
+    global _inference_executor
+    if _inference_executor is not None:
+        _inference_executor.shutdown(wait=False, cancel_futures=True)
+        _inference_executor = None
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call cannot be admitted; carries a Retry-After hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMQueueFullError(LLMOverloadedError):
+    """The LLM wait queue is at capacity."""
+
+class LLMQueueTimeoutError(LLMOverloadedError):
+    """The call waited in the LLM queue longer than allowed."""
+
+
+class LLMAdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue in front of the LLM backend.
+
+    At most `max_concurrency` calls run at once. Further callers wait in a queue
+    ordered by priority; within a priority level, conversations are served
+    round-robin so one chatty conversation cannot starve the others. When the
+    queue is full, callers fail fast with LLMQueueFullError.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_size: int, queue_timeout: Optional[float] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_size = max(0, max_queue_size)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._queue_depth = 0
+        # priority -> conversation key -> FIFO of waiting futures (lanes rotate round-robin)
+        self._waiters: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        # Stats
+        self.total_admitted = 0
+        self.total_rejected = 0
+        self.total_timed_out = 0
+        self._total_wait = 0.0
+        self.max_wait = 0.0
+        self._service_time_ewma: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls) -> "LLMAdmissionController":
+        return cls(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_queue_size=settings.LLM_MAX_QUEUE_SIZE,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    def is_saturated(self) -> bool:
+        """True when a new call would be rejected right now."""
+        return self._in_flight >= self.max_concurrency and self._queue_depth >= self.max_queue_size
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a queued call would be served."""
+        service_time = self._service_time_ewma or float(settings.LLM_RETRY_AFTER_SECONDS)
+        estimate = service_time * (self._queue_depth + 1) / self.max_concurrency
+        return max(1, int(math.ceil(estimate)))
+
+    async def acquire(self, key: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Waits for an LLM slot.
+
+        Returns:
+            The time spent waiting in the queue, in seconds.
+
+        Raises:
+            LLMQueueFullError: The queue is at capacity.
+            LLMQueueTimeoutError: No slot became free within queue_timeout.
+        """
+        if self._in_flight < self.max_concurrency and self._queue_depth == 0:
+            self._in_flight += 1
+            self._record_admission(0.0)
+            return 0.0
+
+        if self._queue_depth >= self.max_queue_size:
+            self.total_rejected += 1
+            logger.warning(f"LLM queue full ({self._queue_depth}/{self.max_queue_size}); rejecting call.")
+            raise LLMQueueFullError("LLM queue is full.", retry_after=self.retry_after())
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Callers without a conversation get their own lane
+        lane_key = key if key is not None else f"anonymous-{id(future)}"
+        lanes = self._waiters.setdefault(priority, OrderedDict())
+        lanes.setdefault(lane_key, deque()).append(future)
+        self._queue_depth += 1
+        start = time.monotonic()
+        logger.debug(f"LLM call queued for '{lane_key}' (depth {self._queue_depth}, in flight {self._in_flight}).")
+
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we gave up; hand it to the next waiter
+                self.release()
+            else:
+                self._remove_waiter(priority, lane_key, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.total_timed_out += 1
+                raise LLMQueueTimeoutError("Timed out waiting for the LLM.", retry_after=self.retry_after()) from None
+            raise
+
+        waited = time.monotonic() - start
+        self._record_admission(waited)
+        return waited
+
+    def release(self, service_time: Optional[float] = None):
+        """Frees a slot and wakes the next waiter."""
+        self._in_flight -= 1
+        if service_time is not None:
+            if self._service_time_ewma is None:
+                self._service_time_ewma = service_time
+            else:
+                self._service_time_ewma = 0.8 * self._service_time_ewma + 0.2 * service_time
+        self._grant_next()
+
+    @asynccontextmanager
+    async def slot(self, key: Optional[str] = None, priority: Optional[int] = None):
+        """Holds an LLM slot for the duration of the block. Defaults come from the task context."""
+        if key is None:
+            key = current_conversation_key.get()
+        if priority is None:
+            priority = current_llm_priority.get()
+        await self.acquire(key, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.total_admitted
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "admitted": admitted,
+            "rejected": self.total_rejected,
+            "timed_out": self.total_timed_out,
+            "avg_wait_seconds": (self._total_wait / admitted) if admitted else 0.0,
+            "max_wait_seconds": self.max_wait,
+            "avg_service_seconds": self._service_time_ewma or 0.0,
+        }
+
+    def _record_admission(self, waited: float):
+        LLM_QUEUE_WAIT.observe(waited)
+        timings = current_request_timings.get()
+        if timings is not None:
+            timings.record("llm_queue_wait", waited)
+        self.total_admitted += 1
+        self._total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _grant_next(self):
+        while self._in_flight < self.max_concurrency:
+            future = self._pop_next_waiter()
+            if future is None:
+                return
+            if future.done():
+                continue # Waiter already gave up
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _pop_next_waiter(self) -> Optional[asyncio.Future]:
+        for priority in sorted(self._waiters):
+            lanes = self._waiters[priority]
+            key, lane = next(iter(lanes.items()))
+            future = lane.popleft()
+            self._queue_depth -= 1
+            # Round-robin: the conversation moves to the back of its priority level
+            del lanes[key]
+            if lane:
+                lanes[key] = lane
+            if not lanes:
+                del self._waiters[priority]
+            return future
+        return None
+
+    def _remove_waiter(self, priority: int, key: str, future: asyncio.Future):
+        lanes = self._waiters.get(priority)
+        lane = lanes.get(key) if lanes else None
+        if lane is None or future not in lane:
+            return
+        lane.remove(future)
+        self._queue_depth -= 1
+        if not lane:
+            del lanes[key]
+        if not lanes:
+            del self._waiters[priority]
+
+
+class _Flight:
+    """One in-flight execution shared by several callers."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller starts the work as a separate task; callers arriving while it
+    is running await the same task and receive its result (or exception). The work
+    is cancelled only when every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]], on_join: Optional[Callable[[], None]] = None) -> T:
+        """
+        Runs factory() for `key`, or joins the execution already in flight for it.
+
+        Args:
+            key: Identifies equivalent calls.
+            factory: Starts the work; only called by the first caller (the leader).
+            on_join: Called when this caller joins an existing execution instead, so it can
+                release whatever it had prepared for factory (which will never run).
+
+        Returns:
+            The shared execution's result (its exception is raised to every caller).
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, key=key, flight=flight: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalescing request onto in-flight execution for key {key!r}.")
+            if on_join is not None:
+                on_join()
+
+        flight.waiters += 1
+        try:
+            # shield: one caller being cancelled must not cancel the shared work
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "executions": self.executions, "coalesced": self.coalesced}
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
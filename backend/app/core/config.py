@@ -1,7 +1,7 @@
 # backend/app/core/config.py
 from pydantic_settings import BaseSettings
-from pydantic import Field, HttpUrl, FilePath, DirectoryPath, computed_field
-from typing import List, Union, Optional
+from pydantic import Field, HttpUrl, FilePath, DirectoryPath, computed_field, field_validator
+from typing import List, Literal, Union, Optional
 import os
 
 class Settings(BaseSettings):
@@ -19,10 +19,117 @@ class Settings(BaseSettings):
 
     # Ollama Configuration
     OLLAMA_API_BASE_URL: HttpUrl
-    OLLAMA_MODEL_NAME: str = "mistral"
+    OLLAMA_MODEL_NAME: str = "mistral" # Large tier: writes the answers
+    # Small tier: cheap sub-tasks (conversation summaries, agents declaring model_tier "small");
+    # None = OLLAMA_MODEL_NAME for everything. Ollama must be allowed to keep both loaded
+    # (OLLAMA_MAX_LOADED_MODELS >= 2 on the server)
+    OLLAMA_SMALL_MODEL_NAME: Optional[str] = None
+    OLLAMA_TEMPERATURE: Optional[float] = None # None = Ollama default; 0 makes generation deterministic (and cacheable)
+    OLLAMA_SEED: Optional[int] = None
+    OLLAMA_KEEP_ALIVE: Optional[str] = "30m" # How long Ollama keeps the model in memory after a call ("5m", "1h", "-1" = forever)
+    # KV-cache reuse: tokens Ollama can keep cached across its parallel slots (~OLLAMA_NUM_PARALLEL x num_ctx
+    # on the server); conversations beyond it are assumed evicted there
+    OLLAMA_KV_CACHE_TOKENS: int = 8192
+    OLLAMA_PREFIX_STATE_MAX_CONVERSATIONS: int = 1024
+    OLLAMA_NUM_CTX: Optional[int] = None # Context window sent with every call (None = the model's default)
+    # "native": direct /api/chat calls over one pooled keep-alive HTTP client, with role-separated
+    # messages, per-call options and Ollama's token/timing stats; "langchain": OllamaLLM chains
+    OLLAMA_CLIENT_MODE: Literal["native", "langchain"] = "native"
+    OLLAMA_HTTP_MAX_CONNECTIONS: int = 16 # Pooled connections to Ollama (native client)
+    OLLAMA_HTTP_KEEPALIVE_SECONDS: float = 60.0 # Idle time before a pooled connection is closed
+    OLLAMA_REQUEST_TIMEOUT_SECONDS: Optional[float] = 300.0 # Per-call read timeout (None = no limit)
+    # Several Ollama servers: comma-separated base URLs (OLLAMA_API_BASE_URL alone when unset). Calls go
+    # to the healthy backend with the fewest in flight, preferring those with the model already loaded
+    OLLAMA_BACKEND_URLS: Optional[str] = None
+    OLLAMA_HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0 # /api/ps probe interval (0 = no probes)
+    OLLAMA_HEALTH_CHECK_TIMEOUT_SECONDS: float = 5.0
+    OLLAMA_BACKEND_FAILURE_THRESHOLD: int = 2 # Consecutive failed calls/probes before a backend is ejected
+    OLLAMA_BACKEND_EJECT_SECONDS: float = 30.0 # How long an ejected backend gets no calls
+    OLLAMA_BACKEND_LOADED_BONUS: int = 4 # In-flight calls a backend with the model loaded may have over one without
+
+    # Startup Warm-up (readiness is only reported once it completes)
+    WARMUP_LOAD_LLM: bool = True # Ask Ollama to load OLLAMA_MODEL_NAME during warm-up
+    WARMUP_PREFILL_PROMPTS: bool = True # Prefill each agent's fixed system prompt into Ollama's KV cache
+    WARMUP_RETRY_SECONDS: float = 10.0 # Delay before retrying a failed warm-up (e.g. Ollama not up yet)
+
+    # Exact prompt-level LLM response cache (used only for deterministic generation)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_TTL_SECONDS: Optional[float] = 24 * 3600
+    LLM_CACHE_DB_PATH: Optional[str] = None # e.g. ./data/cache/llm_cache.db to persist across restarts
+    LLM_CACHE_DB_MAX_ENTRIES: int = 100000 # Rows kept in the SQLite file (oldest pruned beyond it)
+
+    # LLM Admission Control (concurrency limit + bounded wait queue in front of Ollama)
+    LLM_MAX_CONCURRENCY: int = 2 # Calls sent to Ollama at once; Ollama serializes beyond its own parallelism
+    LLM_MAX_QUEUE_SIZE: int = 32 # Waiting calls before new ones are rejected with 503
+    LLM_QUEUE_TIMEOUT_SECONDS: Optional[float] = 60.0 # Max time a call may wait for a slot (None = no limit)
+    LLM_RETRY_AFTER_SECONDS: int = 5 # Retry-After hint used before any call durations have been observed
+    LLM_SMALL_MAX_CONCURRENCY: int = 4 # Separate slots for the small model (when OLLAMA_SMALL_MODEL_NAME is set)
+
+    # Semantic answer cache for first-turn queries (matches paraphrases via embeddings)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92 # Min cosine similarity to reuse a cached answer
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000 # Per agent
+    SEMANTIC_CACHE_TTL_SECONDS: Optional[float] = 24 * 3600
+
+    # Share one pipeline execution between concurrent identical first-turn (history-free) queries
+    CHAT_COALESCE_FIRST_TURN: bool = True
+    # Start RAG retrieval at the beginning of a turn, overlapping DB work and agent selection
+    # (the result is discarded when the selected agent does not use retrieval)
+    CHAT_SPECULATIVE_RETRIEVAL: bool = True
+    # Write-behind chat history: messages are queued in memory and inserted in batches by a
+    # background task, off the response path. Queued messages are flushed on shutdown but are
+    # lost on a crash (at most one flush interval's worth)
+    CHAT_HISTORY_WRITE_BEHIND: bool = False
+    CHAT_HISTORY_FLUSH_INTERVAL_SECONDS: float = 0.05
+    CHAT_HISTORY_BATCH_SIZE: int = 200 # Max messages per INSERT/transaction
+    CHAT_HISTORY_QUEUE_SIZE: int = 10000 # Queued messages before add_message waits for the writer
+    # Token-budgeted conversation memory: recent messages verbatim within the budget, older
+    # ones folded into a rolling per-conversation summary (updated in the background)
+    CHAT_MEMORY_ENABLED: bool = True
+    CHAT_MEMORY_TOKEN_BUDGET: int = 1024 # Verbatim history tokens per prompt, current query included
+    CHAT_MEMORY_SUMMARY_MAX_TOKENS: int = 256
+    CHAT_MEMORY_MAX_MESSAGES: int = 40 # Unsummarized messages read per turn
+    CHAT_MEMORY_TOKENIZER: str = "cl100k_base" # tiktoken encoding used to count tokens
+    CHAT_MEMORY_SUMMARY_TIER: Literal["small", "large"] = "small" # Model tier writing the summaries
+
+    # Agents to load, in order (comma-separated registry names; the first wins keyword-score ties)
+    ENABLED_AGENTS: str = "GeneralAgent,AdmissionsAgent,AIExpertAgent"
+    AGENT_ENTRY_POINTS: bool = True # Also register agents installed under the "chatbot.agents" entry point group
+    AGENT_MODEL_TIERS: Optional[str] = None # Overrides of the agents' declared model tiers, e.g. "GeneralAgent=small"
+    # Agent routing by embedding similarity to per-agent exemplar queries (the agents'
+    # keyword should_handle() scores are used when disabled)
+    AGENT_ROUTER_ENABLED: bool = True
+    AGENT_ROUTER_MIN_SIMILARITY: float = 0.25 # Best centroid similarity needed to leave the fallback agent
+    AGENT_ROUTER_MIN_MARGIN: float = 0.03 # Lead over the runner-up needed to leave the fallback agent
+    AGENT_ROUTER_FALLBACK: str = "GeneralAgent"
+    AGENT_ROUTER_EXEMPLARS_FILE: Optional[str] = None # JSON {agent name: [example queries]} overriding the built-in exemplars
+    # Sticky routing: a conversation stays with its previous agent on follow-up turns, and
+    # whenever no other agent scores clearly higher
+    AGENT_STICKY_ROUTING: bool = True
+    AGENT_STICKY_MIN_CONFIDENCE: float = 0.2 # Recorded confidence below which follow-ups are rescored
+    AGENT_STICKY_DECAY: float = 0.85 # Confidence multiplier per turn kept by stickiness alone
+    AGENT_STICKY_SWITCH_KEYWORD_SCORE: float = 0.8 # Another agent's keyword score that overrides a follow-up
+    AGENT_FOLLOWUP_MAX_WORDS: int = 8 # Longest query treated as a follow-up because of a back-reference
+    # Hedged execution: when the top two agents score within the margin, both gather their
+    # tool results/documents concurrently and only the more relevant one's prompt goes to the LLM
+    AGENT_HEDGING_ENABLED: bool = False
+    AGENT_HEDGE_MARGIN: float = 0.05 # Router similarity margin below which routing counts as ambiguous
+    AGENT_HEDGE_KEYWORD_MARGIN: float = 0.25 # Same, for keyword should_handle() scores
+    AGENT_HEDGE_TIMEOUT_SECONDS: float = 3.0 # Shared deadline for both agents' tool gathering
+
+    # How often a blocking chat request checks whether its client is still connected
+    # (a disconnected client's generation and tool calls are cancelled)
+    CHAT_DISCONNECT_POLL_SECONDS: float = 0.25
+
+    # WebSocket Chat Settings
+    WS_SEND_QUEUE_SIZE: int = 256 # Max outbound frames buffered per connection before generation waits
+    WS_MAX_CONCURRENT_STREAMS: int = 4 # Max in-flight conversations per connection
 
     # Vector Store Settings
     VECTOR_STORE_PATH: str
+    VECTOR_STORE_MMAP: bool = False # Serve the index memory-mapped read-only (shared across uvicorn workers)
+    INFERENCE_MAX_WORKERS: Optional[int] = None # Threads for embedding/FAISS work (None = min(4, CPU count))
 
     # Github API
     GITHUB_PAT: Optional[str] = None # Optional in case not provided or needed immediately
@@ -31,6 +138,26 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     LOG_FILE: Optional[str] = None # Optional path for file logging
 
+    @field_validator("OLLAMA_CLIENT_MODE", mode="before")
+    @classmethod
+    def _normalize_client_mode(cls, value):
+        # Case-insensitive ("LangChain" works); anything else is rejected rather than falling back to native
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator("AGENT_MODEL_TIERS")
+    @classmethod
+    def _check_agent_model_tiers(cls, value: Optional[str]) -> Optional[str]:
+        # Checked here so a bad value stops startup instead of failing every warm-up attempt
+        for item in (value or "").split(","):
+            if not item.strip():
+                continue
+            name, _, tier = (part.strip() for part in item.partition("="))
+            if not name or not tier:
+                raise ValueError(f"entry '{item.strip()}' is not of the form Agent=tier")
+            if tier not in ("small", "large"):
+                raise ValueError(f"unknown model tier '{tier}' for '{name}' (expected 'small' or 'large')")
+        return value
+
     # Define CORS_ORIGINS as a computed field based on CORS_ORIGINS_STR
     @computed_field 
     def CORS_ORIGINS(self) -> List[str]:
@@ -0,0 +1,196 @@
+# backend/app/core/container.py
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.ollama_service import OllamaService
+from app.services.knowledge_service import KnowledgeService
+from app.services.vector_store_service import VectorStoreService
+from app.services.agent_service import AgentService
+from app.services.agent_router import EmbeddingRouter
+from app.services.chat_service import ChatService
+from app.services.llm_cache import PromptResponseCache
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.prefix_state import ConversationPrefixState
+from app.services.conversation_memory import ConversationMemory
+from app.repositories.history_writer import HistoryWriteBehind
+from app.vectorstores.faiss_store import FAISSVectorStore, SentenceTransformerEmbeddings
+from app.core.concurrency import LLMAdmissionController, SingleFlight, shutdown_inference_executor
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.logger import logger
+
+class ServiceContainer:
+    """
+    Process-wide holder for the expensive, request-independent services:
+    the embedding model, the FAISS index, the agents and the knowledge clients.
+
+    Built once at application startup. Only the database session (and the
+    ChatHistoryRepository wrapping it) is created per request.
+    """
+    def __init__(
+        self,
+        ollama_service: Optional[OllamaService] = None,
+        knowledge_service: Optional[KnowledgeService] = None,
+        vector_store_service: Optional[VectorStoreService] = None,
+        agent_service: Optional[AgentService] = None,
+    ):
+        # Every LLM call made through the shared OllamaService goes through this limiter
+        self.admission_controller = LLMAdmissionController.from_settings()
+        # The small model gets its own slots, so summaries don't take the large model's
+        self.small_admission_controller = LLMAdmissionController(
+            max_concurrency=settings.LLM_SMALL_MAX_CONCURRENCY,
+            max_queue_size=settings.LLM_MAX_QUEUE_SIZE,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+        ) if settings.OLLAMA_SMALL_MODEL_NAME and settings.OLLAMA_SMALL_MODEL_NAME != settings.OLLAMA_MODEL_NAME else None
+        self.response_cache = PromptResponseCache.from_settings() if settings.LLM_CACHE_ENABLED else None
+        # Per-conversation record of the last prompt sent, for KV-cache reuse tracking
+        self.prefix_state = ConversationPrefixState.from_settings()
+        self.ollama_service = ollama_service or OllamaService(
+            admission_controller=self.admission_controller,
+            response_cache=self.response_cache,
+            prefix_state=self.prefix_state,
+            small_admission_controller=self.small_admission_controller,
+        )
+        self.knowledge_service = knowledge_service or KnowledgeService()
+        if vector_store_service is None:
+            # Load the SentenceTransformer model and the FAISS index exactly once
+            embeddings = SentenceTransformerEmbeddings()
+            vector_store_service = VectorStoreService(
+                vector_store=FAISSVectorStore(embedding_function=embeddings)
+            )
+        self.vector_store_service = vector_store_service
+        self.agent_service = agent_service or AgentService(
+            ollama_service=self.ollama_service,
+            knowledge_service=self.knowledge_service,
+        )
+        if settings.AGENT_ROUTER_ENABLED and self.agent_service.router is None:
+            self.agent_service.router = self._build_router()
+        # Shared across requests so concurrent identical first-turn queries coalesce
+        self.chat_single_flight = SingleFlight() if settings.CHAT_COALESCE_FIRST_TURN else None
+        # Paraphrase-level answer cache, dropped whenever the knowledge base changes
+        self.semantic_cache = SemanticAnswerCache.from_settings(
+            embeddings=self.embeddings,
+            version_fn=self.vector_store_service.knowledge_version,
+        ) if settings.SEMANTIC_CACHE_ENABLED else None
+        # Batches chat message inserts in the background (flushed on shutdown)
+        self.history_writer = HistoryWriteBehind.from_settings() if settings.CHAT_HISTORY_WRITE_BEHIND else None
+        # Keeps prompt history within a token budget, summarizing older turns in the background
+        self.conversation_memory = ConversationMemory.from_settings(
+            self.ollama_service, history_writer=self.history_writer
+        ) if settings.CHAT_MEMORY_ENABLED else None
+        self._register_metrics()
+        logger.info("ServiceContainer initialized.")
+
+    def _build_router(self) -> Optional[EmbeddingRouter]:
+        """Embeds the agents' routing exemplars (once); keyword routing is kept if that fails."""
+        try:
+            return EmbeddingRouter.from_settings(self.embeddings, self.agent_service.agents)
+        except Exception as e:
+            logger.exception(f"Could not build the embedding router, using keyword routing: {e}")
+            return None
+
+    def _register_metrics(self):
+        """Exposes queue and cache state through the /metrics endpoint (read at scrape time)."""
+        controller = self.admission_controller
+        registry.callback("llm_queue_depth", "LLM calls waiting for an admission slot.", lambda: controller.queue_depth)
+        registry.callback("llm_in_flight", "LLM calls currently running.", lambda: controller.in_flight)
+        registry.callback("llm_admission_rejected_total", "LLM calls rejected because the queue was full.", lambda: controller.total_rejected, metric_type="counter")
+        registry.callback("llm_admission_timed_out_total", "LLM calls that gave up waiting in the queue.", lambda: controller.total_timed_out, metric_type="counter")
+        pool = self.ollama_service.pool
+        registry.callback("llm_backend_in_flight", "LLM calls running on each Ollama backend.", lambda: {(backend.url,): backend.outstanding for backend in pool.backends}, labelnames=("backend",))
+        registry.callback("llm_backend_ejected", "1 while an Ollama backend is ejected after failures.", lambda: {(backend.url,): int(backend.ejected) for backend in pool.backends}, labelnames=("backend",))
+        registry.callback("llm_backend_errors_total", "Failed calls and probes per Ollama backend.", lambda: {(backend.url,): backend.errors for backend in pool.backends}, labelnames=("backend",), metric_type="counter")
+        ollama_service = self.ollama_service
+        registry.callback("llm_model_resident", "1 if the model is loaded on at least one Ollama backend (as last probed), per model.", lambda: {(model,): int(resident) for model, resident in ollama_service.resident_models().items()}, labelnames=("model",))
+        if self.small_admission_controller is not None:
+            small = self.small_admission_controller
+            registry.callback("llm_small_queue_depth", "Small-model LLM calls waiting for an admission slot.", lambda: small.queue_depth)
+            registry.callback("llm_small_in_flight", "Small-model LLM calls currently running.", lambda: small.in_flight)
+        registry.callback("llm_backend_retries_total", "Calls retried on another backend after a connection failure.", lambda: pool.retries, metric_type="counter")
+        prefix_state = self.prefix_state
+        registry.callback("llm_prefix_state_conversations", "Conversations whose prompt prefix is assumed resident in Ollama's KV cache.", lambda: len(prefix_state))
+        registry.callback("llm_prefix_state_evictions_total", "Conversations dropped from the prefix state under KV-cache pressure.", lambda: prefix_state.evictions, metric_type="counter")
+        if self.response_cache is not None:
+            cache = self.response_cache
+            registry.callback("llm_prompt_cache_lookups_total", "Prompt-level LLM cache lookups by result.", lambda: {("hit",): cache.hits, ("miss",): cache.misses}, labelnames=("result",), metric_type="counter")
+        if self.semantic_cache is not None:
+            semantic = self.semantic_cache
+            registry.callback("semantic_cache_lookups_total", "Semantic answer cache lookups by result.", lambda: {("hit",): semantic.hits, ("miss",): semantic.misses}, labelnames=("result",), metric_type="counter")
+        if self.chat_single_flight is not None:
+            flights = self.chat_single_flight
+            registry.callback("chat_coalesced_requests_total", "First-turn requests served by another request's in-flight execution.", lambda: flights.coalesced, metric_type="counter")
+        if self.history_writer is not None:
+            writer = self.history_writer
+            registry.callback("chat_history_pending_messages", "Chat messages queued for the write-behind writer but not yet committed.", lambda: writer.pending_count)
+            registry.callback("chat_history_messages_total", "Chat messages handled by the write-behind writer by result.", lambda: {("written",): writer.written, ("dropped",): writer.dropped}, labelnames=("result",), metric_type="counter")
+        if self.conversation_memory is not None:
+            memory = self.conversation_memory
+            registry.callback("chat_memory_summaries_total", "Rolling conversation summary updates stored.", lambda: memory.summaries_written, metric_type="counter")
+
+    @property
+    def embeddings(self):
+        """The shared embedding model used by the vector store."""
+        return self.vector_store_service.vector_store.embedding_function
+
+    def create_chat_service(self, db_session: AsyncSession) -> ChatService:
+        """Creates a per-request ChatService bound to the given DB session."""
+        return ChatService(
+            db_session=db_session,
+            ollama_service=self.ollama_service,
+            vector_store_service=self.vector_store_service,
+            agent_service=self.agent_service,
+            single_flight=self.chat_single_flight,
+            semantic_cache=self.semantic_cache,
+            history_writer=self.history_writer,
+            memory=self.conversation_memory,
+        )
+
+    async def shutdown(self):
+        """Releases resources held by the container."""
+        logger.info("ServiceContainer shutting down.")
+        if self.conversation_memory is not None:
+            await self.conversation_memory.shutdown()
+        if self.history_writer is not None:
+            # Before the LLM/cache resources go, so no acknowledged message is lost
+            await self.history_writer.stop()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        await self.ollama_service.aclose()
+        shutdown_inference_executor()
+
+
+# --- Process-wide instance ---
+
+_container: Optional[ServiceContainer] = None
+
+def init_container(container: Optional[ServiceContainer] = None) -> ServiceContainer:
+    """
+    Installs `container` as the process-wide ServiceContainer, or builds the default one
+    if none is installed yet. Called by the startup warm-up; a container installed beforehand
+    (e.g. by the load-test harness, with stand-in knowledge clients) is kept.
+    """
+    global _container
+    if container is not None:
+        _container = container
+    elif _container is None:
+        _container = ServiceContainer()
+    return _container
+
+def get_container() -> ServiceContainer:
+    """FastAPI dependency returning the process-wide ServiceContainer."""
+    if _container is None:
+        # Still being built by the startup warm-up
+        raise HTTPException(
+            status_code=503,
+            detail="The service is warming up. Please retry shortly.",
+            headers={"Retry-After": str(max(1, int(settings.WARMUP_RETRY_SECONDS)))},
+        )
+    return _container
+
+async def shutdown_container():
+    """Shuts down and clears the process-wide ServiceContainer."""
+    global _container
+    if _container is not None:
+        await _container.shutdown()
+        _container = None
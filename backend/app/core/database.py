@@ -1,4 +1,7 @@
 # backend/app/core/database.py
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
@@ -36,8 +39,27 @@ async def init_models():
         # await conn.run_sync(Base.metadata.drop_all)
         # Create all tables
         await conn.run_sync(Base.metadata.create_all)
+        # create_all does not touch existing tables; add columns introduced since they were created
+        await conn.run_sync(_add_missing_columns)
         logger.info("Database tables created.")
 
+def _add_missing_columns(sync_conn):
+    """
+    Minimal forward-only migration: ALTER TABLE ... ADD COLUMN for every model column
+    missing from an existing table. New columns must be nullable (or have a server default).
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            logger.info(f"Adding column {table.name}.{column.name} ({column_type})")
+            sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
 async def get_db() -> AsyncSession:
     """FastAPI dependency to get a database session."""
     async with AsyncSessionLocal() as session:
@@ -49,4 +71,20 @@ async def get_db() -> AsyncSession:
             logger.error(f"Database session rollback due to exception: {e}")
             raise
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close() 
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Transactional session for work that outlives the request handler
+    (e.g. streaming responses), where the get_db dependency has already exited.
+    Commits on success and rolls back on error, like get_db.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Database session rollback due to exception: {e}")
+            raise
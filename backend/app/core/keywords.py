@@ -0,0 +1,88 @@
+# backend/app/core/keywords.py
+import re
+from functools import lru_cache
+from typing import Dict, List, Mapping, Tuple
+
+# Between the words of a phrase: any run of whitespace or hyphens
+_WORD_SEPARATOR = r"[\s-]+"
+
+class KeywordHits:
+    """Keywords found in one query, per group (an agent's routing keywords or one tool's triggers)."""
+
+    __slots__ = ("hits",)
+
+    def __init__(self, hits: Dict[str, Dict[str, float]]):
+        # group -> {matched phrase: weight}
+        self.hits = hits
+
+    def matched(self, group: str) -> bool:
+        return group in self.hits
+
+    def phrases(self, group: str) -> List[str]:
+        return list(self.hits.get(group, ()))
+
+    def score(self, group: str, cap: float = 1.0) -> float:
+        """Sum of the weights of the group's distinct matched phrases, capped at `cap`."""
+        return min(sum(self.hits.get(group, {}).values()), cap)
+
+class KeywordMatcher:
+    """
+    Finds the keywords of many groups in a query with a single compiled regex.
+
+    Phrases match whole words only (so "ai" does not match "said" or "maintain"), case
+    insensitively, with any run of spaces/hyphens between their words and an optional
+    plural "s"/"es" at the end. Overlapping phrases are all reported: the regex takes the
+    longest phrase starting at each word, and every registered phrase contained in it
+    (e.g. "github" inside "find github") is credited too.
+
+    Results are memoized per query, so the agents scoring a query and the chosen agent
+    checking its tool triggers share one scan.
+    """
+
+    def __init__(self, groups: Mapping[str, Mapping[str, float]], cache_size: int = 1024):
+        """
+        Args:
+            groups: group name -> {phrase: weight}.
+            cache_size: Distinct queries whose results are kept.
+        """
+        # phrase -> [(group, weight)]
+        self._owners: Dict[str, List[Tuple[str, float]]] = {}
+        for group, phrases in groups.items():
+            for phrase, weight in phrases.items():
+                key = self._canonical(phrase)
+                if key:
+                    self._owners.setdefault(key, []).append((group, float(weight)))
+
+        self._phrases = sorted(self._owners, key=len, reverse=True)
+        # Registered phrases occurring (on word boundaries) inside each phrase, itself included
+        self._contained: Dict[str, List[str]] = {
+            phrase: [other for other in self._phrases if re.search(rf"(?<!\w){re.escape(other)}(?!\w)", phrase)]
+            for phrase in self._phrases
+        }
+        self._pattern = self._compile(self._phrases)
+        self.match = lru_cache(maxsize=cache_size)(self._scan)
+
+    @staticmethod
+    def _canonical(phrase: str) -> str:
+        return " ".join(re.split(_WORD_SEPARATOR, phrase.lower().strip()))
+
+    @staticmethod
+    def _compile(phrases: List[str]) -> "re.Pattern[str]":
+        if not phrases:
+            return re.compile(r"(?!)")
+        alternatives = "|".join(
+            "(?P<p%d>%s)" % (i, _WORD_SEPARATOR.join(re.escape(word) for word in phrase.split(" ")))
+            for i, phrase in enumerate(phrases)
+        )
+        # Zero-width, so a match at one word doesn't hide phrases starting at the next one;
+        # alternatives are longest first and backtrack if the word boundary fails
+        return re.compile(rf"(?<!\w)(?=(?:{alternatives})(?:e?s)?(?!\w))", re.IGNORECASE)
+
+    def _scan(self, query: str) -> KeywordHits:
+        hits: Dict[str, Dict[str, float]] = {}
+        for found in self._pattern.finditer(query):
+            longest = self._phrases[int(found.lastgroup[1:])]
+            for phrase in self._contained[longest]:
+                for group, weight in self._owners[phrase]:
+                    hits.setdefault(group, {})[phrase] = weight
+        return KeywordHits(hits)
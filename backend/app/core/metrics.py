@@ -0,0 +1,246 @@
+# backend/app/core/metrics.py
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Minimal Prometheus text-format (v0.0.4) metrics, kept dependency-free.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set."""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric whose values are read from a callback at scrape time (e.g. queue depth, cache stats)."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Union[float, Dict[LabelValues, float]]], labelnames: Sequence[str] = (), metric_type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def samples(self) -> List[str]:
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name replaces it (e.g. callbacks bound to a rebuilt container)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = (), metric_type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, metric_type))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue # A failing callback must not break the whole scrape
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Application metrics ---
+
+CHAT_REQUESTS = registry.counter("chat_requests_total", "Chat turns processed, by mode, agent and outcome.", ("mode", "agent", "outcome"))
+CHAT_IN_FLIGHT = registry.gauge("chat_requests_in_flight", "Chat turns currently being processed.", ("mode",))
+CHAT_LATENCY = registry.histogram("chat_request_duration_seconds", "End-to-end chat turn latency.", ("mode", "agent"))
+STAGE_LATENCY = registry.histogram("chat_stage_duration_seconds", "Latency of each chat pipeline stage.", ("stage", "agent"))
+LLM_QUEUE_WAIT = registry.histogram("llm_queue_wait_seconds", "Time LLM calls spent waiting for an admission slot.")
+LLM_PROMPT_TOKENS = registry.counter("llm_prompt_tokens_total", "Estimated prompt tokens sent to the LLM, by whether Ollama's KV cache could reuse them.", ("kind",))
+LLM_OLLAMA_TOKENS = registry.counter("llm_ollama_tokens_total", "Tokens Ollama reported evaluating (native client), by model and kind (prompt or generated).", ("model", "kind"))
+LLM_OLLAMA_DURATION = registry.histogram("llm_ollama_duration_seconds", "Time Ollama reported per model and call phase (native client): load, prompt_eval, eval.", ("model", "phase"))
+
+
+# --- Per-request stage timing ---
+
+class RequestTimings:
+    """
+    Collects the duration of each pipeline stage for one chat turn.
+
+    Stages are accumulated in milliseconds (for debug_info) and, once the turn is
+    finished and its agent known, recorded into the stage histogram.
+    """
+
+    def __init__(self):
+        self.agent = "none"
+        self.stages_ms: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    def record(self, stage_name: str, seconds: float):
+        self.stages_ms[stage_name] = self.stages_ms.get(stage_name, 0.0) + seconds * 1000.0
+
+    @contextmanager
+    def stage(self, stage_name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage_name, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def finish(self):
+        """Flushes the collected stages into the histogram, labeled by agent."""
+        for stage_name, ms in self.stages_ms.items():
+            STAGE_LATENCY.observe(ms / 1000.0, stage=stage_name, agent=self.agent)
+
+    def as_debug_info(self) -> Dict[str, float]:
+        timings = {name: round(ms, 2) for name, ms in self.stages_ms.items()}
+        timings["total"] = round(self.elapsed() * 1000.0, 2)
+        return timings
+
+# Timings of the chat turn the current task is serving (None outside a chat turn)
+current_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_request_timings", default=None)
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """
+    Times a stage of the current chat turn. Usable from any layer (services, clients)
+    without passing the timings object around; outside a turn it records directly
+    into the stage histogram with agent="none".
+    """
+    timings = current_request_timings.get()
+    if timings is not None:
+        with timings.stage(stage_name):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage_name, agent="none")
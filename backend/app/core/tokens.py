@@ -0,0 +1,38 @@
+# backend/app/core/tokens.py
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Role markers/separators each message adds to the rendered prompt
+MESSAGE_OVERHEAD_TOKENS = 4
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    try:
+        return tiktoken.get_encoding(settings.CHAT_MEMORY_TOKENIZER)
+    except Exception as e:
+        # get_encoding downloads the BPE file on first use; offline hosts fall back to an estimate
+        logger.warning(f"tiktoken encoding '{settings.CHAT_MEMORY_TOKENIZER}' unavailable, estimating tokens from length: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate prompt tokens of `text`. The tiktoken encoding is not the served model's
+    tokenizer, but it is close enough to budget prompt sizes.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` down to at most ~max_tokens tokens."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
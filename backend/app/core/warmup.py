@@ -0,0 +1,110 @@
+# backend/app/core/warmup.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.container import ServiceContainer, init_container
+from app.core.logger import logger
+
+class WarmupState:
+    """Progress of the startup warm-up, reported by /health/ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.attempts = 0
+        self.started_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        # step name -> {"status": "ok"|"failed"|"skipped", "duration_ms": ..., "error": ...}
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "duration_seconds": round(self.completed_at - self.started_at, 3) if self.completed_at and self.started_at else None,
+            "steps": self.steps,
+        }
+
+warmup_state = WarmupState()
+
+async def _run_step(name: str, step: Callable[[], Awaitable[Any]]) -> bool:
+    start = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        logger.exception(f"Warm-up step '{name}' failed: {e}")
+        warmup_state.steps[name] = {"status": "failed", "duration_ms": round((time.perf_counter() - start) * 1000.0, 1), "error": str(e)}
+        return False
+    warmup_state.steps[name] = {"status": "ok", "duration_ms": round((time.perf_counter() - start) * 1000.0, 1)}
+    logger.info(f"Warm-up step '{name}' done in {warmup_state.steps[name]['duration_ms']}ms.")
+    return True
+
+async def _warm_up_once() -> bool:
+    """Runs every warm-up step once. Returns True if all required steps succeeded."""
+    container: Optional[ServiceContainer] = None
+
+    async def build_container():
+        nonlocal container
+        # Loads the SentenceTransformer weights and the FAISS index; CPU/disk bound, so off the loop.
+        # An already-installed container is kept, so retries don't rebuild it.
+        container = await asyncio.to_thread(init_container)
+
+    if not await _run_step("services", build_container):
+        return False
+
+    async def encode():
+        # First forward pass allocates buffers and initializes torch kernels
+        await container.embeddings.aembed_query("warm-up")
+
+    async def search_index():
+        vector_store = container.vector_store_service.vector_store
+        if getattr(vector_store, "index", None) is None:
+            raise RuntimeError(f"FAISS index not loaded from {getattr(vector_store, 'index_path', '?')}")
+        # Touches the index pages and the docstore once
+        await vector_store.asimilarity_search("Concordia admission requirements", 1)
+
+    async def compile_prompts():
+        for agent in container.agent_service.agents:
+            agent.warm_up()
+
+    async def load_llm():
+        await container.ollama_service.load_model()
+
+    async def prefill_prompts():
+        for agent in container.agent_service.agents:
+            prefix = agent.static_prefix()
+            if prefix:
+                await container.ollama_service.prefill(prefix, tier=agent.model_tier)
+
+    ok = await _run_step("embedding_encode", encode)
+    # A missing index only degrades AdmissionsAgent (it answers without documents); not a readiness blocker
+    await _run_step("vector_index", search_index)
+    ok = await _run_step("agent_prompts", compile_prompts) and ok
+    if settings.WARMUP_LOAD_LLM:
+        ok = await _run_step("llm_model", load_llm) and ok
+    else:
+        warmup_state.steps["llm_model"] = {"status": "skipped"}
+    if settings.WARMUP_LOAD_LLM and settings.WARMUP_PREFILL_PROMPTS:
+        # Only an optimization: first turns just evaluate the system prompt themselves if it fails
+        await _run_step("llm_prefix_prefill", prefill_prompts)
+    else:
+        warmup_state.steps["llm_prefix_prefill"] = {"status": "skipped"}
+    return ok
+
+async def run_warmup():
+    """
+    Warms up everything the first chat request would otherwise pay for, retrying until it
+    succeeds, then flips readiness. Runs as a background task so /health/live answers meanwhile.
+    """
+    warmup_state.started_at = time.perf_counter()
+    while True:
+        warmup_state.attempts += 1
+        logger.info(f"Starting warm-up (attempt {warmup_state.attempts})...")
+        if await _warm_up_once():
+            warmup_state.completed_at = time.perf_counter()
+            warmup_state.ready = True
+            logger.info(f"Warm-up complete in {warmup_state.completed_at - warmup_state.started_at:.2f}s; instance is ready.")
+            return
+        logger.warning(f"Warm-up incomplete; retrying in {settings.WARMUP_RETRY_SECONDS}s.")
+        await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
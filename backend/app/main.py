@@ -1,14 +1,20 @@
 # backend/app/main.py
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # Import settings (it will load from .env)
 from app.core.config import settings
 from app.core.database import init_models # Import DB init function
+from app.core.container import shutdown_container
+from app.core.warmup import run_warmup
 from app.core.logger import logger # Import logger
+from app.core.metrics import registry as metrics_registry
 
 # Import API routers
 from app.api.v1.endpoints import chat as chat_router_v1
+from app.api.v1.endpoints import health as health_router
 
 # TODO: Import API routers later
 # from app.api.v1.endpoints import chat
@@ -43,6 +49,9 @@ app.include_router(
     tags=["Chat"]
 )
 
+# Probes live at the root so load balancers don't depend on the API version
+app.include_router(health_router.router, prefix="/health", tags=["Health"])
+
 # --- Root Endpoint ---
 @app.get("/", tags=["Root"])
 async def read_root():
@@ -51,6 +60,15 @@ async def read_root():
     """
     return {"message": "Welcome to the Multi-Agent Chatbot API!"}
 
+# --- Metrics Endpoint ---
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus text-format metrics: request counters, in-flight gauges,
+    per-stage latency histograms, LLM queue and cache stats.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # --- Placeholder for Startup/Shutdown Events ---
 @app.on_event("startup")
 async def startup_event():
@@ -58,14 +76,18 @@ async def startup_event():
     # Initialize database models (create tables if they don't exist)
     await init_models()
     logger.info("Database models initialized.")
-    # TODO: Add other startup logic if needed (e.g., load models)
-    pass
+    # Build the process-wide services (embedding model, FAISS index, agents) and warm them up
+    # in the background; /health/ready reports 200 once this has finished
+    app.state.warmup_task = asyncio.create_task(run_warmup())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     # TODO: Add shutdown logic if needed (e.g., close DB connections)
     print("Application shutdown...")
-    pass
+    warmup_task = getattr(app.state, "warmup_task", None)
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await shutdown_container()
 
 # --- (Optional) Run with Uvicorn for local development ---
 # This block allows running directly with `python backend/app/main.py`
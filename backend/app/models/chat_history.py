@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey
 from sqlalchemy.sql import func
 from app.core.database import Base
 import datetime
@@ -13,6 +13,13 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     # Optional: Add a title or summary for the conversation
     title = Column(String(255), nullable=True)
+    # Rolling summary of the older part of the conversation (see ConversationMemory);
+    # covers every message with timestamp <= summary_until
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime(timezone=True), nullable=True)
+    # Agent that answered the last turn and the routing confidence of that choice (sticky routing)
+    last_agent = Column(String(100), nullable=True)
+    last_agent_confidence = Column(Float, nullable=True)
 
 class Message(Base):
     """Represents a single message within a conversation."""
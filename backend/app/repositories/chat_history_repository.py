@@ -1,11 +1,14 @@
 # backend/app/repositories/chat_history_repository.py
+from sqlalchemy import event, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload # Keep for potential future use with relationships
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict, Set
+import datetime
 import uuid
 
 from app.models.chat_history import Conversation, Message
+from app.repositories.history_writer import HistoryWriteBehind, utc_naive
 from app.core.logger import logger
 
 class ChatHistoryRepository:
@@ -13,14 +16,31 @@ class ChatHistoryRepository:
     Repository class for handling database operations related to
     conversations and messages.
     """
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, writer: Optional[HistoryWriteBehind] = None):
         """
         Initializes the repository with an async database session.
 
         Args:
             db_session: The SQLAlchemy AsyncSession to use for database operations.
+            writer: Optional shared write-behind writer. When given, messages are queued
+                    and written in background batches instead of through db_session.
+                    Messages of a conversation created in db_session's open transaction
+                    are still written through db_session, so they commit (or roll back)
+                    together with the conversation: the writer's own transaction never
+                    inserts messages for a conversation that isn't committed yet, or that
+                    is rolled back (its id may then be reused). Messages queued for a
+                    committed conversation are kept even if db_session later rolls back.
         """
         self.db: AsyncSession = db_session
+        self.writer = writer
+        # Conversations created in db_session's current transaction
+        self._uncommitted_conversations: Set[int] = set()
+        if writer is not None:
+            event.listen(db_session.sync_session, "after_commit", self._on_transaction_end)
+            event.listen(db_session.sync_session, "after_rollback", self._on_transaction_end)
+
+    def _on_transaction_end(self, session):
+        self._uncommitted_conversations.clear()
 
     async def create_conversation(self, title: Optional[str] = None) -> Conversation:
         """
@@ -37,6 +57,7 @@ class ChatHistoryRepository:
             self.db.add(new_conversation)
             await self.db.flush() # Flush to get the ID before commit
             await self.db.refresh(new_conversation)
+            self._uncommitted_conversations.add(new_conversation.id)
             logger.info(f"Created new conversation with ID: {new_conversation.id}")
             return new_conversation
         except Exception as e:
@@ -54,13 +75,19 @@ class ChatHistoryRepository:
             content: The text content of the message.
 
         Returns:
-            The newly created Message object.
+            The newly created Message object (transient, without an ID, in write-behind mode).
         """
+        if self.writer is not None and conversation_id not in self._uncommitted_conversations:
+            record = await self.writer.add(conversation_id, sender_type, content)
+            logger.debug(f"Queued message for conversation {conversation_id}")
+            return Message(**record)
         try:
             new_message = Message(
                 conversation_id=conversation_id,
                 sender_type=sender_type,
-                content=content
+                content=content,
+                # Microsecond precision (the SQLite default has 1s): memory summaries use it as a watermark
+                timestamp=datetime.datetime.now(datetime.timezone.utc)
             )
             self.db.add(new_message)
             await self.db.flush() # Flush to get the ID before commit
@@ -84,29 +111,114 @@ class ChatHistoryRepository:
             A list of dictionaries, each representing a message
             with 'role' and 'content' keys, in chronological order.
         """
+        messages = await self.get_recent_messages(conversation_id, limit)
+        return [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+
+    async def get_recent_messages(self, conversation_id: int, limit: int, after: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves the most recent messages of a conversation, including messages still
+        queued in the write-behind writer.
+
+        Args:
+            conversation_id: The ID of the conversation.
+            limit: The maximum number of messages to retrieve.
+            after: Only return messages newer than this timestamp (e.g. already summarized ones are older).
+
+        Returns:
+            Dicts with 'role' ('user' or 'assistant'), 'content' and 'timestamp' (naive UTC), in chronological order.
+        """
+        return await self._read_messages(conversation_id, limit, after=after, newest=True)
+
+    async def get_messages_between(self, conversation_id: int, after: Optional[datetime.datetime], until: datetime.datetime, limit: int) -> List[Dict[str, Any]]:
+        """
+        Retrieves the oldest messages with after < timestamp <= until (same format as get_recent_messages).
+
+        Args:
+            conversation_id: The ID of the conversation.
+            after: Exclusive lower bound (None = from the start of the conversation).
+            until: Inclusive upper bound.
+            limit: The maximum number of messages to retrieve.
+        """
+        return await self._read_messages(conversation_id, limit, after=after, until=until, newest=False)
+
+    async def _read_messages(self, conversation_id: int, limit: int, after: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None, newest: bool = True) -> List[Dict[str, Any]]:
+        """Reads up to `limit` of the newest (or oldest) messages in (after, until], merged with queued ones."""
         try:
-            stmt = (
-                select(Message)
-                .where(Message.conversation_id == conversation_id)
-                .order_by(Message.timestamp.desc())
-                .limit(limit)
-            )
+            stmt = select(Message).where(Message.conversation_id == conversation_id)
+            if after is not None:
+                stmt = stmt.where(Message.timestamp > after)
+            if until is not None:
+                stmt = stmt.where(Message.timestamp <= until)
+            stmt = stmt.order_by(Message.timestamp.desc() if newest else Message.timestamp.asc()).limit(limit)
+            # Snapshot queued messages before reading: one committed in between then shows up
+            # in both (deduplicated below) rather than in neither
+            pending = self.writer.pending_for(conversation_id) if self.writer is not None else []
             result = await self.db.execute(stmt)
             messages = result.scalars().all()
+            if newest:
+                messages = list(reversed(messages))
+
+            # (sender_type, content, timestamp) chronological order
+            rows = [(msg.sender_type, msg.content, utc_naive(msg.timestamp)) for msg in messages]
+            if pending:
+                committed = set(rows)
+                after, until = utc_naive(after), utc_naive(until)
+                rows.extend(
+                    key for key in ((r["sender_type"], r["content"], utc_naive(r["timestamp"])) for r in pending)
+                    if key not in committed
+                    and (after is None or key[2] > after)
+                    and (until is None or key[2] <= until)
+                )
+                # Queued messages are newer than every committed one
+                rows = rows[-limit:] if newest else rows[:limit]
 
-            # Format history for LangChain (needs role/content)
-            # Reverse messages to get chronological order for prompt
-            history = [
+            logger.debug(f"Retrieved {len(rows)} messages for conversation {conversation_id}")
+            return [
                 # Use 'assistant' role for AI messages to match common conventions
-                {"role": msg.sender_type if msg.sender_type == 'user' else 'assistant', "content": msg.content}
-                for msg in reversed(messages)
+                {"role": sender_type if sender_type == 'user' else 'assistant', "content": content, "timestamp": timestamp}
+                for sender_type, content, timestamp in rows
             ]
-            logger.debug(f"Retrieved {len(history)} messages for conversation {conversation_id}")
-            return history
         except Exception as e:
             logger.exception(f"Error retrieving history for conversation {conversation_id}: {e}")
             return [] # Return empty list on error
 
+    async def has_messages(self, conversation_id: int) -> bool:
+        """Whether the conversation has any message, stored or still queued in the write-behind writer."""
+        if self.writer is not None and self.writer.pending_for(conversation_id):
+            return True
+        stmt = select(Message.id).where(Message.conversation_id == conversation_id).limit(1)
+        result = await self.db.execute(stmt)
+        return result.first() is not None
+
+    async def update_summary(self, conversation_id: int, summary: str, summary_until: datetime.datetime, previous_until: Optional[datetime.datetime]) -> bool:
+        """
+        Stores a new rolling summary for a conversation, unless another update got there first.
+
+        Args:
+            conversation_id: The ID of the conversation.
+            summary: Summary of every message up to and including summary_until.
+            summary_until: Timestamp of the newest message folded into the summary.
+            previous_until: The summary_until the new summary was built on (compare-and-set guard).
+
+        Returns:
+            True if the summary was stored.
+        """
+        stmt = update(Conversation).where(Conversation.id == conversation_id)
+        if previous_until is None:
+            stmt = stmt.where(Conversation.summary_until.is_(None))
+        else:
+            stmt = stmt.where(Conversation.summary_until == previous_until)
+        result = await self.db.execute(stmt.values(summary=summary, summary_until=summary_until))
+        return result.rowcount == 1
+
+    def record_routing(self, conversation: Conversation, agent_name: str, confidence: float):
+        """
+        Remembers the agent chosen for this turn on the conversation. No I/O: the change is
+        written with the session's next flush/commit.
+        """
+        conversation.last_agent = agent_name
+        conversation.last_agent_confidence = confidence
+
     async def get_or_create_conversation(self, conversation_id_str: Optional[str]) -> Conversation:
         """
         Gets an existing conversation by its string ID or creates a
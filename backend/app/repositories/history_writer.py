@@ -0,0 +1,177 @@
+# backend/app/repositories/history_writer.py
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import session_scope
+from app.core.logger import logger
+from app.models.chat_history import Message
+
+# Queued after the last record by stop(); tells the writer loop to exit
+_STOP = object()
+
+def utc_naive(timestamp: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Normalizes a timestamp to naive UTC (how SQLite stores and returns them) for comparisons."""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+class HistoryWriteBehind:
+    """
+    Write-behind buffer for chat messages: ChatHistoryRepository.add_message queues the
+    record here and returns immediately; a background task writes queued records in
+    batches (one multi-row INSERT and one commit per flush interval).
+
+    Durability guarantees:
+        - A message is acknowledged once it is queued in memory, not once it is on disk.
+        - stop() (called on application shutdown) writes everything still queued.
+        - A crash loses at most the messages queued since the last flush (~flush_interval).
+        - A failed batch is retried max_retries times, then dropped and logged.
+        - The queue is bounded: when it is full, add() waits for the writer instead of
+          buffering without limit (backpressure on the request path).
+
+    Records not yet committed are kept per conversation, so history reads can merge them
+    with what is already in the database (see pending_for).
+    """
+
+    def __init__(self, flush_interval: float = 0.05, batch_size: int = 200, max_queue: int = 10000, max_retries: int = 3):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        # Created on first use: the container (and this object) is built outside the event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # conversation_id -> records queued or being written, in insertion order
+        self._pending: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    @classmethod
+    def from_settings(cls) -> "HistoryWriteBehind":
+        return cls(
+            flush_interval=settings.CHAT_HISTORY_FLUSH_INTERVAL_SECONDS,
+            batch_size=settings.CHAT_HISTORY_BATCH_SIZE,
+            max_queue=settings.CHAT_HISTORY_QUEUE_SIZE,
+        )
+
+    @property
+    def pending_count(self) -> int:
+        """Messages accepted but not yet committed."""
+        return sum(len(records) for records in self._pending.values())
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"History write-behind started (flush every {self.flush_interval}s, up to {self.batch_size} messages).")
+
+    async def add(self, conversation_id: int, sender_type: str, content: str) -> Dict[str, Any]:
+        """
+        Queues a message for writing.
+
+        Args:
+            conversation_id: The conversation the message belongs to.
+            sender_type: 'user' or 'ai'.
+            content: The message text.
+
+        Returns:
+            The queued record (conversation_id, sender_type, content, timestamp).
+        """
+        if self._closed:
+            raise RuntimeError("History writer has been stopped.")
+        self._ensure_started()
+        record = {
+            "conversation_id": conversation_id,
+            "sender_type": sender_type,
+            "content": content,
+            # Set here rather than by the DB default: rows of one batch would otherwise share
+            # a timestamp, and history is ordered by it
+            "timestamp": datetime.datetime.now(datetime.timezone.utc),
+        }
+        await self._queue.put(record)
+        # No await between put() returning and this, so the writer can't have taken it yet
+        self._pending[conversation_id].append(record)
+        return record
+
+    def pending_for(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Snapshot of this conversation's messages not yet committed, oldest first."""
+        return list(self._pending.get(conversation_id, ()))
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            if self._queue.qsize() < self.batch_size:
+                # Let the rest of this interval's messages arrive so they share one transaction
+                await asyncio.sleep(self.flush_interval)
+            batch = [first]
+            stop = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                record = self._queue.get_nowait()
+                if record is _STOP:
+                    stop = True
+                    break
+                batch.append(record)
+            await self._write(batch)
+            if stop:
+                return
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with session_scope() as session:
+                    # One executemany INSERT for the whole batch
+                    await session.execute(insert(Message), [dict(record) for record in batch])
+                self.written += len(batch)
+                self.flushes += 1
+                logger.debug(f"History write-behind flushed {len(batch)} messages.")
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.dropped += len(batch)
+                    logger.error(f"Dropping {len(batch)} chat messages after {attempt} failed writes: {e}")
+                    break
+                logger.warning(f"History write-behind flush failed (attempt {attempt}), retrying: {e}")
+                await asyncio.sleep(self.flush_interval * 2 ** attempt)
+        for record in batch:
+            self._forget(record)
+
+    def _forget(self, record: Dict[str, Any]):
+        records = self._pending.get(record["conversation_id"])
+        if records is None:
+            return
+        for i, pending in enumerate(records):
+            if pending is record:
+                del records[i]
+                break
+        if not records:
+            del self._pending[record["conversation_id"]]
+
+    async def stop(self):
+        """Writes every queued message, then stops the writer. Called on application shutdown."""
+        self._closed = True
+        if self._task is None:
+            return
+        pending = self.pending_count
+        if pending:
+            logger.info(f"Flushing {pending} queued chat messages before shutdown...")
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"History write-behind stopped ({self.written} written, {self.dropped} dropped).")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending_count,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
@@ -78,7 +78,7 @@ async def run_ingestion():
     # --- 4. Add Documents to Vector Store ---
     logger.info("Adding processed documents to the vector store...")
     # This method handles creating or adding to the index and saving
-    vector_store_service.add_documents(documents_to_add)
+    await vector_store_service.aadd_documents(documents_to_add)
 
     logger.info("Knowledge ingestion process finished successfully.")
 
@@ -0,0 +1,154 @@
+# backend/app/services/agent_router.py
+import json
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.agents.base import BaseAgent
+from app.core.config import settings
+from app.core.logger import logger
+
+class RoutingDecision:
+    """Outcome of routing one query: the chosen agent and how clear-cut the choice was."""
+
+    def __init__(self, agent_name: str, scores: Dict[str, float], margin: float, fallback: bool):
+        self.agent_name = agent_name
+        # agent name -> cosine similarity of the query to the agent's exemplar centroid
+        self.scores = scores
+        # Best minus second-best similarity
+        self.margin = margin
+        # True when the fallback agent was chosen because no agent was a clear match
+        self.fallback = fallback
+
+class EmbeddingRouter:
+    """
+    Routes queries by embedding similarity to per-agent exemplar queries.
+
+    Each agent's exemplar queries (BaseAgent.routing_exemplars, or a JSON file mapping
+    agent name -> list of queries) are embedded once at startup and averaged into one unit
+    centroid per agent, stacked into an (agents x dim) matrix. Routing a query is then one
+    encode and one matrix-vector product, however many agents there are. When the best
+    match is weak, or not clearly ahead of the runner-up, the fallback agent is chosen.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        agents: Sequence[BaseAgent],
+        fallback_agent: str = "GeneralAgent",
+        min_similarity: float = 0.25,
+        min_margin: float = 0.03,
+        exemplars_file: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.fallback_agent = fallback_agent
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+
+        overrides = self._load_exemplars_file(exemplars_file) if exemplars_file else {}
+        names: List[str] = []
+        centroids: List[np.ndarray] = []
+        for agent in agents:
+            exemplars = overrides.get(agent.get_name(), agent.routing_exemplars)
+            if not exemplars:
+                logger.warning(f"Agent '{agent.get_name()}' has no routing exemplars; it can only be chosen as the fallback.")
+                continue
+            vectors = self._normalize(np.asarray(embeddings.embed_documents(list(exemplars)), dtype=np.float32))
+            names.append(agent.get_name())
+            centroids.append(self._normalize(vectors.mean(axis=0, keepdims=True))[0])
+        if not centroids:
+            raise ValueError("No agent has routing exemplars; cannot build the embedding router.")
+        self.agent_names = names
+        self.centroids = np.stack(centroids)
+        logger.info(f"EmbeddingRouter built centroids for {names} (dim {self.centroids.shape[1]}).")
+
+    @classmethod
+    def from_settings(cls, embeddings: Embeddings, agents: Sequence[BaseAgent]) -> "EmbeddingRouter":
+        return cls(
+            embeddings=embeddings,
+            agents=agents,
+            fallback_agent=settings.AGENT_ROUTER_FALLBACK,
+            min_similarity=settings.AGENT_ROUTER_MIN_SIMILARITY,
+            min_margin=settings.AGENT_ROUTER_MIN_MARGIN,
+            exemplars_file=settings.AGENT_ROUTER_EXEMPLARS_FILE,
+        )
+
+    @staticmethod
+    def _load_exemplars_file(path: str) -> Dict[str, List[str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} must map agent names to lists of example queries.")
+        return {str(name): [str(q) for q in queries] for name, queries in data.items()}
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def route(self, query_embedding: Sequence[float]) -> RoutingDecision:
+        """
+        Scores the query against every agent centroid.
+
+        Args:
+            query_embedding: The query's embedding (from the same model as the exemplars).
+
+        Returns:
+            The RoutingDecision.
+        """
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = self.centroids @ vector
+        scores = {name: float(score) for name, score in zip(self.agent_names, similarities)}
+
+        order = np.argsort(similarities)[::-1]
+        best = float(similarities[order[0]])
+        runner_up = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        margin = best - runner_up
+        if best < self.min_similarity or margin < self.min_margin:
+            return RoutingDecision(self.fallback_agent, scores, margin, fallback=True)
+        return RoutingDecision(self.agent_names[order[0]], scores, margin, fallback=False)
+
+class FollowUpDetector:
+    """
+    Cheap lexical test for queries that continue the previous turn ("and the deadline?",
+    "what about for international students?", "can you explain that?"), which routing
+    should send to the conversation's previous agent rather than score on their own.
+    """
+    # Openings that continue the previous exchange
+    CONTINUATION_STARTS = (
+        "and", "also", "but", "so", "then", "or", "what about", "how about", "what else",
+        "anything else", "same", "more", "ok", "okay",
+    )
+    # Words that refer back to something said earlier
+    ANAPHORA = frozenset((
+        "it", "its", "that", "this", "those", "these", "they", "them", "their",
+        "there", "he", "she", "his", "her", "above", "previous", "same",
+    ))
+
+    def __init__(self, max_words: int = 8):
+        """
+        Args:
+            max_words: Longest query treated as a follow-up because of a back-reference alone.
+        """
+        self.max_words = max_words
+        self._starts = re.compile(
+            r"^(?:%s)\b" % "|".join(re.escape(start) for start in self.CONTINUATION_STARTS)
+        )
+
+    @classmethod
+    def from_settings(cls) -> "FollowUpDetector":
+        return cls(max_words=settings.AGENT_FOLLOWUP_MAX_WORDS)
+
+    def is_follow_up(self, query: str) -> bool:
+        words = re.findall(r"[\w'-]+", query.lower())
+        if not words:
+            return False
+        # A word or two ("deadline?", "more details") only makes sense in context
+        if len(words) <= 2:
+            return True
+        if self._starts.match(" ".join(words)):
+            return True
+        return len(words) <= self.max_words and not self.ANAPHORA.isdisjoint(words)
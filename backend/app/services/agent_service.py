@@ -1,41 +1,145 @@
 # backend/app/services/agent_service.py
 import asyncio
-from typing import List, Dict, Optional # Added Optional
+from typing import List, Dict, Optional, Sequence
 
-# Import Base Agent and specific agent classes
+# Agent classes are loaded through the registry, only for the enabled agents
 from app.agents.base import BaseAgent
-from app.agents.general import GeneralAgent
-from app.agents.admissions import AdmissionsAgent
-from app.agents.ai_expert import AIExpertAgent
+from app.agents.registry import AgentRegistry, enabled_agent_names
+from app.services.ollama_service import OllamaService
+from app.services.knowledge_service import KnowledgeService
+from app.services.agent_router import EmbeddingRouter, FollowUpDetector
+from app.core.config import settings
+from app.core.keywords import KeywordMatcher
 from app.core.logger import logger
 
+class AgentSelection:
+    """The agent chosen for a turn and the confidence recorded with the conversation."""
+
+    def __init__(self, agent: BaseAgent, confidence: float, reason: str):
+        self.agent = agent
+        # Router similarity or should_handle() score of the choice (decayed on sticky turns)
+        self.confidence = confidence
+        # 'router', 'router_fallback', 'keywords', 'follow_up' or 'sticky'
+        self.reason = reason
+        # Close second choice, set when hedged execution should try it too (see ChatService)
+        self.runner_up: Optional[BaseAgent] = None
+        self.runner_up_confidence = 0.0
+
 class AgentService:
     """
     Service responsible for managing and routing queries to the appropriate agent.
     """
-    def __init__(self):
-        # Instantiate all available agents
-        # In a larger application, agent loading could be dynamic or configured
-        self.agents: List[BaseAgent] = [
-            GeneralAgent(),
-            AdmissionsAgent(),
-            AIExpertAgent()
-            # Add more agents here as needed
-        ]
+    def __init__(
+        self,
+        ollama_service: Optional[OllamaService] = None,
+        knowledge_service: Optional[KnowledgeService] = None,
+        router: Optional[EmbeddingRouter] = None,
+        registry: Optional[AgentRegistry] = None,
+        agent_names: Optional[Sequence[str]] = None,
+    ):
+        """
+        Args:
+            ollama_service: Shared LLM service handed to every agent (one is created if omitted).
+            knowledge_service: Shared knowledge service handed to every agent (one is created if omitted).
+            router: Embedding router; usually attached later by the ServiceContainer.
+            registry: Where agent classes are looked up (built-ins plus entry points by default).
+            agent_names: Agents to create, in order (ENABLED_AGENTS by default).
+        """
+        # One instance of each service for all agents, never one per agent
+        ollama_service = ollama_service or OllamaService()
+        knowledge_service = knowledge_service or KnowledgeService()
+        registry = registry or AgentRegistry.from_settings()
+        self.agents: List[BaseAgent] = registry.create(
+            agent_names if agent_names is not None else enabled_agent_names(),
+            ollama_service=ollama_service,
+            knowledge_service=knowledge_service,
+        )
         self.agent_map: Dict[str, BaseAgent] = {agent.get_name(): agent for agent in self.agents}
+        # One compiled pattern over every agent's routing keywords and tool triggers, so a
+        # query is scanned once per turn whichever agents and tools look at it
+        groups: Dict[str, Dict[str, float]] = {}
+        for agent in self.agents:
+            groups.update(agent.keyword_groups())
+        self.keyword_matcher = KeywordMatcher(groups)
+        for agent in self.agents:
+            agent.keyword_matcher = self.keyword_matcher
+        # Embedding router over the agents' exemplar queries; attached by the ServiceContainer
+        # once the embedding model is loaded. Without it, agents are scored with should_handle()
+        self.router = router
+        # Keeps a conversation with its previous agent on follow-up turns
+        self.follow_up_detector = FollowUpDetector.from_settings()
         logger.info(f"AgentService initialized with agents: {[agent.get_name() for agent in self.agents]}")
 
-    async def select_agent(self, query: str, history: list[Dict[str, str]]) -> BaseAgent:
+    def follow_up_selection(self, query: str, previous_agent: Optional[str], previous_confidence: Optional[float]) -> Optional[AgentSelection]:
+        """
+        Keeps the conversation's previous agent, without scoring, when the query reads as a
+        follow-up and doesn't carry another agent's strong keywords.
+
+        Args:
+            query: The user's query.
+            previous_agent: Agent that answered the conversation's previous turn.
+            previous_confidence: The confidence recorded with that choice.
+
+        Returns:
+            The sticky AgentSelection, or None if the query should be scored.
+        """
+        agent = self.agent_map.get(previous_agent) if previous_agent else None
+        if agent is None or not settings.AGENT_STICKY_ROUTING:
+            return None
+        # Stickiness wears off over consecutive follow-ups, so a drifting conversation is rescored eventually
+        if (previous_confidence or 0.0) < settings.AGENT_STICKY_MIN_CONFIDENCE:
+            return None
+        if not self.follow_up_detector.is_follow_up(query):
+            return None
+        hits = self.keyword_matcher.match(query)
+        for name in self.agent_map:
+            if name != previous_agent and hits.score(name) >= settings.AGENT_STICKY_SWITCH_KEYWORD_SCORE:
+                logger.debug(f"Follow-up carries {name} keywords {hits.phrases(name)}; rescoring.")
+                return None
+        logger.info(f"Selected agent: '{previous_agent}' (follow-up, kept from the previous turn)")
+        return AgentSelection(agent, previous_confidence * settings.AGENT_STICKY_DECAY, "follow_up")
+
+    async def select_agent(self, query: str, history: list[Dict[str, str]], query_embedding: Optional[List[float]] = None) -> BaseAgent:
         """
         Selects the best agent to handle the query based on confidence scores.
 
         Args:
             query: The user's query.
             history: The conversation history.
+            query_embedding: The query's embedding (shared with retrieval), if available.
 
         Returns:
             The selected BaseAgent instance.
         """
+        return (await self.select(query, history, query_embedding)).agent
+
+    async def select(
+        self,
+        query: str,
+        history: list[Dict[str, str]],
+        query_embedding: Optional[List[float]] = None,
+        previous_agent: Optional[str] = None,
+        previous_confidence: Optional[float] = None,
+    ) -> AgentSelection:
+        """
+        Scores the agents for the query.
+
+        With a router and the query's embedding, this is one matrix-vector product against
+        the agents' exemplar centroids; otherwise every agent's should_handle() is asked.
+        Given the conversation's previous agent, it is kept unless another agent scores
+        clearly higher.
+
+        Args:
+            query: The user's query.
+            history: The conversation history.
+            query_embedding: The query's embedding (shared with retrieval), if available.
+            previous_agent: Agent that answered the conversation's previous turn, if any.
+            previous_confidence: The confidence recorded with that choice.
+
+        Returns:
+            The AgentSelection.
+        """
+        previous = self.agent_map.get(previous_agent) if previous_agent and settings.AGENT_STICKY_ROUTING else None
         logger.debug(f"Selecting agent for query: '{query}'")
         if not self.agents:
             logger.error("No agents available in AgentService!")
@@ -43,11 +147,33 @@ class AgentService:
             # Ensure GeneralAgent is correctly typed or handle its absence
             general_agent = self.agent_map.get("GeneralAgent")
             if general_agent:
-                return general_agent
+                return AgentSelection(general_agent, 0.0, "keywords")
             # This case should ideally not happen if GeneralAgent is always included
             # Raising an error might be better in a production scenario
             raise ValueError("AgentService has no agents configured, cannot select agent.")
 
+        if self.router is not None and query_embedding is not None:
+            decision = self.router.route(query_embedding)
+            selected = self.agent_map.get(decision.agent_name)
+            if selected is not None:
+                logger.debug(f"Routing scores: { {name: round(score, 3) for name, score in decision.scores.items()} }")
+                if decision.fallback and previous is not None:
+                    # No agent is a clear match: staying in the conversation's lane beats the generic fallback
+                    logger.info(f"Selected agent: '{previous_agent}' (no clear routing match, kept from the previous turn)")
+                    return AgentSelection(previous, (previous_confidence or 0.0) * settings.AGENT_STICKY_DECAY, "sticky")
+                logger.info(
+                    f"Selected agent: '{decision.agent_name}' by embedding routing "
+                    f"(margin {decision.margin:.3f}{', fallback' if decision.fallback else ''})"
+                )
+                selection = AgentSelection(
+                    selected,
+                    decision.scores.get(decision.agent_name, 0.0),
+                    "router_fallback" if decision.fallback else "router",
+                )
+                return self._add_runner_up(selection, decision.scores, settings.AGENT_HEDGE_MARGIN)
+            logger.warning(f"Router chose unknown agent '{decision.agent_name}'; using keyword scores.")
+
+        logger.debug(f"Keyword hits: {self.keyword_matcher.match(query).hits}")
         # Get confidence scores from all agents concurrently
         # Coroutines to run: agent.should_handle(query, history)
         tasks = [agent.should_handle(query, history) for agent in self.agents]
@@ -62,6 +188,9 @@ class AgentService:
             if score > best_score:
                 best_score = score
                 selected_agent = agent
+            # The previous agent wins ties
+            if agent is previous and score == best_score:
+                selected_agent = agent
 
         # Optional: Add a threshold? If no agent is confident enough, default to General?
         # threshold = 0.6
@@ -70,7 +199,26 @@ class AgentService:
         #     selected_agent = self.agent_map.get("GeneralAgent", selected_agent) # Fallback carefully
 
         logger.info(f"Selected agent: '{selected_agent.get_name()}' with score {best_score:.2f}")
-        return selected_agent
+        selection = AgentSelection(selected_agent, best_score, "keywords")
+        keyword_scores = {agent.get_name(): score for agent, score in zip(self.agents, scores)}
+        return self._add_runner_up(selection, keyword_scores, settings.AGENT_HEDGE_KEYWORD_MARGIN)
+
+    def _add_runner_up(self, selection: AgentSelection, scores: Dict[str, float], max_margin: float) -> AgentSelection:
+        """With hedging on, marks the best other agent as runner-up if it scored within max_margin of the choice."""
+        if not settings.AGENT_HEDGING_ENABLED:
+            return selection
+        chosen = selection.agent.get_name()
+        others = [(score, name) for name, score in scores.items() if name != chosen and name in self.agent_map]
+        if not others:
+            return selection
+        score, name = max(others)
+        # The router's fallback agent may itself score below the others (negative margin)
+        margin = scores.get(chosen, selection.confidence) - score
+        if margin < max_margin:
+            selection.runner_up = self.agent_map[name]
+            selection.runner_up_confidence = score
+            logger.info(f"Routing is ambiguous ('{chosen}' vs '{name}', margin {margin:.3f}); hedging.")
+        return selection
 
     def get_agent_by_name(self, name: str) -> Optional[BaseAgent]:
          """Retrieves an agent instance by its name."""
@@ -1,47 +1,446 @@
 # backend/app/services/chat_service.py
+import asyncio
+from contextlib import contextmanager
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Iterator
 
 from app.repositories.chat_history_repository import ChatHistoryRepository
-from app.services.ollama_service import OllamaService
+from app.repositories.history_writer import HistoryWriteBehind
+from app.services.ollama_service import OllamaService, is_error_response
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.conversation_memory import ConversationMemory
 from app.core.logger import logger
 from app.core.config import settings
+from app.core.concurrency import current_conversation_key, SingleFlight
+from app.core.metrics import (
+    RequestTimings, current_request_timings, stage,
+    CHAT_REQUESTS, CHAT_IN_FLIGHT, CHAT_LATENCY,
+)
 # We'll use LangChain components here
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from app.services.vector_store_service import VectorStoreService
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.documents import Document
-from app.services.agent_service import AgentService
-from app.agents.base import BaseAgent
+from app.services.agent_service import AgentService, AgentSelection
+from app.agents.base import BaseAgent, PreparedPrompt
+from app.models.chat_history import Conversation
 
 class ChatService:
     """
     Service responsible for handling the core chat logic, including
     history management, agent routing (future), RAG (future), and LLM interaction.
     """
-    def __init__(self, db_session: AsyncSession, ollama_service: OllamaService):
+    # Messages of history (including the current query) given to the agents when conversation memory is off
+    HISTORY_MESSAGES = 10
+    # Characters of a hedged candidate's gathered material embedded to judge its relevance
+    HEDGE_EVIDENCE_CHARS = 2000
+
+    def __init__(
+        self,
+        db_session: AsyncSession,
+        ollama_service: OllamaService,
+        vector_store_service: Optional[VectorStoreService] = None,
+        agent_service: Optional[AgentService] = None,
+        single_flight: Optional[SingleFlight] = None,
+        semantic_cache: Optional[SemanticAnswerCache] = None,
+        history_writer: Optional[HistoryWriteBehind] = None,
+        memory: Optional[ConversationMemory] = None,
+    ):
         """
         Initializes the ChatService.
 
         Args:
             db_session: The SQLAlchemy AsyncSession.
             ollama_service: An instance of the OllamaService.
-            # TODO: Inject other services/components like AgentService, VectorStoreService later
+            vector_store_service: Shared VectorStoreService (loaded once at startup).
+            agent_service: Shared AgentService holding the agent instances.
+            single_flight: Shared SingleFlight used to coalesce identical first-turn queries.
+            semantic_cache: Shared SemanticAnswerCache for paraphrased first-turn queries.
+            history_writer: Shared write-behind writer; when set, messages are persisted in the background.
+            memory: Shared ConversationMemory; when set, history is token-budgeted and summarized.
         """
         self.db_session = db_session
         self.ollama_service = ollama_service
-        self.history_repo = ChatHistoryRepository(db_session)
-        # Initialize VectorStoreService (could also be injected)
-        self.vector_store_service = VectorStoreService()
-        # Initialize AgentService
-        self.agent_service = AgentService()
-        # TODO: Initialize KnowledgeService (or make clients accessible)
+        self.history_repo = ChatHistoryRepository(db_session, writer=history_writer)
+        # Heavy services are normally injected from the app-wide ServiceContainer;
+        # building them here reloads the embedding model and FAISS index.
+        self.vector_store_service = vector_store_service or VectorStoreService()
+        self.agent_service = agent_service or AgentService(ollama_service=ollama_service)
+        self.single_flight = single_flight
+        self.semantic_cache = semantic_cache
+        self.memory = memory
+        # This turn's query embedding, computed once and shared by agent routing, retrieval
+        # and the semantic cache (a ChatService serves a single turn)
+        self._query_embedding: Optional[asyncio.Task] = None
+        # The conversation and routing choice of this turn (the routing record is updated if
+        # a hedged run ends up answering with the runner-up)
+        self._conversation: Optional[Conversation] = None
+        self._selection: Optional[AgentSelection] = None
+        # Whether this turn opens its conversation (decided from the stored conversation, not
+        # from the budget-trimmed history)
+        self._first_turn = True
 
     def _format_docs(self, docs: List[Document]) -> str:
         """Helper function to format retrieved documents into a string for the prompt."""
         return "\n\n".join(f"Source {i+1}:\n{doc.page_content}" for i, doc in enumerate(docs))
 
+    async def _prepare_turn(self, query: str, conversation_id_str: Optional[str]) -> Tuple[int, List[Dict[str, str]], BaseAgent, Optional[asyncio.Task]]:
+        """
+        Runs the steps shared by the blocking and streaming paths, overlapping the
+        ones that don't depend on each other:
+
+            speculative retrieval ----------------------------------------------+
+            conversation lookup -> prior history -> [persist user message        |
+                                                     || agent selection] --------+-> agent
+
+        The user message is appended to the history in memory, so persisting it and
+        scoring the agents can run at the same time. Only one DB statement is in
+        flight at any point (an AsyncSession must not be used concurrently).
+
+        Returns:
+            (conversation id, history, selected agent, speculative retrieval task or None)
+        """
+        self._query_embedding = self._start_query_embedding(query)
+        speculative = self._start_speculative_retrieval(query)
+
+        # 1. Get or Create Conversation
+        with stage("conversation_lookup"):
+            conversation = await self.history_repo.get_or_create_conversation(conversation_id_str)
+        conv_id = conversation.id # Use the integer ID internally
+        # Lets the LLM admission queue schedule this turn fairly against other conversations
+        current_conversation_key.set(str(conv_id))
+
+        # 2. Prior History (a conversation created just now has none), ending with the current query
+        history_list: List[Dict[str, str]] = [{"role": "user", "content": query}]
+        continuing = conversation_id_str is not None and str(conv_id) == conversation_id_str.strip()
+        self._first_turn = not continuing or await self._is_empty_conversation(conversation)
+        if continuing:
+            with stage("history_load"):
+                if self.memory is not None:
+                    # Summary + recent turns within the token budget
+                    history_list = await self.memory.load(self.history_repo, conversation, query)
+                else:
+                    history_list = await self.history_repo.get_conversation_history(conv_id, limit=self.HISTORY_MESSAGES - 1)
+                    history_list.append({"role": "user", "content": query})
+
+        # 3. Persist the User Message || Select Agent
+        async def persist_user_message():
+            with stage("persist_user_message"):
+                await self.history_repo.add_message(conv_id, "user", query)
+
+        # Routing state of the previous turn (a new conversation has none)
+        previous_agent, previous_confidence = None, None
+        if not self._first_turn:
+            previous_agent, previous_confidence = conversation.last_agent, conversation.last_agent_confidence
+
+        async def select_agent() -> AgentSelection:
+            with stage("agent_selection"):
+                # Follow-ups stay with the previous agent without scoring (or waiting for the embedding)
+                selection = self.agent_service.follow_up_selection(query, previous_agent, previous_confidence)
+                if selection is not None:
+                    return selection
+                embedding = await self._embedded_query() if self.agent_service.router is not None else None
+                return await self.agent_service.select(
+                    query, history_list, query_embedding=embedding,
+                    previous_agent=previous_agent, previous_confidence=previous_confidence,
+                )
+
+        _, selection = await asyncio.gather(persist_user_message(), select_agent())
+        selected_agent = selection.agent
+        self._conversation, self._selection = conversation, selection
+        # Committed with the user message
+        self.history_repo.record_routing(conversation, selected_agent.get_name(), selection.confidence)
+        self._set_timings_agent(selected_agent)
+        if not selected_agent.uses_retrieval and not (selection.runner_up is not None and selection.runner_up.uses_retrieval):
+            self._discard(speculative)
+            speculative = None
+
+        return conv_id, history_list, selected_agent, speculative
+
+    @staticmethod
+    def _set_timings_agent(agent: BaseAgent):
+        timings = current_request_timings.get()
+        if timings is not None:
+            timings.agent = agent.get_name()
+
+    def _start_query_embedding(self, query: str) -> Optional[asyncio.Task]:
+        """Starts encoding the query if anything this turn will use the embedding."""
+        if (
+            self.agent_service.router is None
+            and self.semantic_cache is None
+            and not any(agent.uses_retrieval for agent in self.agent_service.agents)
+        ):
+            return None
+        return asyncio.create_task(self.vector_store_service.aembed_query(query))
+
+    async def _embedded_query(self) -> Optional[List[float]]:
+        """The turn's query embedding, or None if it isn't available (callers then encode the text themselves)."""
+        if self._query_embedding is None:
+            return None
+        try:
+            # Shielded: it is shared, and one consumer being cancelled must not cancel it for the others
+            return await asyncio.shield(self._query_embedding)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Query embedding failed: {e}")
+            return None
+
+    def _start_speculative_retrieval(self, query: str) -> Optional[asyncio.Task]:
+        """Starts RAG retrieval before the agent is known, if any agent could use it."""
+        if not settings.CHAT_SPECULATIVE_RETRIEVAL:
+            return None
+        if not any(agent.uses_retrieval for agent in self.agent_service.agents):
+            return None
+        return asyncio.create_task(self._speculative_retrieval(query))
+
+    async def _speculative_retrieval(self, query: str) -> Optional[List[Document]]:
+        # Never raises (except on cancel): a failure just means retrieving again on the critical path
+        try:
+            with stage("retrieval_speculative"):
+                return await self._search_context(query)
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed, will retry if needed: {e}")
+            return None
+
+    @staticmethod
+    def _discard(speculative: Optional[asyncio.Task]):
+        if speculative is not None and not speculative.done():
+            speculative.cancel()
+
+    async def _search_context(self, query: str) -> List[Document]:
+        # Embedding + FAISS search run on the bounded inference executor, off the event loop
+        if self.vector_store_service.supports_search_by_vector:
+            embedding = await self._embedded_query()
+            if embedding is not None:
+                return await self.vector_store_service.asearch_by_vector(embedding, k=3, query=query)
+        return await self.vector_store_service.asearch_similar_documents(query, k=3)
+
+    async def _retrieve_context(self, agent: BaseAgent, query: str, speculative: Optional[asyncio.Task] = None) -> List[Document]:
+        """Performs RAG (context retrieval) for agents that use it, reusing the speculative retrieval if one ran."""
+        if not agent.uses_retrieval:
+            self._discard(speculative)
+            return []
+        logger.debug(f"Retrieving context documents via RAG for {agent.get_name()}")
+        context_docs: Optional[List[Document]] = None
+        if speculative is not None:
+            # Time this turn still had to wait for it, i.e. retrieval's share of the critical path.
+            # Shielded: a coalesced first turn may be sharing it with other requests.
+            with stage("retrieval_wait"):
+                context_docs = await asyncio.shield(speculative)
+        if context_docs is None:
+            with stage("retrieval"):
+                context_docs = await self._search_context(query)
+        logger.debug(f"Retrieved {len(context_docs)} documents for RAG.")
+        return context_docs
+
+    async def _run_agent(self, agent: BaseAgent, query: str, history: List[Dict[str, str]], speculative: Optional[asyncio.Task] = None) -> Tuple[str, List[Document], BaseAgent]:
+        """Retrieval plus the agent's tool use and LLM call (no persistence). Also returns the agent that answered."""
+        if self._selection is not None and self._selection.runner_up is not None:
+            agent, prepared, context_docs = await self._hedged_prepare(agent, self._selection.runner_up, query, history, speculative)
+            return await agent.respond(prepared), context_docs, agent
+        context_docs = await self._retrieve_context(agent, query, speculative)
+        # The agent's process method handles prompt creation, tool use (if any), and LLM call
+        ai_response = await agent.process(
+            query=query,
+            history=history,
+            context_docs=context_docs # Pass RAG context only if relevant for the agent
+        )
+        return ai_response, context_docs, agent
+
+    async def _gather_for(self, agent: BaseAgent, query: str, history: List[Dict[str, str]], speculative: Optional[asyncio.Task]) -> Tuple[PreparedPrompt, List[Document]]:
+        """One hedged candidate: its retrieval and tool use, without the LLM call."""
+        # Not _retrieve_context for non-retrieval agents: it would cancel the speculative
+        # retrieval the other candidate may be waiting on
+        context_docs = await self._retrieve_context(agent, query, speculative) if agent.uses_retrieval else []
+        prepared = await agent.prepare(query, history, context_docs)
+        return prepared, context_docs
+
+    async def _hedged_prepare(
+        self, primary: BaseAgent, runner_up: BaseAgent, query: str, history: List[Dict[str, str]], speculative: Optional[asyncio.Task]
+    ) -> Tuple[BaseAgent, PreparedPrompt, List[Document]]:
+        """
+        Hedged execution for ambiguous routing: both agents gather their tool results and
+        documents concurrently under a shared deadline (AGENT_HEDGE_TIMEOUT_SECONDS), then
+        the one whose material is more relevant to the query goes on to the LLM call. Only
+        one LLM generation runs per turn; the other candidate's work is cancelled.
+
+        Returns:
+            (answering agent, its prepared prompt, its context documents)
+        """
+        tasks: Dict[asyncio.Task, BaseAgent] = {
+            asyncio.create_task(self._gather_for(agent, query, history, speculative)): agent
+            for agent in (primary, runner_up)
+        }
+        try:
+            with stage("agent_prepare_hedged"):
+                done, _ = await asyncio.wait(tasks, timeout=settings.AGENT_HEDGE_TIMEOUT_SECONDS)
+                results: Dict[BaseAgent, Tuple[PreparedPrompt, List[Document]]] = {}
+                for task in done:
+                    if task.exception() is not None:
+                        logger.warning(f"Hedged run of {tasks[task].get_name()} failed: {task.exception()}")
+                    else:
+                        results[tasks[task]] = task.result()
+
+                if not results:
+                    # Nothing usable by the deadline: carry on with the primary alone, as if unhedged
+                    primary_task = next(task for task, agent in tasks.items() if agent is primary)
+                    for task in tasks:
+                        if task is not primary_task:
+                            task.cancel()
+                    prepared, context_docs = await primary_task
+                    return primary, prepared, context_docs
+
+                winner = await self._pick_hedge_winner(query, results, primary) if len(results) > 1 else next(iter(results))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        if winner is not primary:
+            self._set_timings_agent(winner)
+        logger.info(f"Hedged routing answered with {winner.get_name()} (candidates: {[agent.get_name() for agent in results]}).")
+        prepared, context_docs = results[winner]
+        return winner, prepared, context_docs
+
+    async def _pick_hedge_winner(self, query: str, results: Dict[BaseAgent, Tuple[PreparedPrompt, List[Document]]], primary: BaseAgent) -> BaseAgent:
+        """
+        The candidate whose gathered material is most similar to the query (cosine of the
+        embeddings; one batched encode). The primary choice wins ties and missing signals.
+        """
+        agents = list(results)
+        evidence = [agent.evidence(results[agent][0])[:self.HEDGE_EVIDENCE_CHARS] for agent in agents]
+        query_vector = await self._embedded_query()
+        if query_vector is None or not any(evidence):
+            return primary
+        try:
+            vectors = await self.vector_store_service.aembed_documents([text or " " for text in evidence])
+        except Exception as e:
+            logger.warning(f"Could not score hedged candidates, keeping {primary.get_name()}: {e}")
+            return primary
+
+        def cosine(a: List[float], b: List[float]) -> float:
+            norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+            return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+        relevance = {agent: (cosine(query_vector, vector) if text else -1.0) for agent, text, vector in zip(agents, evidence, vectors)}
+        logger.debug(f"Hedged candidate relevance: { {agent.get_name(): round(score, 3) for agent, score in relevance.items()} }")
+        best = max(agents, key=lambda agent: relevance[agent])
+        return primary if relevance.get(primary, -1.0) >= relevance[best] else best
+
+    async def _answer_first_turn(self, agent: BaseAgent, query: str, history: List[Dict[str, str]], speculative: Optional[asyncio.Task] = None) -> Tuple[str, List[Document], BaseAgent]:
+        """
+        Answers a history-free turn, reusing work where possible: a semantically
+        equivalent cached answer, or an identical query already in flight.
+        """
+        if self.semantic_cache is not None:
+            with stage("semantic_cache_lookup"):
+                cached = await self.semantic_cache.lookup(query, agent.get_name(), embedding=await self._embedded_query())
+            if cached is not None:
+                self._discard(speculative)
+                return cached["answer"], [], agent
+
+        if self.single_flight is None:
+            return await self._run_agent_and_cache(agent, query, history, speculative)
+        # History-free turns with the same query and agent produce the same prompt,
+        # so concurrent ones share a single pipeline execution.
+        flight_key = (self._normalize_query(query), agent.get_name())
+        return await self.single_flight.do(
+            flight_key,
+            lambda: self._run_agent_and_cache(agent, query, history, speculative),
+            # Joining another request's execution: this turn's own prefetches won't be used
+            on_join=lambda: self._release_prefetches(speculative),
+        )
+
+    def _release_prefetches(self, speculative: Optional[asyncio.Task]):
+        """Cancels this turn's speculative retrieval and query embedding once nothing will use them."""
+        self._discard(speculative)
+        embedding, self._query_embedding = self._query_embedding, None
+        self._discard(embedding)
+
+    async def _run_agent_and_cache(self, agent: BaseAgent, query: str, history: List[Dict[str, str]], speculative: Optional[asyncio.Task] = None) -> Tuple[str, List[Document], BaseAgent]:
+        """_run_agent for a first turn, recording the answer in the semantic cache."""
+        ai_response, context_docs, answered_by = await self._run_agent(agent, query, history, speculative)
+        # Under the routed agent's name, which is what later lookups for this query use
+        await self._remember_answer(agent, query, ai_response)
+        return ai_response, context_docs, answered_by
+
+    async def _remember_answer(self, agent: BaseAgent, query: str, ai_response: str):
+        """Caches a completed answer for paraphrases of `query` (never call it with a partial stream)."""
+        if self.semantic_cache is not None and ai_response and not is_error_response(ai_response):
+            await self.semantic_cache.store(query, agent.get_name(), ai_response, embedding=await self._embedded_query())
+
+    def _commit_user_turn(self) -> asyncio.Task:
+        """
+        Commits the conversation and the user message while the agent works (the session is
+        otherwise idle until the reply is persisted), so an abandoned turn is still recorded.
+        Must be awaited before the session is used again.
+        """
+        return asyncio.create_task(self.db_session.commit())
+
+    async def _settle_user_turn(self, conv_id: int, user_turn_commit: asyncio.Task):
+        """
+        Called when a turn ends without a reply (client disconnected, or an error): the user
+        message stays recorded, no reply is stored. Waits for the user-turn commit so the
+        session isn't rolled back or closed under it.
+        """
+        try:
+            await asyncio.shield(user_turn_commit)
+        except asyncio.CancelledError:
+            # Cancelled again while waiting; the commit itself still runs to completion
+            pass
+        except Exception as e:
+            logger.warning(f"Could not record the abandoned turn of conversation {conv_id}: {e}")
+
+    def _record_answering_agent(self, agent: BaseAgent) -> str:
+        """
+        Points the conversation's routing record at the agent that actually answered (a
+        hedged run may have switched to the runner-up). Written with the reply.
+        """
+        selection = self._selection
+        if selection is not None and self._conversation is not None and agent is not selection.agent:
+            confidence = selection.runner_up_confidence if agent is selection.runner_up else selection.confidence
+            self.history_repo.record_routing(self._conversation, agent.get_name(), confidence)
+        return agent.get_name()
+
+    @contextmanager
+    def _instrument_turn(self, mode: str) -> Iterator[RequestTimings]:
+        """Tracks one chat turn: in-flight gauge, outcome counter, latency and stage timings."""
+        timings = RequestTimings()
+        # Each request/WebSocket turn runs in its own task, so this does not leak across turns
+        current_request_timings.set(timings)
+        outcome = "error"
+        CHAT_IN_FLIGHT.inc(mode=mode)
+        try:
+            yield timings
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            CHAT_IN_FLIGHT.dec(mode=mode)
+            timings.finish()
+            CHAT_REQUESTS.inc(mode=mode, agent=timings.agent, outcome=outcome)
+            CHAT_LATENCY.observe(timings.elapsed(), mode=mode, agent=timings.agent)
+
+    async def _is_empty_conversation(self, conversation: Conversation) -> bool:
+        """True when an existing conversation has no earlier turn (no routing record, summary or message)."""
+        if conversation.last_agent is not None or conversation.summary is not None:
+            return False
+        return not await self.history_repo.has_messages(conversation.id)
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Case/whitespace/trailing-punctuation insensitive form of a query, used as a cache key."""
+        return " ".join(query.lower().split()).rstrip("?!. ")
+
+    def _summarize_docs(self, context_docs: List[Document]) -> Optional[List[Dict[str, Any]]]:
+        """Short source/content previews of the RAG documents for the API response."""
+        if not context_docs:
+            return None
+        return [{"source": doc.metadata.get("source", "Unknown"), "content": doc.page_content[:100] + "..."} for doc in context_docs]
+
     async def process_user_message(self, query: str, conversation_id_str: Optional[str]) -> Dict[str, Any]:
         """
         Processes a user's message, manages history, interacts with LLM,
@@ -57,41 +456,31 @@ class ChatService:
         """
         logger.info(f"Processing query for conversation '{conversation_id_str}': '{query}'")
 
-        # 1. Get or Create Conversation
-        conversation = await self.history_repo.get_or_create_conversation(conversation_id_str)
-        conv_id = conversation.id # Use the integer ID internally
+        with self._instrument_turn("blocking") as timings:
+            # 1-4. Conversation, history and agent selection
+            conv_id, history_list, selected_agent, speculative = await self._prepare_turn(query, conversation_id_str)
+            selected_agent_name = selected_agent.get_name()
+            user_turn_commit = self._commit_user_turn()
 
-        # 2. Add User Message to History
-        await self.history_repo.add_message(conv_id, "user", query)
-
-        # 3. Retrieve Recent History (formatted for LangChain)
-        history_list: List[Dict[str, str]] = await self.history_repo.get_conversation_history(conv_id)
-
-        # 4. Select Agent using AgentService
-        selected_agent: BaseAgent = await self.agent_service.select_agent(query, history_list)
-        selected_agent_name = selected_agent.get_name()
-
-        # 5. Perform RAG (Context Retrieval) - Potentially agent-specific later
-        context_docs: List[Document] = [] # Ensure initialization with type hint
-        # Only Admissions agent uses RAG for now in this setup
-        if selected_agent_name == "AdmissionsAgent":
-            logger.debug(f"Retrieving context documents via RAG for {selected_agent_name}")
-            retriever = self.vector_store_service.get_retriever(k=3)
-            # TODO: Verify async support for retriever
-            context_docs = retriever.get_relevant_documents(query)
-            logger.debug(f"Retrieved {len(context_docs)} documents for RAG.")
-        # formatted_context = self._format_docs(context_docs) # Formatting now done within agent process
-
-        # 6. Process Query using Selected Agent
-        # The agent's process method now handles prompt creation, tool use (if any), and LLM call
-        ai_response = await selected_agent.process(
-            query=query,
-            history=history_list,
-            context_docs=context_docs # Pass RAG context only if relevant for the agent
-        )
+            # 5-6. RAG and agent processing (cancelled if the client disconnects)
+            try:
+                if self._first_turn:
+                    ai_response, context_docs, answered_by = await self._answer_first_turn(selected_agent, query, history_list, speculative)
+                else:
+                    ai_response, context_docs, answered_by = await self._run_agent(selected_agent, query, history_list, speculative)
+            except asyncio.CancelledError:
+                logger.info(f"Client disconnected; abandoning turn for conversation {conv_id} (user message kept, no reply stored).")
+                await self._settle_user_turn(conv_id, user_turn_commit)
+                raise
+            except Exception:
+                await self._settle_user_turn(conv_id, user_turn_commit)
+                raise
 
-        # 7. Add AI Response to History
-        await self.history_repo.add_message(conv_id, "ai", ai_response)
+            # 7. Add AI Response to History
+            with stage("persist_ai_message"):
+                await user_turn_commit
+                selected_agent_name = self._record_answering_agent(answered_by)
+                await self.history_repo.add_message(conv_id, "ai", ai_response)
 
         # 8. Return Result
         result = {
@@ -99,7 +488,96 @@ class ChatService:
             "conversation_id": str(conv_id),
             "agent_name": selected_agent_name,
             # Optionally format/include context_docs if needed for frontend display
-            "context_docs": [{"source": doc.metadata.get("source", "Unknown"), "content": doc.page_content[:100] + "..."} for doc in context_docs] if context_docs else None
+            "context_docs": self._summarize_docs(context_docs),
+            "debug_info": {"stage_timings_ms": timings.as_debug_info()}
         }
         logger.info(f"Processed message using {selected_agent_name}, response generated for conversation {conv_id}.")
-        return result 
\ No newline at end of file
+        return result
+
+    async def process_user_message_stream(self, query: str, conversation_id_str: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_user_message.
+
+        Yields event dicts in order:
+            {'event': 'metadata', 'conversation_id', 'agent_name', 'context_docs'}
+            {'event': 'token', 'content'}   (one per LLM chunk)
+            {'event': 'done', 'conversation_id', 'agent_name', 'response'}
+
+        The full answer is persisted once the stream has finished. If generation fails
+        mid-stream, LLMStreamError propagates (the caller sends an error event) and no AI
+        message is stored.
+        """
+        logger.info(f"Streaming query for conversation '{conversation_id_str}': '{query}'")
+
+        with self._instrument_turn("stream") as timings:
+            conv_id, history_list, selected_agent, speculative = await self._prepare_turn(query, conversation_id_str)
+            selected_agent_name = selected_agent.get_name()
+            first_turn = self._first_turn
+            user_turn_commit = self._commit_user_turn()
+
+            # Cancelled (or closed) if the client disconnects mid-stream
+            try:
+                cached = None
+                if first_turn and self.semantic_cache is not None:
+                    with stage("semantic_cache_lookup"):
+                        cached = await self.semantic_cache.lookup(query, selected_agent_name, embedding=await self._embedded_query())
+                prepared: Optional[PreparedPrompt] = None
+                if cached:
+                    self._discard(speculative)
+                    context_docs = []
+                elif self._selection is not None and self._selection.runner_up is not None:
+                    selected_agent, prepared, context_docs = await self._hedged_prepare(
+                        selected_agent, self._selection.runner_up, query, history_list, speculative
+                    )
+                    selected_agent_name = selected_agent.get_name()
+                else:
+                    context_docs = await self._retrieve_context(selected_agent, query, speculative)
+
+                # Send routing/retrieval info first so the client can render it before the first token
+                yield {
+                    "event": "metadata",
+                    "conversation_id": str(conv_id),
+                    "agent_name": selected_agent_name,
+                    "context_docs": self._summarize_docs(context_docs),
+                }
+
+                if cached:
+                    ai_response = cached["answer"]
+                    yield {"event": "token", "content": ai_response}
+                else:
+                    chunks: List[str] = []
+                    if prepared is not None:
+                        stream = selected_agent.respond_stream(prepared)
+                    else:
+                        stream = selected_agent.process_stream(query=query, history=history_list, context_docs=context_docs)
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        yield {"event": "token", "content": chunk}
+                    ai_response = "".join(chunks)
+            except (asyncio.CancelledError, GeneratorExit):
+                logger.info(f"Client disconnected; abandoning turn for conversation {conv_id} (user message kept, no reply stored).")
+                await self._settle_user_turn(conv_id, user_turn_commit)
+                raise
+            except Exception:
+                await self._settle_user_turn(conv_id, user_turn_commit)
+                raise
+
+            # Only reached once the stream finished cleanly: a failed or abandoned stream left
+            # through the handlers above, so a partial answer is never cached
+            if first_turn and not cached:
+                # Under the routed agent's name, which is what later lookups for this query use
+                await self._remember_answer(self._selection.agent if self._selection is not None else selected_agent, query, ai_response)
+
+            with stage("persist_ai_message"):
+                await user_turn_commit
+                self._record_answering_agent(selected_agent)
+                await self.history_repo.add_message(conv_id, "ai", ai_response)
+
+            yield {
+                "event": "done",
+                "conversation_id": str(conv_id),
+                "agent_name": selected_agent_name,
+                "response": ai_response,
+                "debug_info": {"stage_timings_ms": timings.as_debug_info()},
+            }
+        logger.info(f"Streamed message using {selected_agent_name} for conversation {conv_id}.")
@@ -0,0 +1,233 @@
+# backend/app/services/conversation_memory.py
+import asyncio
+import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.core.concurrency import current_llm_priority, PRIORITY_BACKGROUND
+from app.core.config import settings
+from app.core.database import session_scope
+from app.core.logger import logger
+from app.core.metrics import current_request_timings, stage
+from app.core.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens, truncate_tokens
+from app.models.chat_history import Conversation
+from app.repositories.chat_history_repository import ChatHistoryRepository
+from app.repositories.history_writer import HistoryWriteBehind, utc_naive
+from app.services.ollama_service import OllamaService, is_error_response
+
+class ConversationMemory:
+    """
+    Token-budgeted conversation memory.
+
+    The most recent messages are kept verbatim, newest first, until token_budget is spent
+    (the latest exchange is always kept, truncated if it alone exceeds the budget).
+    Anything older is folded into the conversation's rolling summary (Conversation.summary),
+    which is given to the agents as a system message ahead of the verbatim turns. Prompt
+    history therefore stays within token_budget + summary_max_tokens however long the
+    conversation runs.
+
+    Folding is incremental (previous summary + the newly folded messages, never the whole
+    conversation) and runs in a background task at PRIORITY_BACKGROUND, so it only uses
+    LLM capacity interactive turns leave free. Until it lands, the overflowing messages
+    are simply left out of the prompt.
+    """
+    # A fold goes past the overflow until the verbatim part is down to this share of the
+    # budget, so the following turns don't each need a summary update
+    FOLD_TARGET_RATIO = 0.5
+    # Messages always kept verbatim (the latest exchange), truncated if they don't fit the budget
+    KEEP_LATEST_MESSAGES = 2
+    # Least tokens a kept message is truncated to, however little budget the query leaves
+    MIN_MESSAGE_TOKENS = 32
+
+    def __init__(
+        self,
+        ollama_service: OllamaService,
+        token_budget: int = 1024,
+        summary_max_tokens: int = 256,
+        max_messages: int = 40,
+        history_writer: Optional[HistoryWriteBehind] = None,
+        summary_tier: Optional[str] = None,
+    ):
+        """
+        Args:
+            ollama_service: Used for the summary updates.
+            token_budget: Tokens of verbatim history per prompt, including the current query.
+            summary_max_tokens: Upper bound on the rolling summary.
+            max_messages: Most unsummarized messages read per turn (and folded per update).
+            history_writer: The shared write-behind writer, if enabled, so unflushed messages are seen.
+            summary_tier: Model tier writing the summaries (the large model when None).
+        """
+        self.ollama_service = ollama_service
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.max_messages = max_messages
+        self.history_writer = history_writer
+        self.summary_tier = summary_tier
+        self.prompt = self.build_prompt()
+        # Conversations with a summary update in flight (one at a time per conversation)
+        self._folding: Set[int] = set()
+        # Strong references so running updates aren't garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+        self.summaries_written = 0
+
+    @classmethod
+    def from_settings(cls, ollama_service: OllamaService, history_writer: Optional[HistoryWriteBehind] = None) -> "ConversationMemory":
+        return cls(
+            ollama_service=ollama_service,
+            token_budget=settings.CHAT_MEMORY_TOKEN_BUDGET,
+            summary_max_tokens=settings.CHAT_MEMORY_SUMMARY_MAX_TOKENS,
+            max_messages=settings.CHAT_MEMORY_MAX_MESSAGES,
+            history_writer=history_writer,
+            summary_tier=settings.CHAT_MEMORY_SUMMARY_TIER,
+        )
+
+    def build_prompt(self) -> ChatPromptTemplate:
+        """Prompt that folds new messages into the existing summary."""
+        return ChatPromptTemplate.from_messages([
+            ("system", """You maintain a running summary of a conversation between a user and a university assistant chatbot.
+Rewrite the current summary so that it also covers the new messages.
+Keep names, facts, numbers, the user's goals and any open questions; drop greetings and filler.
+Write at most {max_words} words of plain prose and reply with the summary only."""),
+            ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}"),
+        ])
+
+    @staticmethod
+    def _message_tokens(content: str) -> int:
+        return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+    async def load(self, repo: ChatHistoryRepository, conversation: Conversation, query: str) -> List[Dict[str, str]]:
+        """
+        Builds the prompt history for this turn: the summary (if any), the newest messages
+        that fit the token budget, and the current query. Schedules a summary update when
+        older messages no longer fit.
+
+        Args:
+            repo: Repository bound to the request's DB session.
+            conversation: The conversation being continued.
+            query: The current user message (not yet in the database).
+
+        Returns:
+            History dicts ('role', 'content') in chronological order, ending with the query.
+        """
+        summary_until = utc_naive(conversation.summary_until)
+        messages = await repo.get_recent_messages(conversation.id, self.max_messages, after=summary_until)
+
+        # Newest first until the budget (minus the query, which is always kept) runs out
+        tokens = [self._message_tokens(message["content"]) for message in messages]
+        budget = self.token_budget - self._message_tokens(query)
+        kept_from = len(messages)
+        used = 0
+        while kept_from > 0 and used + tokens[kept_from - 1] <= budget:
+            kept_from -= 1
+            used += tokens[kept_from]
+
+        if kept_from > 0:
+            self._schedule_fold(conversation, messages, tokens, kept_from)
+
+        # The latest exchange stays even when it alone overflows the budget (truncated to share
+        # it), so an oversized message never leaves the prompt without any context
+        contents = [message["content"] for message in messages]
+        latest = min(self.KEEP_LATEST_MESSAGES, len(messages))
+        if len(messages) - kept_from < latest:
+            kept_from = len(messages) - latest
+            share = max(budget // latest - MESSAGE_OVERHEAD_TOKENS, self.MIN_MESSAGE_TOKENS)
+            for i in range(kept_from, len(messages)):
+                if tokens[i] - MESSAGE_OVERHEAD_TOKENS > share:
+                    contents[i] = truncate_tokens(contents[i], share)
+
+        history: List[Dict[str, str]] = []
+        if conversation.summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{conversation.summary}"})
+        history.extend({"role": messages[i]["role"], "content": contents[i]} for i in range(kept_from, len(messages)))
+        history.append({"role": "user", "content": query})
+        return history
+
+    def _schedule_fold(self, conversation: Conversation, messages: List[Dict[str, Any]], tokens: List[int], kept_from: int):
+        """Starts a background summary update covering the overflowing messages (and a few more)."""
+        if conversation.id in self._folding:
+            return
+        remaining = sum(tokens[kept_from:])
+        cut = kept_from
+        while cut < len(messages) and remaining > self.token_budget * self.FOLD_TARGET_RATIO:
+            remaining -= tokens[cut]
+            cut += 1
+        # Never split messages sharing a timestamp (the watermark is a timestamp)
+        while cut < len(messages) and messages[cut]["timestamp"] == messages[cut - 1]["timestamp"]:
+            cut += 1
+
+        self._folding.add(conversation.id)
+        task = asyncio.create_task(self._fold(
+            conversation.id,
+            conversation.summary,
+            utc_naive(conversation.summary_until),
+            messages[cut - 1]["timestamp"],
+        ))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t, conversation_id=conversation.id: self._fold_done(t, conversation_id))
+
+    def _fold_done(self, task: asyncio.Task, conversation_id: int):
+        self._tasks.discard(task)
+        self._folding.discard(conversation_id)
+
+    async def _fold(self, conversation_id: int, summary: Optional[str], previous_until: Optional[datetime.datetime], until: datetime.datetime):
+        """Folds the messages in (previous_until, until] into the summary and stores it."""
+        # Detached from the request that scheduled it: not part of its stage timings, and
+        # queued behind interactive LLM calls
+        current_request_timings.set(None)
+        current_llm_priority.set(PRIORITY_BACKGROUND)
+        try:
+            # Separate short sessions for the read and the write; none is held across the LLM call
+            async with session_scope() as session:
+                messages = await ChatHistoryRepository(session, writer=self.history_writer).get_messages_between(
+                    conversation_id, previous_until, until, self.max_messages
+                )
+            if not messages:
+                return
+            with stage("memory_summarize"):
+                new_summary = await self._summarize(summary, messages)
+            if new_summary is None:
+                return
+            async with session_scope() as session:
+                stored = await ChatHistoryRepository(session).update_summary(
+                    conversation_id, new_summary, messages[-1]["timestamp"], previous_until
+                )
+            if stored:
+                self.summaries_written += 1
+                logger.info(f"Folded {len(messages)} messages into the summary of conversation {conversation_id}.")
+            else:
+                logger.debug(f"Summary of conversation {conversation_id} was updated concurrently; discarding this one.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The next turn that overflows tries again
+            logger.warning(f"Summary update for conversation {conversation_id} failed: {e}")
+
+    async def _summarize(self, summary: Optional[str], messages: List[Dict[str, Any]]) -> Optional[str]:
+        """New summary covering `summary` plus `messages`, or None if the LLM call failed."""
+        transcript = "\n".join(
+            f"{'User' if message['role'] == 'user' else 'Assistant'}: {truncate_tokens(message['content'], self.token_budget)}"
+            for message in messages
+        )
+        inputs = {
+            "summary": summary or "(none yet)",
+            "messages": transcript,
+            # Roughly 0.75 words per token
+            "max_words": max(20, int(self.summary_max_tokens * 0.75)),
+        }
+        # Stop generation not far past the limit (the model's tokenizer differs from ours)
+        response = await self.ollama_service.generate_response(
+            self.prompt, inputs, options={"num_predict": int(self.summary_max_tokens * 1.5)}, tier=self.summary_tier,
+        )
+        if not response or is_error_response(response):
+            logger.warning(f"Summary update returned no usable text: {response[:100] if response else response!r}")
+            return None
+        # The model doesn't always respect the word limit; the bound on prompt size must hold anyway
+        return truncate_tokens(response.strip(), self.summary_max_tokens)
+
+    async def shutdown(self):
+        """Cancels summary updates still running (they are retried on a later turn)."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,57 +1,142 @@
 # backend/app/services/knowledge_service.py
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 import asyncio # Import asyncio
+import threading
 
-from app.knowledge.wikipedia_client import WikipediaClient
-from app.knowledge.arxiv_client import ArxivClient
-from app.knowledge.github_client import GitHubClient
-from app.knowledge.web_search_client import WebSearchClient
-from app.knowledge.concordia.web_scraper import ConcordiaWebScraper
 from app.core.logger import logger
+from app.core.metrics import stage
 
-# Initialize clients (consider making these injectable dependencies later)
-wikipedia_client = WikipediaClient()
-arxiv_client = ArxivClient()
-github_client = GitHubClient()
-web_search_client = WebSearchClient()
-concordia_scraper = ConcordiaWebScraper()
+if TYPE_CHECKING:
+    from app.knowledge.wikipedia_client import WikipediaClient
+    from app.knowledge.arxiv_client import ArxivClient
+    from app.knowledge.github_client import GitHubClient
+    from app.knowledge.web_search_client import WebSearchClient
+    from app.knowledge.concordia.web_scraper import ConcordiaWebScraper
+
+# Client factories. Each client (and its third-party library) is imported and constructed on
+# first use: GitHubClient calls the GitHub API when it starts, and ConcordiaWebScraper raises
+# without a ScrapingBee key, so neither should run just because the module was imported.
+def _wikipedia() -> "WikipediaClient":
+    from app.knowledge.wikipedia_client import WikipediaClient
+    return WikipediaClient()
+
+def _arxiv() -> "ArxivClient":
+    from app.knowledge.arxiv_client import ArxivClient
+    return ArxivClient()
+
+def _github() -> "GitHubClient":
+    from app.knowledge.github_client import GitHubClient
+    return GitHubClient()
+
+def _web_search() -> "WebSearchClient":
+    from app.knowledge.web_search_client import WebSearchClient
+    return WebSearchClient()
+
+def _concordia_scraper() -> "ConcordiaWebScraper":
+    from app.knowledge.concordia.web_scraper import ConcordiaWebScraper
+    return ConcordiaWebScraper()
+
+_CLIENT_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "wikipedia": _wikipedia,
+    "arxiv": _arxiv,
+    "github": _github,
+    "web_search": _web_search,
+    "scraper": _concordia_scraper,
+}
 
 class KnowledgeService:
     """
     Service layer for accessing external knowledge sources.
     Uses various clients (Wikipedia, ArXiv, GitHub, Web Search, Scrapers).
     Ensures synchronous client calls are run in a separate thread.
+    When the calling task is cancelled (client disconnected), the await returns at once;
+    a thread already running finishes in the background and its result is dropped.
+
+    Clients are constructed on first use, in the worker thread of that first call (their
+    constructors may block), and then reused.
     """
-    def __init__(self):
-        # Clients are initialized outside for simplicity now
-        # In a larger app, consider dependency injection
+    def __init__(
+        self,
+        wikipedia: Optional["WikipediaClient"] = None,
+        arxiv: Optional["ArxivClient"] = None,
+        github: Optional["GitHubClient"] = None,
+        web_search: Optional["WebSearchClient"] = None,
+        scraper: Optional["ConcordiaWebScraper"] = None,
+    ):
+        # Clients can be injected (e.g. stand-ins for load testing); the others are built lazily
+        self._clients: Dict[str, Any] = {
+            name: client for name, client in (
+                ("wikipedia", wikipedia), ("arxiv", arxiv), ("github", github),
+                ("web_search", web_search), ("scraper", scraper),
+            ) if client is not None
+        }
+        self._clients_lock = threading.Lock()
         logger.info("KnowledgeService initialized.")
 
+    def _client(self, name: str) -> Any:
+        client = self._clients.get(name)
+        if client is None:
+            # Several threads may ask at once; only one constructs
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    logger.info(f"Creating knowledge client '{name}' on first use.")
+                    client = self._clients[name] = _CLIENT_FACTORIES[name]()
+        return client
+
+    @property
+    def wikipedia_client(self) -> "WikipediaClient":
+        return self._client("wikipedia")
+
+    @property
+    def arxiv_client(self) -> "ArxivClient":
+        return self._client("arxiv")
+
+    @property
+    def github_client(self) -> "GitHubClient":
+        return self._client("github")
+
+    @property
+    def web_search_client(self) -> "WebSearchClient":
+        return self._client("web_search")
+
+    @property
+    def concordia_scraper(self) -> "ConcordiaWebScraper":
+        return self._client("scraper")
+
     async def get_wikipedia_summary(self, topic: str, sentences: int = 3) -> Optional[str]:
         """Fetches Wikipedia summary asynchronously using thread pool."""
         logger.debug(f"Running wikipedia_client.get_summary for '{topic}' in thread pool.")
         try:
             # Run the synchronous function in a separate thread
-            summary = await asyncio.to_thread(
-                wikipedia_client.get_summary, topic, sentences
-            )
+            with stage("tool.wikipedia"):
+                summary = await asyncio.to_thread(
+                    lambda: self.wikipedia_client.get_summary(topic, sentences)
+                )
             return summary
         except Exception as e:
             logger.exception(f"Error running wikipedia_client.get_summary in thread: {e}")
             return None
 
     async def search_arxiv(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
-        """Searches ArXiv. Assuming arxiv library handles its own async/blocking appropriately for now."""
-        # TODO: Deep-dive into `arxiv` library's async behavior if issues arise.
-        return arxiv_client.search_papers(query, max_results)
+        """Searches ArXiv asynchronously using thread pool (the `arxiv` library is blocking)."""
+        logger.debug(f"Running arxiv_client.search_papers for '{query}' in thread pool.")
+        try:
+            # In a thread, so the event loop keeps serving and the await can be cancelled
+            with stage("tool.arxiv"):
+                return await asyncio.to_thread(lambda: self.arxiv_client.search_papers(query, max_results))
+        except Exception as e:
+            logger.exception(f"Error running arxiv_client.search_papers in thread: {e}")
+            return []
 
     async def search_github_repos(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """Searches GitHub repositories asynchronously using thread pool."""
         logger.debug(f"Running github_client.search_repositories for '{query}' in thread pool.")
         try:
-            repos = await asyncio.to_thread(
-                github_client.search_repositories, query, max_results
-            )
+            with stage("tool.github_repos"):
+                repos = await asyncio.to_thread(
+                    lambda: self.github_client.search_repositories(query, max_results)
+                )
             return repos
         except Exception as e:
             logger.exception(f"Error running github_client.search_repositories in thread: {e}")
@@ -61,9 +146,10 @@ class KnowledgeService:
         """Searches GitHub code asynchronously using thread pool."""
         logger.debug(f"Running github_client.search_code for '{query}' in thread pool.")
         try:
-            code_files = await asyncio.to_thread(
-                github_client.search_code, query, max_results, language
-            )
+            with stage("tool.github_code"):
+                code_files = await asyncio.to_thread(
+                    lambda: self.github_client.search_code(query, max_results, language)
+                )
             return code_files
         except Exception as e:
             logger.exception(f"Error running github_client.search_code in thread: {e}")
@@ -71,7 +157,9 @@ class KnowledgeService:
 
     async def search_web(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
         """Performs web search using the async WebSearchClient."""
-        return await web_search_client.search(query, max_results)
+        with stage("tool.web_search"):
+            # Async client; its constructor doesn't block, so it is built on the loop
+            return await self.web_search_client.search(query, max_results)
 
     async def get_concordia_scraped_data(self) -> List[Dict[str, Any]]:
         """Fetches Concordia data using the scraper. Assumes scraper.scrape_pages is sync and runs it in thread pool."""
@@ -79,7 +167,7 @@ class KnowledgeService:
         # might be called from elsewhere, make it non-blocking.
         logger.debug(f"Running concordia_scraper.scrape_pages in thread pool.")
         try:
-            scraped_data = await asyncio.to_thread(concordia_scraper.scrape_pages)
+            scraped_data = await asyncio.to_thread(lambda: self.concordia_scraper.scrape_pages())
             return scraped_data
         except Exception as e:
             logger.exception(f"Error running concordia_scraper.scrape_pages in thread: {e}")
@@ -0,0 +1,184 @@
+# backend/app/services/llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+from app.core.logger import logger
+
+class PromptResponseCache:
+    """
+    Exact-match cache for LLM responses.
+
+    Keyed on a hash of the fully rendered prompt messages, the model name and the
+    generation options. Entries live in an in-memory LRU with a TTL and, optionally,
+    in a SQLite file so they survive restarts. Only meant for deterministic
+    generations (e.g. temperature 0); OllamaService decides when to use it.
+
+    The SQLite file holds at most about db_max_entries rows: the oldest are pruned
+    once it grows a tenth past the cap (and expired ones on every write).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600, db_path: Optional[str] = None, db_max_entries: int = 100000):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_max_entries = max(1, db_max_entries)
+        # Rows written since the last prune to db_max_entries
+        self._db_writes = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict() # key -> (response, stored_at)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if db_path:
+            self._open_db(db_path)
+
+    @classmethod
+    def from_settings(cls) -> "PromptResponseCache":
+        return cls(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+            db_path=settings.LLM_CACHE_DB_PATH,
+            db_max_entries=settings.LLM_CACHE_DB_MAX_ENTRIES,
+        )
+
+    @staticmethod
+    def make_key(messages: List[BaseMessage], model: str, options: Dict[str, Any]) -> str:
+        """Stable hash of the rendered prompt, model and generation options."""
+        payload = {
+            "model": model,
+            "options": options,
+            "messages": [[message.type, message.content] for message in messages],
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for key, or None on a miss."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            response, stored_at = entry
+            if not self._expired(stored_at):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return response
+            del self._memory[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None and not self._expired(row[1]):
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: str):
+        """Stores a response in memory and (if configured) on disk."""
+        stored_at = time.time()
+        self._remember(key, response, stored_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, response, stored_at)
+
+    def clear(self):
+        """Drops every cached entry (memory and disk)."""
+        self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM prompt_cache")
+                self._db.commit()
+
+    def close(self):
+        """
+        Closes the SQLite file, waiting for a read or write in progress on a worker
+        thread; later calls see the cache as memory-only.
+        """
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+        }
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and (time.time() - stored_at) > self.ttl_seconds
+
+    def _remember(self, key: str, response: str, stored_at: float):
+        self._memory[key] = (response, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _open_db(self, db_path: str):
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            # Accessed from worker threads, serialized by _db_lock
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS prompt_cache_stored_at ON prompt_cache (stored_at)")
+            # A file written with a larger cap (or none) is brought down to this one
+            self._prune()
+            self._db.commit()
+            logger.info(f"Persistent LLM response cache opened at {db_path}")
+        except Exception as e:
+            logger.exception(f"Could not open persistent LLM cache at {db_path}, using memory only: {e}")
+            self._db = None
+
+    # The worker-thread calls below re-check _db under the lock: close() may have run
+    # since the caller saw it open
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            cursor = self._db.execute("SELECT response, stored_at FROM prompt_cache WHERE key = ?", (key,))
+            return cursor.fetchone()
+
+    def _db_set(self, key: str, response: str, stored_at: float):
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO prompt_cache (key, response, stored_at) VALUES (?, ?, ?)",
+                (key, response, stored_at),
+            )
+            if self.ttl_seconds is not None:
+                self._db.execute("DELETE FROM prompt_cache WHERE stored_at < ?", (stored_at - self.ttl_seconds,))
+            self._db_writes += 1
+            # Pruning sorts the table, so it runs once per tenth of the cap rather than per write
+            if self._db_writes > self.db_max_entries // 10:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        """Deletes the oldest rows beyond db_max_entries. Caller holds _db_lock and commits."""
+        self._db.execute(
+            "DELETE FROM prompt_cache WHERE key IN (SELECT key FROM prompt_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_entries,),
+        )
+        self._db_writes = 0
@@ -0,0 +1,190 @@
+# backend/app/services/ollama_client.py
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+
+import httpx
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# LangChain message types -> Ollama chat roles
+_ROLES = {"system": "system", "human": "user", "ai": "assistant", "tool": "tool"}
+
+def to_ollama_messages(messages: Sequence[BaseMessage]) -> List[Dict[str, str]]:
+    """Role-separated chat messages for /api/chat."""
+    converted = []
+    for message in messages:
+        role = getattr(message, "role", None) if message.type == "chat" else _ROLES.get(message.type, "user")
+        converted.append({"role": role or "user", "content": str(message.content)})
+    return converted
+
+def normalize_model_name(name: str) -> str:
+    """Ollama's canonical model name: "mistral" is "mistral:latest"."""
+    return name if ":" in name else f"{name}:latest"
+
+class GenerationStats:
+    """Timing and token counts Ollama reports with the final response of a call (durations in seconds)."""
+
+    __slots__ = ("model", "done_reason", "prompt_tokens", "generated_tokens", "total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.model: Optional[str] = data.get("model")
+        self.done_reason: Optional[str] = data.get("done_reason")
+        # Prompt tokens actually evaluated (those served from the KV cache are not counted)
+        self.prompt_tokens: Optional[int] = data.get("prompt_eval_count")
+        self.generated_tokens: Optional[int] = data.get("eval_count")
+        # Ollama reports nanoseconds
+        self.total_duration = self._seconds(data.get("total_duration"))
+        self.load_duration = self._seconds(data.get("load_duration"))
+        self.prompt_eval_duration = self._seconds(data.get("prompt_eval_duration"))
+        self.eval_duration = self._seconds(data.get("eval_duration"))
+
+    @staticmethod
+    def _seconds(nanoseconds: Optional[int]) -> Optional[float]:
+        return nanoseconds / 1e9 if nanoseconds is not None else None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if not self.generated_tokens or not self.eval_duration:
+            return None
+        return self.generated_tokens / self.eval_duration
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class ChatResult:
+    """Generated text plus Ollama's statistics for the call."""
+
+    def __init__(self, content: str, stats: Optional[GenerationStats] = None):
+        self.content = content
+        self.stats = stats or GenerationStats()
+
+class OllamaHTTPClient:
+    """
+    Native async client for Ollama's REST API over one long-lived, pooled HTTP client.
+
+    Connections are kept alive between calls (no TCP setup per request), at most
+    max_connections are open at once, and the pool is shared by every caller. Cancelling
+    a call closes its connection, which makes Ollama stop generating.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 16, keepalive_expiry: float = 60.0, timeout: Optional[float] = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        # Created on first use: the container (and this object) is built outside the event loop
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_settings(cls, base_url: Optional[str] = None) -> "OllamaHTTPClient":
+        return cls(
+            base_url=base_url or str(settings.OLLAMA_API_BASE_URL),
+            max_connections=settings.OLLAMA_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=settings.OLLAMA_HTTP_KEEPALIVE_SECONDS,
+            timeout=settings.OLLAMA_REQUEST_TIMEOUT_SECONDS,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Generous read timeout: a long answer on a busy server takes minutes
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    @staticmethod
+    def _payload(model: str, options: Optional[Dict[str, Any]], keep_alive: Optional[Union[int, str]], stream: bool, **fields: Any) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": model, "stream": stream, **fields}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        keep_alive: Optional[Union[int, str]] = None,
+    ) -> ChatResult:
+        """
+        One /api/chat call, waiting for the complete answer.
+
+        Args:
+            model: Model name.
+            messages: Role-separated messages ({'role', 'content'}).
+            options: Ollama model options (num_ctx, num_predict, temperature, stop, seed, ...).
+            keep_alive: How long Ollama keeps the model loaded afterwards.
+
+        Returns:
+            The answer text and generation stats.
+        """
+        response = await self.client.post("/api/chat", json=self._payload(model, options, keep_alive, False, messages=messages))
+        response.raise_for_status()
+        data = response.json()
+        return ChatResult(data.get("message", {}).get("content", ""), GenerationStats(data))
+
+    async def chat_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        keep_alive: Optional[Union[int, str]] = None,
+    ) -> AsyncIterator[Union[str, GenerationStats]]:
+        """
+        Streaming /api/chat call. Yields text chunks as Ollama produces them, then the
+        GenerationStats of the final message.
+        """
+        payload = self._payload(model, options, keep_alive, True, messages=messages)
+        async with self.client.stream("POST", "/api/chat", json=payload) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                content = data.get("message", {}).get("content")
+                if content:
+                    yield content
+                if data.get("done"):
+                    yield GenerationStats(data)
+                    return
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        keep_alive: Optional[Union[int, str]] = None,
+    ) -> ChatResult:
+        """One /api/generate call (raw completion). An empty prompt only loads the model."""
+        response = await self.client.post("/api/generate", json=self._payload(model, options, keep_alive, False, prompt=prompt))
+        response.raise_for_status()
+        data = response.json()
+        return ChatResult(data.get("response", ""), GenerationStats(data))
+
+    async def running_models(self, timeout: Optional[float] = None) -> List[str]:
+        """Models currently loaded in the server's memory (/api/ps), by canonical name."""
+        response = await self.client.get("/api/ps", timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+        response.raise_for_status()
+        return [normalize_model_name(model.get("name") or model.get("model", "")) for model in response.json().get("models", [])]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.debug(f"Closed Ollama HTTP client for {self.base_url}.")
@@ -0,0 +1,301 @@
+# backend/app/services/ollama_pool.py
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Collection, List, Optional, Sequence, Set, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.ollama_client import OllamaHTTPClient, normalize_model_name
+
+T = TypeVar("T")
+
+class OllamaBackend:
+    """One Ollama server in the pool, with the state the pool routes on."""
+
+    def __init__(self, client: OllamaHTTPClient):
+        self.client = client
+        self.url = client.base_url
+        # Calls currently running on this backend
+        self.outstanding = 0
+        # Consecutive failed calls/probes; reset by any success
+        self.failures = 0
+        # time.monotonic() until which the backend receives no calls
+        self.ejected_until = 0.0
+        # Models the last probe (or a successful call) found loaded in memory
+        self.loaded_models: Set[str] = set()
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    @property
+    def ejected(self) -> bool:
+        return not self.available(time.monotonic())
+
+class OllamaBackendPool:
+    """
+    Spreads LLM calls over several Ollama servers (OLLAMA_BACKEND_URLS).
+
+    Each call goes to the available backend with the fewest calls in flight, where a backend
+    that already has the model loaded is preferred unless it is busier by more than
+    loaded_bonus calls (loading a model takes seconds). Remaining ties go to the backend that
+    served the conversation last, whose KV cache may still hold its prompt, then round-robin.
+
+    A background task probes every backend's /api/ps each probe_interval, which both checks
+    health and refreshes which models are loaded. A backend whose calls or probes fail
+    failure_threshold times in a row is ejected for eject_seconds; after that it is readmitted
+    and re-ejected by the next failure. If every backend is ejected, calls still go to the one
+    readmitted soonest rather than failing outright. Calls that could not connect are retried
+    once on each other backend, since Ollama never received them.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[OllamaHTTPClient],
+        probe_interval: float = 10.0,
+        probe_timeout: float = 5.0,
+        failure_threshold: int = 2,
+        eject_seconds: float = 30.0,
+        loaded_bonus: int = 4,
+        affinity_size: int = 1024,
+    ):
+        if not clients:
+            raise ValueError("OllamaBackendPool needs at least one backend.")
+        self.backends = [OllamaBackend(client) for client in clients]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.eject_seconds = eject_seconds
+        self.loaded_bonus = loaded_bonus
+        # conversation key -> URL of the backend that served its last call (LRU)
+        self._affinity: "OrderedDict[str, str]" = OrderedDict()
+        self._affinity_size = affinity_size
+        self._next = 0
+        # Created on first use: the container (and this object) is built outside the event loop
+        self._probe_task: Optional[asyncio.Task] = None
+        self.retries = 0
+
+    @classmethod
+    def from_settings(cls) -> "OllamaBackendPool":
+        urls = backend_urls()
+        return cls(
+            clients=[OllamaHTTPClient.from_settings(base_url=url) for url in urls],
+            probe_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL_SECONDS,
+            probe_timeout=settings.OLLAMA_HEALTH_CHECK_TIMEOUT_SECONDS,
+            failure_threshold=settings.OLLAMA_BACKEND_FAILURE_THRESHOLD,
+            eject_seconds=settings.OLLAMA_BACKEND_EJECT_SECONDS,
+            loaded_bonus=settings.OLLAMA_BACKEND_LOADED_BONUS,
+            affinity_size=settings.OLLAMA_PREFIX_STATE_MAX_CONVERSATIONS,
+        )
+
+    @property
+    def outstanding(self) -> int:
+        return sum(backend.outstanding for backend in self.backends)
+
+    def resident_models(self) -> Set[str]:
+        """Models loaded on at least one available backend, as last observed."""
+        now = time.monotonic()
+        return set().union(*(backend.loaded_models for backend in self.backends if backend.available(now)))
+
+    def _ensure_probing(self):
+        # A single backend is probed too: its loaded models tell which tiers are resident
+        if self._probe_task is None and self.probe_interval > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+            logger.info(f"Probing {len(self.backends)} Ollama backends every {self.probe_interval}s.")
+
+    # --- Selection ---
+
+    def select(self, model: str, affinity_key: Optional[str] = None, exclude: Collection[OllamaBackend] = ()) -> Optional[OllamaBackend]:
+        """
+        The backend the next call for `model` should go to, or None if all are excluded.
+
+        Args:
+            model: Model the call uses.
+            affinity_key: Conversation key, to keep a conversation on one backend when it costs nothing.
+            exclude: Backends already tried for this call.
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        available = [backend for backend in candidates if backend.available(now)]
+        if not available:
+            # Better a likely failure than a certain one
+            return min(candidates, key=lambda backend: backend.ejected_until)
+
+        model = normalize_model_name(model)
+        preferred = self._affinity.get(affinity_key) if affinity_key else None
+        count = len(self.backends)
+        start = self._next
+        self._next = (self._next + 1) % count
+
+        def cost(indexed):
+            index, backend = indexed
+            load = backend.outstanding - (self.loaded_bonus if model in backend.loaded_models else 0)
+            return (load, backend.url != preferred, (index - start) % count)
+
+        return min(((self.backends.index(backend), backend) for backend in available), key=cost)[1]
+
+    def _remember(self, affinity_key: Optional[str], backend: OllamaBackend):
+        if not affinity_key or len(self.backends) == 1:
+            return
+        self._affinity[affinity_key] = backend.url
+        self._affinity.move_to_end(affinity_key)
+        while len(self._affinity) > self._affinity_size:
+            self._affinity.popitem(last=False)
+
+    # --- Health ---
+
+    @staticmethod
+    def _is_backend_failure(error: BaseException) -> bool:
+        """Errors that say something about the server rather than the request."""
+        if isinstance(error, httpx.TransportError):
+            return True
+        return isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+
+    def _record_success(self, backend: OllamaBackend, model: Optional[str] = None):
+        backend.failures = 0
+        if model:
+            backend.loaded_models.add(normalize_model_name(model))
+
+    def _record_failure(self, backend: OllamaBackend, error: BaseException):
+        backend.errors += 1
+        backend.failures += 1
+        if backend.failures >= self.failure_threshold:
+            if backend.available(time.monotonic()):
+                logger.warning(f"Ejecting Ollama backend {backend.url} for {self.eject_seconds}s after {backend.failures} failures: {error}")
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def probe(self, backend: OllamaBackend) -> bool:
+        """Checks one backend and refreshes its loaded models. Returns True if it answered."""
+        try:
+            models = await backend.client.running_models(timeout=self.probe_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_failure(backend, e)
+            return False
+        was_ejected = not backend.available(time.monotonic())
+        backend.loaded_models = set(models)
+        backend.failures = 0
+        if was_ejected:
+            logger.info(f"Ollama backend {backend.url} answers probes again; readmitted after its ejection period.")
+        return True
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(self.probe_interval)
+
+    # --- Calls ---
+
+    @asynccontextmanager
+    async def lease(self, backend: OllamaBackend, model: Optional[str] = None):
+        """Counts a call against `backend` and records its outcome for health tracking."""
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend.client
+        except Exception as e:
+            if self._is_backend_failure(e):
+                self._record_failure(backend, e)
+            raise
+        else:
+            self._record_success(backend, model)
+        finally:
+            backend.outstanding -= 1
+
+    async def call(self, model: str, request: Callable[[OllamaHTTPClient], Awaitable[T]], affinity_key: Optional[str] = None) -> T:
+        """
+        Runs `request` against the chosen backend's client.
+
+        Args:
+            model: Model the request uses (for routing and loaded-model tracking).
+            request: Makes the call with the given client.
+            affinity_key: Conversation key for backend affinity.
+
+        Returns:
+            The request's result.
+        """
+        self._ensure_probing()
+        tried: List[OllamaBackend] = []
+        while True:
+            backend = self.select(model, affinity_key, exclude=tried)
+            tried.append(backend)
+            try:
+                async with self.lease(backend, model) as client:
+                    result = await request(client)
+            except httpx.ConnectError:
+                if len(tried) == len(self.backends):
+                    raise
+                self.retries += 1
+                logger.warning(f"Could not connect to Ollama backend {backend.url}; retrying on another backend.")
+                continue
+            self._remember(affinity_key, backend)
+            return result
+
+    async def stream(self, model: str, request: Callable[[OllamaHTTPClient], AsyncIterator[T]], affinity_key: Optional[str] = None) -> AsyncIterator[T]:
+        """Like call(), for streaming requests; retried only if nothing was received yet."""
+        self._ensure_probing()
+        tried: List[OllamaBackend] = []
+        while True:
+            backend = self.select(model, affinity_key, exclude=tried)
+            tried.append(backend)
+            received = False
+            try:
+                async with self.lease(backend, model) as client:
+                    async for item in request(client):
+                        received = True
+                        yield item
+            except httpx.ConnectError:
+                if received or len(tried) == len(self.backends):
+                    raise
+                self.retries += 1
+                logger.warning(f"Could not connect to Ollama backend {backend.url}; retrying on another backend.")
+                continue
+            self._remember(affinity_key, backend)
+            return
+
+    async def broadcast(self, model: str, request: Callable[[OllamaHTTPClient], Awaitable[T]]) -> List[T]:
+        """
+        Runs `request` on every available backend concurrently (model loading, KV prefill).
+
+        Returns:
+            The results of the backends that succeeded; raises if none did.
+        """
+        self._ensure_probing()
+        now = time.monotonic()
+        backends = [backend for backend in self.backends if backend.available(now)] or self.backends
+
+        async def run(backend: OllamaBackend) -> T:
+            async with self.lease(backend, model) as client:
+                return await request(client)
+
+        outcomes = await asyncio.gather(*(run(backend) for backend in backends), return_exceptions=True)
+        results = []
+        for backend, outcome in zip(backends, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.warning(f"Ollama backend {backend.url} failed: {outcome}")
+            else:
+                results.append(outcome)
+        if not results:
+            raise next(outcome for outcome in outcomes if isinstance(outcome, BaseException))
+        return results
+
+    async def aclose(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+        for backend in self.backends:
+            await backend.client.aclose()
+
+def backend_urls() -> List[str]:
+    """OLLAMA_BACKEND_URLS as a list, or just OLLAMA_API_BASE_URL when it is unset."""
+    urls = [url.strip() for url in (settings.OLLAMA_BACKEND_URLS or "").split(",") if url.strip()]
+    return urls or [str(settings.OLLAMA_API_BASE_URL)]
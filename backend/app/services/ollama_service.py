@@ -1,53 +1,417 @@
+import time
+from contextlib import nullcontext
+from typing import AsyncIterator, List, Optional, Dict, Any, Set, Union
 from langchain_ollama import OllamaLLM
+from langchain_core.messages import BaseMessage, get_buffer_string
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.concurrency import (
+    LLMAdmissionController, current_conversation_key, current_llm_priority, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND,
+)
+from app.core.metrics import stage, current_request_timings, LLM_PROMPT_TOKENS, LLM_OLLAMA_TOKENS, LLM_OLLAMA_DURATION
+from app.services.llm_cache import PromptResponseCache
+from app.services.ollama_client import ChatResult, GenerationStats, normalize_model_name, to_ollama_messages
+from app.services.ollama_pool import OllamaBackendPool
+from app.services.prefix_state import ConversationPrefixState
+
+# Prefixes of the placeholder replies returned instead of raising when generation fails
+LLM_ERROR_PREFIXES = ("Error generating response:", "Error: The language model")
+
+# Model tiers: the large model (OLLAMA_MODEL_NAME) writes answers; the small one
+# (OLLAMA_SMALL_MODEL_NAME, the large model when unset) handles cheap sub-tasks
+MODEL_TIER_LARGE = "large"
+MODEL_TIER_SMALL = "small"
+MODEL_TIERS = (MODEL_TIER_LARGE, MODEL_TIER_SMALL)
+
+def is_error_response(text: str) -> bool:
+    """True if text is one of OllamaService's error placeholders rather than a real answer."""
+    return text.startswith(LLM_ERROR_PREFIXES)
+
+class LLMStreamError(Exception):
+    """
+    Raised by stream_response when generation fails. A stream can't fall back to a
+    placeholder reply like generate_response does: tokens may already have been sent, and
+    the placeholder would be appended to (and stored as part of) a partial answer.
+    """
 
 class OllamaService:
-    def __init__(self):
+    def __init__(
+        self,
+        admission_controller: Optional[LLMAdmissionController] = None,
+        response_cache: Optional[PromptResponseCache] = None,
+        prefix_state: Optional[ConversationPrefixState] = None,
+        pool: Optional[OllamaBackendPool] = None,
+        small_admission_controller: Optional[LLMAdmissionController] = None,
+    ):
+        # Optional limiter shared by all callers of this service; when set, calls wait
+        # for a slot and may raise LLMOverloadedError (surfaced as HTTP 503).
+        self.admission_controller = admission_controller
+        # Separate slots for the small model, so cheap sub-tasks don't queue behind (or
+        # occupy) the large model's; without one, small-tier calls use admission_controller
+        self.small_admission_controller = small_admission_controller
+        # tier -> model name
+        self.models: Dict[str, str] = {
+            MODEL_TIER_LARGE: settings.OLLAMA_MODEL_NAME,
+            MODEL_TIER_SMALL: settings.OLLAMA_SMALL_MODEL_NAME or settings.OLLAMA_MODEL_NAME,
+        }
+        # Unknown tiers already warned about (each is logged once)
+        self._unknown_tiers: Set[str] = set()
+        # Optional exact-prompt cache, only consulted for deterministic generations
+        self.response_cache = response_cache
+        # Optional per-conversation record of the last prompt, for KV-cache reuse accounting
+        self.prefix_state = prefix_state
+        # Generation options sent with every call (unset values use Ollama's defaults)
+        self.generation_options: Dict[str, Any] = {
+            key: value
+            for key, value in {
+                "temperature": settings.OLLAMA_TEMPERATURE,
+                "seed": settings.OLLAMA_SEED,
+                "num_ctx": settings.OLLAMA_NUM_CTX,
+            }.items()
+            if value is not None
+        }
+        self.keep_alive = self._parse_keep_alive(settings.OLLAMA_KEEP_ALIVE)
+        self.native = settings.OLLAMA_CLIENT_MODE == "native"
+        # Ollama backends (one pooled HTTP client each), shared by every call; also used for
+        # loading and prefilling in langchain mode
+        self.pool = pool or OllamaBackendPool.from_settings()
+        # LangChain mode: model name -> OllamaLLM
+        self.llms: Dict[str, OllamaLLM] = {}
+        urls = [backend.url for backend in self.pool.backends]
+        if self.native:
+            logger.info(f"Using native Ollama client for {urls}, models: {self.models}")
+            return
+        if len(urls) > 1:
+            logger.warning(f"OLLAMA_CLIENT_MODE=langchain generates on {urls[0]} only; the other backends are just warmed up.")
         try:
-            logger.info(f"Initializing Ollama LLM with base URL: {settings.OLLAMA_API_BASE_URL} and model: {settings.OLLAMA_MODEL_NAME}")
-            self.llm = OllamaLLM(
-                base_url=str(settings.OLLAMA_API_BASE_URL),
-                model=settings.OLLAMA_MODEL_NAME
-                # Add other parameters like temperature, top_k if needed
-                # temperature=0.7
-            )
+            for model in self.model_names:
+                logger.info(f"Initializing Ollama LLM with base URL: {urls[0]} and model: {model}")
+                self.llms[model] = OllamaLLM(
+                    base_url=urls[0],
+                    model=model,
+                    keep_alive=self.keep_alive,
+                    **self.generation_options
+                )
             logger.info("Ollama LLM initialized successfully.")
             # Simple test invoke
-            # logger.debug(f"Testing Ollama LLM connection: {self.llm.invoke('Why is the sky blue?')[:50]}...")
+            # logger.debug(f"Testing Ollama LLM connection: {self.llms[settings.OLLAMA_MODEL_NAME].invoke('Why is the sky blue?')[:50]}...")
         except Exception as e:
             logger.exception(f"Failed to initialize Ollama LLM: {e}")
             # Depending on requirements, you might want to raise the exception
-            # or handle it gracefully (e.g., set self.llm = None and check later)
+            # or handle it gracefully (e.g., leave self.llms empty and check later)
             raise
 
-    async def generate_response(self, prompt: ChatPromptTemplate, inputs: dict) -> str:
+    @staticmethod
+    def _parse_keep_alive(value: Optional[str]) -> Optional[Union[int, str]]:
+        """Ollama takes keep_alive as seconds (number) or a duration string ("30m"); bare numbers are sent as seconds."""
+        if value is None or value == "":
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    @property
+    def model_names(self) -> List[str]:
+        """The distinct models this service uses, large first."""
+        return list(dict.fromkeys(self.models[tier] for tier in MODEL_TIERS))
+
+    def model_for(self, tier: Optional[str] = None) -> str:
+        """The model serving `tier` (unknown tiers get the large model, with a warning)."""
+        tier = tier or MODEL_TIER_LARGE
+        if tier not in self.models:
+            if tier not in self._unknown_tiers:
+                self._unknown_tiers.add(tier)
+                logger.warning(f"Unknown model tier '{tier}' (expected one of {MODEL_TIERS}); using the large model.")
+            return self.models[MODEL_TIER_LARGE]
+        return self.models[tier]
+
+    def resident_models(self) -> Dict[str, bool]:
+        """Whether each of this service's models is loaded on at least one backend, as last observed."""
+        resident = self.pool.resident_models()
+        return {model: normalize_model_name(model) in resident for model in self.model_names}
+
+    async def load_model(self) -> float:
+        """Asks every available Ollama backend to load each tier's model into memory now (an empty prompt only loads it).
+
+        Returns:
+            Seconds the load took.
+        """
+        started = time.perf_counter()
+        for model in self.model_names:
+            # One at a time: loading two models at once competes for the same memory bandwidth
+            await self.pool.broadcast(model, lambda client, model=model: client.generate(model=model, prompt="", keep_alive=self.keep_alive))
+        elapsed = time.perf_counter() - started
+        logger.info(f"Ollama models {self.model_names} loaded in {elapsed:.2f}s (keep_alive={self.keep_alive}).")
+        return elapsed
+
+    async def prefill(self, messages: List[BaseMessage], tier: Optional[str] = None):
+        """
+        Evaluates a prompt prefix (e.g. an agent's fixed system prompt) so Ollama holds its KV
+        cache; prompts that start with the same text then skip evaluating it. Generates one token,
+        on every available backend.
+
+        Args:
+            messages: The leading messages every prompt of interest starts with.
+            tier: Model tier the prompts are sent to.
+        """
+        # Same options as real calls: differing ones could make Ollama reload the model
+        options = {**self.generation_options, "num_predict": 1}
+        model = self.model_for(tier)
+        if self.native:
+            # Through the model's chat template, exactly as real /api/chat calls render it
+            chat_messages = to_ollama_messages(messages)
+            request = lambda client: client.chat(model=model, messages=chat_messages, options=options, keep_alive=self.keep_alive)
+        else:
+            # Rendered exactly as OllamaLLM renders a chat prompt, so the text is a true prefix
+            prefix = get_buffer_string(messages)
+            request = lambda client: client.generate(model=model, prompt=prefix, options=options, keep_alive=self.keep_alive)
+        async with self._admission_slot(priority=PRIORITY_BACKGROUND, tier=tier):
+            await self.pool.broadcast(model, request)
+        if self.prefix_state is not None:
+            self.prefix_state.mark_shared(model, messages)
+
+    def _admission_slot(self, priority: Optional[int] = None, tier: Optional[str] = None):
+        """Context manager reserving a slot for the tier's model (no-op without an admission controller)."""
+        controller = self.admission_controller
+        if (
+            self.small_admission_controller is not None
+            and self.model_for(tier) != self.models[MODEL_TIER_LARGE]
+        ):
+            controller = self.small_admission_controller
+        if controller is None:
+            return nullcontext()
+        return controller.slot(priority=priority)
+
+    def _render(self, prompt: ChatPromptTemplate, inputs: dict) -> Optional[List[BaseMessage]]:
+        """The prompt's messages, rendered once per call for sending (native mode), the cache key and prefix tracking."""
+        # The native client sends these messages, so a rendering error is the call's error
+        if self.native:
+            return prompt.format_messages(**inputs)
+        if self.response_cache is None and self.prefix_state is None:
+            return None
+        try:
+            return prompt.format_messages(**inputs)
+        except Exception as e:
+            logger.warning(f"Could not render prompt, skipping LLM cache and prefix tracking: {e}")
+            return None
+
+    def _observe_prefix(self, messages: Optional[List[BaseMessage]], model: str):
+        """Records this conversation's prompt and counts how much of it Ollama can serve from its KV cache."""
+        if self.prefix_state is None or messages is None:
+            return
+        key = current_conversation_key.get()
+        # Background calls (e.g. summaries) use their own prompts and would only displace the conversation's
+        if key is None or current_llm_priority.get() != PRIORITY_INTERACTIVE:
+            return
+        reused, total = self.prefix_state.observe(key, model, messages)
+        LLM_PROMPT_TOKENS.inc(reused, kind="reused")
+        LLM_PROMPT_TOKENS.inc(total - reused, kind="evaluated")
+
+    @staticmethod
+    def _affinity_key() -> Optional[str]:
+        """Conversation whose turns should stay on one backend (for its KV cache), if any."""
+        if current_llm_priority.get() != PRIORITY_INTERACTIVE:
+            return None
+        return current_conversation_key.get()
+
+    @property
+    def is_deterministic(self) -> bool:
+        """Whether identical prompts yield identical completions (temperature 0)."""
+        return self.generation_options.get("temperature") == 0
+
+    def _call_options(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """The service-wide generation options overridden by this call's (num_predict, stop, ...)."""
+        if not options:
+            return self.generation_options
+        return {**self.generation_options, **options}
+
+    def _cache_key(self, messages: Optional[List[BaseMessage]], model: str, options: Dict[str, Any]) -> Optional[str]:
+        """Cache key for this call, or None when the response cache must not be used."""
+        if self.response_cache is None or messages is None or options.get("temperature") != 0:
+            return None
+        return PromptResponseCache.make_key(messages, model, options)
+
+    def _chain(self, prompt: ChatPromptTemplate, model: str, options: Dict[str, Any]):
+        """LangChain mode: prompt -> llm -> output parser, with this call's options bound if they differ."""
+        llm = self.llms[model]
+        if options is not self.generation_options:
+            llm = llm.bind(options=options)
+        return prompt | llm | StrOutputParser()
+
+    @staticmethod
+    def _record_stats(model: str, stats: GenerationStats):
+        """Records the token counts and timings Ollama reported for a native call."""
+        if stats.prompt_tokens is not None:
+            LLM_OLLAMA_TOKENS.inc(stats.prompt_tokens, model=model, kind="prompt")
+        if stats.generated_tokens is not None:
+            LLM_OLLAMA_TOKENS.inc(stats.generated_tokens, model=model, kind="generated")
+        for phase, seconds in (("load", stats.load_duration), ("prompt_eval", stats.prompt_eval_duration), ("eval", stats.eval_duration)):
+            if seconds is not None:
+                LLM_OLLAMA_DURATION.observe(seconds, model=model, phase=phase)
+        logger.debug(
+            f"Ollama call to {model}: {stats.prompt_tokens} prompt tokens evaluated, {stats.generated_tokens} generated"
+            f" ({stats.tokens_per_second or 0:.1f} tok/s, done_reason={stats.done_reason})."
+        )
+
+    async def generate_with_stats(
+        self, prompt: ChatPromptTemplate, inputs: dict, options: Optional[Dict[str, Any]] = None, tier: Optional[str] = None,
+    ) -> ChatResult:
+        """Generates a response using the configured LLM and prompt.
+
+        Args:
+            prompt: The ChatPromptTemplate to use.
+            inputs: A dictionary containing values for the prompt template variables.
+            options: Ollama options for this call only (e.g. num_predict, stop, temperature, num_ctx).
+            tier: Model tier (MODEL_TIER_LARGE by default; MODEL_TIER_SMALL for cheap sub-tasks).
+
+        Returns:
+            The generated text, with Ollama's generation stats in native mode (empty stats
+            for cached answers, error placeholders and langchain mode).
+        """
+        model = self.model_for(tier)
+        if not self.native and model not in self.llms:
+            logger.error("Ollama LLM is not available.")
+            return ChatResult("Error: The language model is not available.")
+
+        call_options = self._call_options(options)
+        try:
+            messages = self._render(prompt, inputs)
+        except Exception as e:
+            logger.exception(f"Could not render prompt: {e}")
+            return ChatResult(f"Error generating response: {str(e)}")
+        cache_key = self._cache_key(messages, model, call_options)
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM response served from prompt cache.")
+                return ChatResult(cached)
+
+        # Admission errors propagate so the API can answer 503 instead of a fake reply
+        async with self._admission_slot(tier=tier):
+            self._observe_prefix(messages, model)
+            try:
+                with stage("llm_generate"):
+                    if self.native:
+                        chat_messages = to_ollama_messages(messages)
+                        result = await self.pool.call(
+                            model,
+                            lambda client: client.chat(model=model, messages=chat_messages, options=call_options, keep_alive=self.keep_alive),
+                            affinity_key=self._affinity_key(),
+                        )
+                    else:
+                        logger.debug(f"Invoking LLM chain with inputs: {list(inputs.keys())}")
+                        result = ChatResult(await self._chain(prompt, model, call_options).ainvoke(inputs))
+                logger.debug("Received LLM response.")
+            except Exception as e:
+                logger.exception(f"Error during LLM invocation: {e}")
+                return ChatResult(f"Error generating response: {str(e)}")
+
+        if self.native:
+            self._record_stats(model, result.stats)
+        if cache_key:
+            await self.response_cache.set(cache_key, result.content)
+        return result
+
+    async def generate_response(
+        self, prompt: ChatPromptTemplate, inputs: dict, options: Optional[Dict[str, Any]] = None, tier: Optional[str] = None,
+    ) -> str:
         """Generates a response using the configured LLM and prompt.
 
         Args:
             prompt: The ChatPromptTemplate to use.
             inputs: A dictionary containing values for the prompt template variables.
+            options: Ollama options for this call only (e.g. num_predict, stop).
+            tier: Model tier (MODEL_TIER_LARGE by default).
 
         Returns:
             The generated response string.
         """
-        if not self.llm:
+        return (await self.generate_with_stats(prompt, inputs, options, tier)).content
+
+    async def stream_response(
+        self, prompt: ChatPromptTemplate, inputs: dict, options: Optional[Dict[str, Any]] = None, tier: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Streams a response token by token using the configured LLM and prompt.
+
+        Args:
+            prompt: The ChatPromptTemplate to use.
+            inputs: A dictionary containing values for the prompt template variables.
+            options: Ollama options for this call only (e.g. num_predict, stop).
+            tier: Model tier (MODEL_TIER_LARGE by default).
+
+        Yields:
+            Response text chunks as they are produced by the model.
+
+        Raises:
+            LLMStreamError: Generation failed (before or after the first chunk).
+        """
+        model = self.model_for(tier)
+        if not self.native and model not in self.llms:
             logger.error("Ollama LLM is not available.")
-            return "Error: The language model is not available."
+            raise LLMStreamError("The language model is not available.")
 
+        call_options = self._call_options(options)
         try:
-            # Simple chain: prompt -> llm -> output parser
-            chain = prompt | self.llm | StrOutputParser()
-            logger.debug(f"Invoking LLM chain with inputs: {list(inputs.keys())}")
-            # Use ainvoke for asynchronous execution
-            response = await chain.ainvoke(inputs)
-            logger.debug(f"Received LLM response.")
-            return response
+            messages = self._render(prompt, inputs)
         except Exception as e:
-            logger.exception(f"Error during LLM chain invocation: {e}")
-            return f"Error generating response: {str(e)}"
+            logger.exception(f"Could not render prompt: {e}")
+            raise LLMStreamError(f"Error generating response: {str(e)}") from e
+        cache_key = self._cache_key(messages, model, call_options)
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM stream served from prompt cache.")
+                yield cached
+                return
+
+        chunks = []
+        # The slot is held for the whole stream, since Ollama is busy until the last token
+        async with self._admission_slot(tier=tier):
+            self._observe_prefix(messages, model)
+            try:
+                if self.native:
+                    stream = self._native_stream(messages, model, call_options)
+                else:
+                    logger.debug(f"Streaming LLM chain with inputs: {list(inputs.keys())}")
+                    # astream yields chunks as soon as Ollama emits them
+                    stream = self._chain(prompt, model, call_options).astream(inputs)
+                timings = current_request_timings.get()
+                started = time.perf_counter()
+                async for chunk in stream:
+                    if chunk:
+                        if not chunks and timings is not None:
+                            timings.record("llm_first_token", time.perf_counter() - started)
+                        chunks.append(chunk)
+                        yield chunk
+                if timings is not None:
+                    timings.record("llm_stream", time.perf_counter() - started)
+                logger.debug("LLM stream finished.")
+            except Exception as e:
+                logger.exception(f"Error during LLM streaming after {len(chunks)} chunks: {e}")
+                raise LLMStreamError(f"Error generating response: {str(e)}") from e
+
+        if cache_key:
+            await self.response_cache.set(cache_key, "".join(chunks))
+
+    async def _native_stream(self, messages: List[BaseMessage], model: str, options: Dict[str, Any]) -> AsyncIterator[str]:
+        """Text chunks of a streaming /api/chat call; the final stats are recorded, not yielded."""
+        chat_messages = to_ollama_messages(messages)
+        async for item in self.pool.stream(
+            model,
+            lambda client: client.chat_stream(model=model, messages=chat_messages, options=options, keep_alive=self.keep_alive),
+            affinity_key=self._affinity_key(),
+        ):
+            if isinstance(item, GenerationStats):
+                self._record_stats(model, item)
+            else:
+                yield item
+
+    async def aclose(self):
+        """Stops the health probes and closes the pooled HTTP connections to Ollama."""
+        await self.pool.aclose()
 
 # Singleton instance (optional, can use FastAPI dependency injection instead)
 # ollama_service = OllamaService() 
\ No newline at end of file
@@ -0,0 +1,128 @@
+# backend/app/services/prefix_state.py
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+from app.core.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+class _PromptState:
+    """The last prompt of one conversation: per-message fingerprints and token counts."""
+
+    __slots__ = ("fingerprints", "tokens", "total")
+
+    def __init__(self, fingerprints: List[int], tokens: List[int]):
+        self.fingerprints = fingerprints
+        self.tokens = tokens
+        self.total = sum(tokens)
+
+class ConversationPrefixState:
+    """
+    Per-conversation record of the prompt last sent to Ollama, used to estimate how much
+    of each follow-up turn Ollama can serve from its KV cache.
+
+    Ollama's runner keeps the KV cache of recent prompts in its parallel slots and only
+    evaluates the part of a new prompt after the longest prefix it already holds. A
+    follow-up turn is therefore cheap when (a) its prompt starts with the same text as the
+    previous one (agents keep per-turn material after the history for that) and (b) the
+    conversation's KV is still resident. (a) is compared message by message; (b) is
+    approximated by an LRU bounded by kv_capacity_tokens (about OLLAMA_NUM_PARALLEL x
+    num_ctx on the server): conversations pushed out are assumed evicted by Ollama too,
+    and their state is dropped.
+    """
+
+    def __init__(self, kv_capacity_tokens: int = 8192, max_conversations: int = 1024):
+        self.kv_capacity_tokens = kv_capacity_tokens
+        self.max_conversations = max_conversations
+        self._states: "OrderedDict[str, _PromptState]" = OrderedDict()
+        self._resident_tokens = 0
+        # Leading messages shared by every conversation of an agent (its system prompt),
+        # resident once any conversation (or the warm-up prefill) has sent them
+        self._shared: "OrderedDict[int, int]" = OrderedDict()
+        self.reused_tokens = 0
+        self.evaluated_tokens = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls) -> "ConversationPrefixState":
+        return cls(
+            kv_capacity_tokens=settings.OLLAMA_KV_CACHE_TOKENS,
+            max_conversations=settings.OLLAMA_PREFIX_STATE_MAX_CONVERSATIONS,
+        )
+
+    @staticmethod
+    def fingerprint(model: str, message: BaseMessage) -> int:
+        return hash((model, message.type, message.content))
+
+    def mark_shared(self, model: str, messages: Sequence[BaseMessage]):
+        """Records a prefix every conversation starts with (e.g. prefilled at warm-up)."""
+        if messages:
+            first = messages[0]
+            self._remember_shared(self.fingerprint(model, first), count_tokens(str(first.content)) + MESSAGE_OVERHEAD_TOKENS)
+
+    def _remember_shared(self, fingerprint: int, tokens: int):
+        self._shared[fingerprint] = tokens
+        self._shared.move_to_end(fingerprint)
+        while len(self._shared) > 32:
+            self._shared.popitem(last=False)
+
+    def observe(self, key: str, model: str, messages: Sequence[BaseMessage]) -> Tuple[int, int]:
+        """
+        Records the prompt about to be sent for conversation `key`.
+
+        Returns:
+            (estimated tokens served from Ollama's KV cache, estimated prompt tokens)
+        """
+        previous = self._states.pop(key, None)
+        if previous is not None:
+            self._resident_tokens -= previous.total
+        known: Dict[int, int] = dict(zip(previous.fingerprints, previous.tokens)) if previous is not None else {}
+
+        fingerprints = [self.fingerprint(model, message) for message in messages]
+        # Token counts of unchanged messages are carried over instead of re-encoded
+        tokens = [
+            known.get(fp) or count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+            for fp, message in zip(fingerprints, messages)
+        ]
+
+        reused = 0
+        if previous is not None:
+            for fp, old_fp, count in zip(fingerprints, previous.fingerprints, tokens):
+                if fp != old_fp:
+                    break
+                reused += count
+        elif fingerprints and fingerprints[0] in self._shared:
+            reused = tokens[0]
+        if fingerprints:
+            self._remember_shared(fingerprints[0], tokens[0])
+
+        state = _PromptState(fingerprints, tokens)
+        self._states[key] = state
+        self._resident_tokens += state.total
+        self._evict()
+
+        self.reused_tokens += reused
+        self.evaluated_tokens += state.total - reused
+        return reused, state.total
+
+    def _evict(self):
+        # Least recently used first; the conversation just observed is never evicted
+        while len(self._states) > 1 and (
+            self._resident_tokens > self.kv_capacity_tokens or len(self._states) > self.max_conversations
+        ):
+            _, state = self._states.popitem(last=False)
+            self._resident_tokens -= state.total
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "conversations": len(self._states),
+            "resident_tokens": self._resident_tokens,
+            "reused_tokens": self.reused_tokens,
+            "evaluated_tokens": self.evaluated_tokens,
+            "evictions": self.evictions,
+        }
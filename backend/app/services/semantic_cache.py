@@ -0,0 +1,147 @@
+# backend/app/services/semantic_cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.logger import logger
+
+class _AgentIndex:
+    """Inner-product FAISS index of normalized query embeddings for one agent."""
+
+    def __init__(self, dim: int):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        # id -> (query, answer, stored_at); insertion order doubles as FIFO eviction order
+        self.entries: "OrderedDict[int, Tuple[str, str, float]]" = OrderedDict()
+
+class SemanticAnswerCache:
+    """
+    Answer cache for first-turn queries that matches paraphrases, not just exact text.
+
+    Incoming queries are embedded with the shared SentenceTransformer model and searched
+    in a small per-agent FAISS index of previously answered queries. A match above the
+    cosine threshold returns the stored answer. The whole cache is dropped when the
+    knowledge base version (reported by `version_fn`) changes, i.e. after re-ingestion.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.92,
+        max_entries_per_agent: int = 2000,
+        ttl_seconds: Optional[float] = None,
+        version_fn: Optional[Callable[[], Hashable]] = None,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries_per_agent = max(1, max_entries_per_agent)
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn
+        self._version = version_fn() if version_fn else None
+        self._indexes: Dict[str, _AgentIndex] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls, embeddings: Embeddings, version_fn: Optional[Callable[[], Hashable]] = None) -> "SemanticAnswerCache":
+        return cls(
+            embeddings=embeddings,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries_per_agent=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            version_fn=version_fn,
+        )
+
+    async def lookup(self, query: str, agent_name: str, embedding: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns {'answer', 'matched_query', 'similarity'} for the closest cached query of
+        this agent if it is similar enough, otherwise None. `embedding` is the query's
+        embedding if the caller already has it.
+        """
+        self._check_version()
+        agent_index = self._indexes.get(agent_name)
+        if agent_index is None or agent_index.index.ntotal == 0:
+            self.misses += 1
+            return None
+
+        vector = await self._embed(query, embedding)
+        if self._indexes.get(agent_name) is not agent_index:
+            self.misses += 1 # Invalidated while embedding
+            return None
+        scores, ids = agent_index.index.search(vector, 1)
+        similarity, entry_id = float(scores[0][0]), int(ids[0][0])
+        entry = agent_index.entries.get(entry_id)
+        if entry is None or similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        matched_query, answer, stored_at = entry
+        if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+            self._remove(agent_index, entry_id)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logger.debug(f"Semantic cache hit for {agent_name} (similarity {similarity:.3f}): '{query}' ~ '{matched_query}'")
+        return {"answer": answer, "matched_query": matched_query, "similarity": similarity}
+
+    async def store(self, query: str, agent_name: str, answer: str, embedding: Optional[List[float]] = None):
+        """Adds an answered query to the agent's index, evicting the oldest entries past capacity."""
+        self._check_version()
+        vector = await self._embed(query, embedding)
+        agent_index = self._indexes.get(agent_name)
+        if agent_index is None:
+            agent_index = self._indexes[agent_name] = _AgentIndex(vector.shape[1])
+
+        entry_id = self._next_id
+        self._next_id += 1
+        agent_index.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+        agent_index.entries[entry_id] = (query, answer, time.time())
+
+        while len(agent_index.entries) > self.max_entries_per_agent:
+            oldest_id = next(iter(agent_index.entries))
+            self._remove(agent_index, oldest_id)
+
+    def invalidate(self, reason: str = "manual"):
+        """Drops every cached answer."""
+        if self._indexes:
+            logger.info(f"Invalidating semantic answer cache ({reason}).")
+        self._indexes.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": {name: len(idx.entries) for name, idx in self._indexes.items()},
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self.invalidate("knowledge base changed")
+
+    async def _embed(self, text: str, embedding: Optional[List[float]] = None) -> np.ndarray:
+        if embedding is None:
+            # Encoding is CPU-bound; aembed_query keeps it off the event loop
+            embedding = await self.embeddings.aembed_query(text)
+        vector = np.asarray([embedding], dtype="float32")
+        faiss.normalize_L2(vector) # Inner product of unit vectors == cosine similarity
+        return vector
+
+    def _remove(self, agent_index: _AgentIndex, entry_id: int):
+        agent_index.index.remove_ids(np.array([entry_id], dtype="int64"))
+        agent_index.entries.pop(entry_id, None)
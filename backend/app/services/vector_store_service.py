@@ -1,3 +1,4 @@
+import os
 from typing import List, Optional, Dict, Any, Tuple
 from langchain_core.documents import Document
 
@@ -11,15 +12,31 @@ class VectorStoreService:
     Service layer for managing interactions with the vector store.
     Handles initialization and provides methods for adding and searching documents.
     """
-    def __init__(self):
+    def __init__(self, vector_store: Optional[BaseVectorStore] = None):
         # Initialize the specific vector store implementation
         # Could be made configurable later if needed
-        self.vector_store: BaseVectorStore = FAISSVectorStore(
+        # An already-loaded store can be injected so the index is not re-read from disk
+        self.vector_store: BaseVectorStore = vector_store or FAISSVectorStore(
             # Optionally configure embedding model from settings if needed
             # embedding_model_name=settings.EMBEDDING_MODEL_NAME
         )
+        # Bumped whenever documents are added through this service
+        self._revision = 0
         logger.info("VectorStoreService initialized.")
 
+    def knowledge_version(self) -> Tuple[int, Optional[float]]:
+        """
+        Identifies the current state of the knowledge base: the in-process revision
+        plus the on-disk index modification time (changes after re-ingestion).
+        Used to invalidate caches derived from the knowledge base.
+        """
+        index_path = getattr(self.vector_store, "index_path", None)
+        try:
+            mtime = os.path.getmtime(os.path.join(str(index_path), "index.faiss")) if index_path else None
+        except OSError:
+            mtime = None
+        return self._revision, mtime
+
     def add_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
         """
         Adds documents to the configured vector store.
@@ -30,11 +47,79 @@ class VectorStoreService:
         logger.info(f"VectorStoreService adding {len(documents)} documents.")
         try:
             self.vector_store.add_documents(documents)
+            self._revision += 1
         except Exception as e:
             logger.exception("VectorStoreService failed to add documents.")
             # Decide if error should be propagated or handled
             # raise e
 
+    async def aadd_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
+        """Async version of add_documents; embedding and index writes run off the event loop."""
+        logger.info(f"VectorStoreService adding {len(documents)} documents.")
+        try:
+            await self.vector_store.aadd_documents(documents)
+            self._revision += 1
+        except Exception as e:
+            logger.exception("VectorStoreService failed to add documents.")
+
+    async def asearch_similar_documents(self, query: str, k: int = 4) -> List[Document]:
+        """
+        Async version of search_similar_documents. Query embedding and the FAISS search
+        run on the inference executor, so concurrent requests keep being served meanwhile.
+
+        Args:
+            query: The search query string.
+            k: The number of documents to return.
+
+        Returns:
+            A list of LangChain Document objects found.
+        """
+        logger.info(f"VectorStoreService searching for documents similar to: '{query}'")
+        try:
+            results_with_scores = await self.vector_store.asimilarity_search(query, k=k)
+            documents = [doc for doc, score in results_with_scores]
+            logger.info(f"VectorStoreService found {len(documents)} similar documents.")
+            return documents
+        except Exception as e:
+            logger.exception("VectorStoreService failed during similarity search.")
+            return []
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Embeds a query with the store's embedding model, on the inference executor."""
+        return await self.vector_store.embedding_function.aembed_query(query)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several texts in one batch, on the inference executor."""
+        return await self.vector_store.embedding_function.aembed_documents(texts)
+
+    @property
+    def supports_search_by_vector(self) -> bool:
+        return self.vector_store.supports_search_by_vector
+
+    async def asearch_by_vector(self, embedding: List[float], k: int = 4, query: Optional[str] = None) -> List[Document]:
+        """
+        Like asearch_similar_documents, for a query already embedded with aembed_query
+        (e.g. once per turn, shared with agent routing), so it isn't encoded twice.
+
+        Args:
+            embedding: The embedded query.
+            k: The number of documents to return.
+            query: The query text, searched instead if the store can't search by vector.
+        """
+        try:
+            results_with_scores = await self.vector_store.asimilarity_search_by_vector(embedding, k=k)
+            documents = [doc for doc, score in results_with_scores]
+            logger.info(f"VectorStoreService found {len(documents)} similar documents (by vector).")
+            return documents
+        except NotImplementedError:
+            if query is None:
+                raise
+            logger.debug(f"{type(self.vector_store).__name__} can't search by vector; searching by text.")
+            return await self.asearch_similar_documents(query, k=k)
+        except Exception as e:
+            logger.exception("VectorStoreService failed during similarity search by vector.")
+            return []
+
     def search_similar_documents(self, query: str, k: int = 4) -> List[Document]:
         """
         Searches for documents similar to the query in the vector store.
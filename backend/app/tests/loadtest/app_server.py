@@ -0,0 +1,81 @@
+# backend/app/tests/loadtest/app_server.py
+"""
+Runs the real FastAPI app for load testing, with the external knowledge clients
+replaced by the offline fakes and Ollama pointed at the fake server.
+
+Started as a subprocess by run_load_test.py (so the load generator does not share
+the app's event loop), but can also be run by hand:
+    python -m app.tests.loadtest.app_server --port 8600 --ollama-url http://127.0.0.1:11500
+"""
+import argparse
+import os
+import sys
+
+# Ensure the backend directory is in the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.insert(0, backend_dir)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the chatbot API with offline knowledge clients.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--ollama-url", default="http://127.0.0.1:11500")
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file.")
+    parser.add_argument("--wikipedia-latency", type=float, default=0.3)
+    parser.add_argument("--arxiv-latency", type=float, default=0.8)
+    parser.add_argument("--github-latency", type=float, default=0.5)
+    parser.add_argument("--web-search-latency", type=float, default=0.6)
+    parser.add_argument("--knowledge-jitter", type=float, default=0.2)
+    parser.add_argument("--knowledge-miss-rate", type=float, default=0.0)
+    return parser
+
+def configure_environment(args: argparse.Namespace):
+    """Points settings at the fakes. Must run before anything under `app` is imported."""
+    os.environ["OLLAMA_API_BASE_URL"] = args.ollama_url
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(backend_dir, 'data', 'loadtest', 'chat_history.db')}")
+    os.environ.setdefault("CORS_ORIGINS", "http://localhost:3000")
+    os.environ.setdefault("VECTOR_STORE_PATH", os.path.join(backend_dir, '..', 'data', 'vector_store'))
+    # The real clients are only built on first use and the fakes replace them, but keep them offline regardless
+    os.environ["GITHUB_PAT"] = ""
+    os.environ.setdefault("SCRAPINGBEE_API_KEY", "loadtest-placeholder")
+
+def build_container(args: argparse.Namespace):
+    """ServiceContainer whose KnowledgeService uses the fake clients."""
+    from app.core.container import ServiceContainer
+    from app.services.knowledge_service import KnowledgeService
+    from app.tests.loadtest.fake_knowledge import (
+        FakeArxivClient, FakeConcordiaScraper, FakeGitHubClient, FakeLatency,
+        FakeWebSearchClient, FakeWikipediaClient,
+    )
+
+    def latency(seconds: float) -> FakeLatency:
+        return FakeLatency(seconds, jitter=args.knowledge_jitter, miss_rate=args.knowledge_miss_rate)
+
+    knowledge_service = KnowledgeService(
+        wikipedia=FakeWikipediaClient(latency(args.wikipedia_latency)),
+        arxiv=FakeArxivClient(latency(args.arxiv_latency)),
+        github=FakeGitHubClient(latency(args.github_latency)),
+        web_search=FakeWebSearchClient(latency(args.web_search_latency)),
+        scraper=FakeConcordiaScraper(),
+    )
+    return ServiceContainer(knowledge_service=knowledge_service)
+
+def main():
+    args = build_arg_parser().parse_args()
+    configure_environment(args)
+    db_path = os.environ["DATABASE_URL"].split(":///", 1)[-1]
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    import uvicorn
+    from app.core.container import init_container
+    from app.main import app
+
+    # Installed before startup; the startup event keeps it instead of building the default
+    init_container(build_container(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# backend/app/tests/loadtest/fake_knowledge.py
+"""
+Offline stand-ins for the external knowledge clients, used by the load-test harness.
+
+Each fake mirrors the public methods (and return shapes) of the real client it
+replaces, sleeping for a configurable latency instead of calling the network.
+Synchronous clients block (they run in KnowledgeService's thread pool, like the
+real ones); the web search client is async.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+
+class FakeLatency:
+    """Latency model shared by the fakes: a base delay with +/- jitter and an optional miss rate."""
+
+    def __init__(self, seconds: float = 0.2, jitter: float = 0.2, miss_rate: float = 0.0):
+        self.seconds = seconds
+        self.jitter = jitter
+        self.miss_rate = miss_rate # Fraction of calls that find nothing
+
+    def sample(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return max(0.0, self.seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def miss(self) -> bool:
+        return self.miss_rate > 0 and random.random() < self.miss_rate
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"seconds": self.seconds, "jitter": self.jitter, "miss_rate": self.miss_rate}
+
+
+class FakeWikipediaClient:
+    """Stand-in for app.knowledge.wikipedia_client.WikipediaClient."""
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(0.3)
+        self.calls = 0
+
+    def get_summary(self, topic: str, sentences: int = 3) -> Optional[str]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.miss():
+            return None
+        return " ".join(f"{topic} is a topic described in sentence {i + 1} of this summary." for i in range(sentences))
+
+    def search_pages(self, query: str, limit: int = 5) -> List[str]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        return [] if self.latency.miss() else [query][:limit]
+
+
+class FakeArxivClient:
+    """Stand-in for app.knowledge.arxiv_client.ArxivClient."""
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(0.8)
+        self.calls = 0
+
+    def search_papers(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.miss():
+            return []
+        return [
+            {
+                "entry_id": f"http://arxiv.org/abs/2401.{i:05d}v1",
+                "title": f"A Study of {query} ({i + 1})",
+                "authors": ["A. Researcher", "B. Scientist"],
+                "summary": f"We investigate {query} and report results on standard benchmarks. " * 3,
+                "published": "2024-01-01",
+                "pdf_url": f"http://arxiv.org/pdf/2401.{i:05d}v1",
+                "primary_category": "cs.LG",
+                "categories": ["cs.LG", "cs.AI"],
+            }
+            for i in range(max_results)
+        ]
+
+
+class FakeGitHubClient:
+    """Stand-in for app.knowledge.github_client.GitHubClient."""
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(0.5)
+        self.client = object() # Real client exposes the PyGithub instance; callers only check it is set
+        self.calls = 0
+
+    def search_repositories(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.miss():
+            return []
+        slug = "-".join(query.lower().split()[:3]) or "project"
+        return [
+            {
+                "name": f"example-org/{slug}-{i + 1}",
+                "url": f"https://github.com/example-org/{slug}-{i + 1}",
+                "description": f"Reference implementation related to {query}.",
+                "stars": 1000 - i * 100,
+                "language": "Python",
+                "last_updated": "2024-01-01",
+            }
+            for i in range(max_results)
+        ]
+
+    def search_code(self, query: str, max_results: int = 5, language: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.miss():
+            return []
+        return [
+            {
+                "file_url": f"https://github.com/example-org/code/blob/main/src/file_{i + 1}.py",
+                "repository": "example-org/code",
+                "path": f"src/file_{i + 1}.py",
+            }
+            for i in range(max_results)
+        ]
+
+
+class FakeWebSearchClient:
+    """Stand-in for app.knowledge.web_search_client.WebSearchClient."""
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(0.6)
+        self.calls = 0
+
+    async def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        if self.latency.miss():
+            return []
+        return [
+            {
+                "title": f"{query} - result {i + 1}",
+                "href": f"https://example.com/search/{i + 1}",
+                "body": f"Snippet {i + 1} discussing {query}.",
+            }
+            for i in range(max_results)
+        ]
+
+
+class FakeConcordiaScraper:
+    """Stand-in for app.knowledge.concordia.web_scraper.ConcordiaWebScraper (no ScrapingBee key needed)."""
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(1.0)
+
+    def scrape_pages(self) -> List[Dict[str, str]]:
+        time.sleep(self.latency.sample())
+        return []
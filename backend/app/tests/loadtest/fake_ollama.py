@@ -0,0 +1,260 @@
+# backend/app/tests/loadtest/fake_ollama.py
+"""
+Local stand-in for the Ollama HTTP API, used by the load-test harness.
+
+Implements the endpoints the backend talks to (/api/generate, /api/chat, /api/tags,
+/api/ps, /api/show) with NDJSON streaming, a configurable time-to-first-token,
+token rate and parallelism (Ollama serves at most OLLAMA_NUM_PARALLEL requests
+per model at once; the rest wait).
+
+Run standalone:
+    python -m app.tests.loadtest.fake_ollama --port 11500 --token-rate 40 --first-token-latency 0.3
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "the student program course concordia admission model agent knowledge answer "
+    "learning network research paper repository data system question context result"
+).split()
+
+
+class FakeOllamaConfig:
+    """Behaviour knobs of the fake server."""
+
+    def __init__(
+        self,
+        token_rate: float = 40.0,
+        first_token_latency: float = 0.25,
+        response_tokens: int = 60,
+        jitter: float = 0.1,
+        parallel: int = 1,
+        load_latency: float = 0.0,
+        models: Optional[List[str]] = None,
+    ):
+        self.token_rate = token_rate # Generated tokens per second, per request
+        self.first_token_latency = first_token_latency # Prompt evaluation time before the first token
+        self.response_tokens = response_tokens # Tokens per response
+        self.jitter = jitter # +/- fraction applied to latencies
+        self.parallel = max(1, parallel) # Requests generated at once (like OLLAMA_NUM_PARALLEL)
+        self.load_latency = load_latency # One-off model load delay on first use
+        self.models = models or ["mistral"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class FakeOllamaServer:
+    """aiohttp application emulating the subset of the Ollama API used by the backend."""
+
+    def __init__(self, config: FakeOllamaConfig):
+        self.config = config
+        self._slots = asyncio.Semaphore(config.parallel)
+        self._loaded: Dict[str, float] = {} # model -> expires_at (epoch seconds)
+        self.requests_served = 0
+        self.in_flight = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/generate", self.handle_generate)
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_post("/api/show", self.handle_show)
+        app.router.add_get("/", self.handle_root)
+        return app
+
+    # --- Handlers ---
+
+    async def handle_root(self, request: web.Request) -> web.Response:
+        return web.Response(text="Ollama is running")
+
+    async def handle_tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [self._model_info(name) for name in self.config.models]})
+
+    async def handle_ps(self, request: web.Request) -> web.Response:
+        now = time.time()
+        models = []
+        for name, expires_at in self._loaded.items():
+            if expires_at > now:
+                info = self._model_info(name)
+                info["expires_at"] = datetime.fromtimestamp(expires_at, tz=timezone.utc).isoformat()
+                info["size_vram"] = info["size"]
+                models.append(info)
+        return web.json_response({"models": models})
+
+    async def handle_show(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        name = body.get("model") or body.get("name")
+        if name not in self.config.models:
+            return web.json_response({"error": f"model '{name}' not found"}, status=404)
+        return web.json_response({"modelfile": "", "parameters": "", "template": "", "details": self._model_info(name)["details"]})
+
+    async def handle_generate(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        return await self._respond(request, body, prompt, lambda token: {"response": token})
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        return await self._respond(request, body, prompt, lambda token: {"message": {"role": "assistant", "content": token}})
+
+    # --- Generation ---
+
+    async def _respond(self, request: web.Request, body: Dict[str, Any], prompt: str, frame) -> web.StreamResponse:
+        model = body.get("model", self.config.models[0])
+        if model not in self.config.models:
+            return web.json_response({"error": f"model '{model}' not found, try pulling it first"}, status=404)
+        stream = body.get("stream", True)
+        keep_alive = self._keep_alive_seconds(body.get("keep_alive"))
+
+        # An empty prompt only loads the model (what `ollama run` / warm-up calls do)
+        if not prompt:
+            await self._ensure_loaded(model, keep_alive)
+            return web.json_response({"model": model, "created_at": self._now(), "response": "", "done": True, "done_reason": "load"})
+
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                load_duration = await self._ensure_loaded(model, keep_alive)
+                tokens = self._tokens_for(prompt, body.get("options") or {})
+                if not stream:
+                    started = time.perf_counter()
+                    async for _ in self._generate(tokens):
+                        pass
+                    payload = {"model": model, "created_at": self._now(), **frame("".join(tokens))}
+                    payload.update(self._final_stats(prompt, tokens, started, load_duration))
+                    return web.json_response(payload)
+
+                response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+                await response.prepare(request)
+                started = time.perf_counter()
+                async for token in self._generate(tokens):
+                    line = {"model": model, "created_at": self._now(), **frame(token), "done": False}
+                    await response.write((json.dumps(line) + "\n").encode("utf-8"))
+                final = {"model": model, "created_at": self._now(), **frame(""), "done": True}
+                final.update(self._final_stats(prompt, tokens, started, load_duration))
+                await response.write((json.dumps(final) + "\n").encode("utf-8"))
+                await response.write_eof()
+                return response
+            finally:
+                self.in_flight -= 1
+                self.requests_served += 1
+
+    async def _generate(self, tokens: List[str]) -> AsyncIterator[str]:
+        await asyncio.sleep(self._jittered(self.config.first_token_latency))
+        interval = 1.0 / self.config.token_rate if self.config.token_rate > 0 else 0.0
+        for token in tokens:
+            yield token
+            if interval:
+                await asyncio.sleep(self._jittered(interval))
+
+    def _tokens_for(self, prompt: str, options: Dict[str, Any]) -> List[str]:
+        # Deterministic per prompt (and seed) so cached and uncached runs are comparable
+        seed = int(hashlib.sha256(f"{options.get('seed')}|{prompt}".encode("utf-8")).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        count = int(options.get("num_predict") or self.config.response_tokens)
+        words = [rng.choice(WORDS) for _ in range(max(1, count))]
+        tokens = [words[0].capitalize()] + [f" {word}" for word in words[1:]]
+        tokens[-1] += "."
+        return tokens
+
+    async def _ensure_loaded(self, model: str, keep_alive: float) -> float:
+        """Simulates the model load on first use (or after keep_alive expired). Returns the load time."""
+        now = time.time()
+        load_duration = 0.0
+        if self._loaded.get(model, 0.0) <= now and self.config.load_latency > 0:
+            load_duration = self.config.load_latency
+            await asyncio.sleep(load_duration)
+        self._loaded[model] = time.time() + keep_alive
+        return load_duration
+
+    def _final_stats(self, prompt: str, tokens: List[str], started: float, load_duration: float) -> Dict[str, Any]:
+        total = time.perf_counter() - started
+        prompt_eval = min(total, self.config.first_token_latency)
+        return {
+            "done_reason": "stop",
+            "context": [],
+            "total_duration": int((total + load_duration) * 1e9),
+            "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int((total - prompt_eval) * 1e9),
+        }
+
+    def _jittered(self, seconds: float) -> float:
+        if seconds <= 0 or self.config.jitter <= 0:
+            return max(0.0, seconds)
+        return max(0.0, seconds * random.uniform(1 - self.config.jitter, 1 + self.config.jitter))
+
+    @staticmethod
+    def _keep_alive_seconds(value: Any) -> float:
+        # Ollama accepts seconds or duration strings like "5m"; negative means forever
+        if value is None:
+            return 300.0
+        if isinstance(value, (int, float)):
+            return float("inf") if value < 0 else float(value)
+        text = str(value).strip()
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        for suffix in ("ms", "s", "m", "h"):
+            if text.endswith(suffix):
+                number = float(text[: -len(suffix)])
+                return float("inf") if number < 0 else number * units[suffix]
+        number = float(text)
+        return float("inf") if number < 0 else number
+
+    @staticmethod
+    def _model_info(name: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "model": name,
+            "modified_at": "2024-01-01T00:00:00Z",
+            "size": 4_000_000_000,
+            "digest": hashlib.sha256(name.encode("utf-8")).hexdigest(),
+            "details": {"format": "gguf", "family": "fake", "parameter_size": "7B", "quantization_level": "Q4_0"},
+        }
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--token-rate", type=float, default=40.0, help="Tokens per second per request.")
+    parser.add_argument("--first-token-latency", type=float, default=0.25, help="Seconds before the first token.")
+    parser.add_argument("--response-tokens", type=int, default=60, help="Tokens per response.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- fraction applied to latencies.")
+    parser.add_argument("--parallel", type=int, default=1, help="Requests generated at once (OLLAMA_NUM_PARALLEL).")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Model load time on first use.")
+    parser.add_argument("--models", default="mistral", help="Comma-separated model names to serve.")
+    return parser
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        token_rate=args.token_rate,
+        first_token_latency=args.first_token_latency,
+        response_tokens=args.response_tokens,
+        jitter=args.jitter,
+        parallel=args.parallel,
+        load_latency=args.load_latency,
+        models=[name.strip() for name in args.models.split(",") if name.strip()],
+    )
+
+if __name__ == "__main__":
+    cli_args = build_arg_parser().parse_args()
+    server = FakeOllamaServer(config_from_args(cli_args))
+    print(f"Fake Ollama listening on http://{cli_args.host}:{cli_args.port} ({server.config.as_dict()})")
+    web.run_app(server.build_app(), host=cli_args.host, port=cli_args.port, print=None)
@@ -0,0 +1,80 @@
+# backend/app/tests/loadtest/measure_mmap_memory.py
+"""
+Measures whether N worker processes actually share the memory-mapped FAISS index.
+
+Each worker opens index.faiss with the same flags as VECTOR_STORE_MMAP serving plus the
+mmap docstore, runs a search that touches every vector, then reports its RSS and PSS
+(proportional set size, from /proc/self/smaps_rollup; Linux only). Shared pages are
+split between the processes in PSS, so with working mmap each worker's PSS growth is
+roughly index size / N; with private copies it is the full index size.
+
+Run from the backend directory:
+    python -m app.tests.loadtest.measure_mmap_memory --workers 4
+    python -m app.tests.loadtest.measure_mmap_memory --path ./data/vector_store --workers 8
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from typing import Tuple
+
+# Ensure the backend directory is in the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.insert(0, backend_dir)
+
+def memory_mib() -> Tuple[int, int]:
+    """(RSS, PSS) of this process in MiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) // 1024
+    return values["Rss"], values["Pss"]
+
+def worker(path: str, results: "mp.Queue", barrier: "mp.Barrier"):
+    import faiss
+    import numpy as np
+    from app.vectorstores.faiss_store import MMAP_READ_FLAGS
+    from app.vectorstores.mmap_docstore import MmapDocstore
+
+    before = memory_mib()
+    index = faiss.read_index(os.path.join(path, "index.faiss"), MMAP_READ_FLAGS)
+    docstore = MmapDocstore(path)
+    # A flat search reads every vector, so all index pages are resident afterwards
+    _, rows = index.search(np.random.rand(4, index.d).astype("float32"), 4)
+    for row in rows[0]:
+        docstore.search(str(row))
+    # Measure only once every worker has mapped the index, so PSS reflects the sharing
+    barrier.wait()
+    time.sleep(0.5)
+    results.put((os.getpid(), before, memory_mib()))
+    barrier.wait()
+
+def main():
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=str(settings.VECTOR_STORE_PATH), help="Vector store directory (index.faiss + mmap docstore).")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    index_size = os.path.getsize(os.path.join(args.path, "index.faiss")) // 2**20
+    results: "mp.Queue" = mp.Queue()
+    barrier = mp.Barrier(args.workers)
+    processes = [mp.Process(target=worker, args=(args.path, results, barrier)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print(f"index.faiss: {index_size} MiB, {args.workers} workers")
+    for pid, (rss_before, pss_before), (rss_after, pss_after) in rows:
+        print(f"  pid {pid}: RSS {rss_before} -> {rss_after} MiB, PSS {pss_before} -> {pss_after} MiB (+{pss_after - pss_before})")
+    growth = sum(pss_after - pss_before for _, (_, pss_before), (_, pss_after) in rows) / len(rows)
+    print(f"mean PSS growth per worker: {growth:.0f} MiB ({'shared' if growth < 0.75 * index_size else 'NOT shared'})")
+
+if __name__ == "__main__":
+    main()
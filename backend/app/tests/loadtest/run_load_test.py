@@ -0,0 +1,440 @@
+# backend/app/tests/loadtest/run_load_test.py
+"""
+End-to-end load test for the chat API.
+
+Starts the fake Ollama server and the real FastAPI app (with offline knowledge
+clients) as subprocesses, drives mixed traffic across the three agents at a fixed
+concurrency, and writes throughput plus p50/p95/p99 latency (overall, per agent
+and per pipeline stage, from the `debug_info.stage_timings_ms` the API returns)
+to a JSON file that can be diffed between versions.
+
+Run from the backend directory:
+    python -m app.tests.loadtest.run_load_test --concurrency 8 --requests 200 --output loadtest_results.json
+    python -m app.tests.loadtest.run_load_test --mode stream --baseline previous_results.json
+
+Note: the app still loads the real SentenceTransformer model and FAISS index, so the
+embedding model must be available locally (downloaded once, or in the HF cache).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Ensure the backend directory is in the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.insert(0, backend_dir)
+
+# Queries expected to route to each agent (keyword routing today)
+QUERIES: Dict[str, List[str]] = {
+    "GeneralAgent": [
+        "What is the capital of France?",
+        "Who wrote Pride and Prejudice?",
+        "What is photosynthesis?",
+        "Tell me about the history of Montreal",
+        "Search the web for the Roman Empire",
+        "What is the speed of sound?",
+    ],
+    "AdmissionsAgent": [
+        "What are the admission requirements for Computer Science at Concordia?",
+        "What is the application deadline for the BCompSc program?",
+        "What GPA do I need to apply to Concordia?",
+        "Which CEGEP prerequisites are required for computer science?",
+        "How much is tuition for international students at Concordia?",
+    ],
+    "AIExpertAgent": [
+        "Find papers on arxiv about transformer architectures",
+        "How does a neural network learn from data?",
+        "Search github for LLM agent frameworks",
+        "Show repositories for diffusion models in pytorch",
+        "Summarize recent papers on reinforcement learning",
+    ],
+}
+
+FOLLOW_UPS = [
+    "Can you tell me more?",
+    "Why is that?",
+    "Give me a shorter version.",
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+# --- Statistics ---
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of `values` (0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    summary = {"count": len(values)}
+    for pct in PERCENTILES:
+        summary[f"p{pct}"] = round(percentile(values, pct), 2)
+    summary["mean"] = round(sum(values) / len(values), 2) if values else 0.0
+    summary["max"] = round(max(values), 2) if values else 0.0
+    return summary
+
+
+# --- Traffic ---
+
+class RequestSpec:
+    """One request of the plan: which agent it targets, the query, and whether it continues a conversation."""
+
+    def __init__(self, expected_agent: str, query: str, follow_up: bool):
+        self.expected_agent = expected_agent
+        self.query = query
+        self.follow_up = follow_up
+
+def build_plan(total: int, mix: Dict[str, float], follow_up_ratio: float, seed: int) -> List[RequestSpec]:
+    """Deterministic (per seed) sequence of requests drawn from the agent mix."""
+    rng = random.Random(seed)
+    agents = [agent for agent in mix if mix[agent] > 0]
+    weights = [mix[agent] for agent in agents]
+    plan = []
+    for _ in range(total):
+        if rng.random() < follow_up_ratio:
+            plan.append(RequestSpec("", rng.choice(FOLLOW_UPS), follow_up=True))
+            continue
+        agent = rng.choices(agents, weights=weights)[0]
+        plan.append(RequestSpec(agent, rng.choice(QUERIES[agent]), follow_up=False))
+    return plan
+
+async def send_blocking(client: httpx.AsyncClient, payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = await client.post("/api/v1/chat/", json=payload)
+    result: Dict[str, Any] = {"status": response.status_code}
+    if response.status_code == 200:
+        body = response.json()
+        result["agent"] = body.get("agent_name")
+        result["conversation_id"] = body.get("conversation_id")
+        result["stages"] = (body.get("debug_info") or {}).get("stage_timings_ms", {})
+    else:
+        result["error"] = response.text[:200]
+    return result
+
+async def send_stream(client: httpx.AsyncClient, payload: Dict[str, Any], started: float) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    async with client.stream("POST", "/api/v1/chat/stream", json=payload) as response:
+        result["status"] = response.status_code
+        if response.status_code != 200:
+            result["error"] = (await response.aread()).decode("utf-8", errors="replace")[:200]
+            return result
+        event_name = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event_name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event_name == "token" and "ttft_ms" not in result:
+                    result["ttft_ms"] = (time.perf_counter() - started) * 1000.0
+                elif event_name == "done":
+                    result["agent"] = data.get("agent_name")
+                    result["conversation_id"] = data.get("conversation_id")
+                    result["stages"] = (data.get("debug_info") or {}).get("stage_timings_ms", {})
+                    result.setdefault("ttft_ms", (time.perf_counter() - started) * 1000.0)
+                elif event_name == "error":
+                    result["status"] = 503 if "retry_after" in data else 500
+                    result["error"] = data.get("detail", "")[:200]
+    return result
+
+async def run_traffic(base_url: str, plan: List[RequestSpec], concurrency: int, mode: str, timeout: float) -> List[Dict[str, Any]]:
+    """Sends the plan with `concurrency` virtual users; each user keeps its own conversation for follow-ups."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for spec in plan:
+        queue.put_nowait(spec)
+    results: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def user(client: httpx.AsyncClient):
+        conversation_id: Optional[str] = None
+        while True:
+            try:
+                spec: RequestSpec = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            payload: Dict[str, Any] = {"query": spec.query}
+            if spec.follow_up and conversation_id:
+                payload["conversation_id"] = conversation_id
+            started = time.perf_counter()
+            try:
+                if mode == "stream":
+                    result = await send_stream(client, payload, started)
+                else:
+                    result = await send_blocking(client, payload)
+            except Exception as e:
+                result = {"status": 0, "error": f"{type(e).__name__}: {e}"[:200]}
+            result["latency_ms"] = (time.perf_counter() - started) * 1000.0
+            result["expected_agent"] = spec.expected_agent
+            result["follow_up"] = spec.follow_up
+            if result.get("conversation_id"):
+                conversation_id = result["conversation_id"]
+            results.append(result)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    return results
+
+
+# --- Report ---
+
+def build_report(results: List[Dict[str, Any]], duration: float, config: Dict[str, Any], server_stats: Dict[str, Any]) -> Dict[str, Any]:
+    ok = [r for r in results if r.get("status") == 200]
+    status_codes: Dict[str, int] = defaultdict(int)
+    for r in results:
+        status_codes[str(r.get("status"))] += 1
+
+    by_agent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in ok:
+        by_agent[r.get("agent") or "unknown"].append(r)
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    stages_by_agent: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    for r in ok:
+        for stage_name, ms in (r.get("stages") or {}).items():
+            stages[stage_name].append(ms)
+            stages_by_agent[r.get("agent") or "unknown"][stage_name].append(ms)
+
+    routed = [r for r in ok if r["expected_agent"]]
+    routing_matches = sum(1 for r in routed if r.get("agent") == r["expected_agent"])
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": config,
+        "summary": {
+            "requests": len(results),
+            "succeeded": len(ok),
+            "failed": len(results) - len(ok),
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(len(ok) / duration, 3) if duration > 0 else 0.0,
+            "latency_ms": summarize([r["latency_ms"] for r in ok]),
+            "routing_accuracy": round(routing_matches / len(routed), 4) if routed else None,
+        },
+        "status_codes": dict(status_codes),
+        "agents": {
+            agent: {
+                "requests": len(items),
+                "latency_ms": summarize([r["latency_ms"] for r in items]),
+            }
+            for agent, items in sorted(by_agent.items())
+        },
+        "stages_ms": {name: summarize(values) for name, values in sorted(stages.items())},
+        "stages_by_agent_ms": {
+            agent: {name: summarize(values) for name, values in sorted(agent_stages.items())}
+            for agent, agent_stages in sorted(stages_by_agent.items())
+        },
+        "errors": sorted({r["error"] for r in results if r.get("error")})[:20],
+        "server": server_stats,
+    }
+    ttft = [r["ttft_ms"] for r in ok if "ttft_ms" in r]
+    if ttft:
+        report["summary"]["ttft_ms"] = summarize(ttft)
+    return report
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Human-readable p50/p95/p99 deltas against a previous results file."""
+    lines = []
+
+    def delta(label: str, old: Optional[Dict[str, float]], new: Optional[Dict[str, float]]):
+        if not old or not new:
+            return
+        parts = []
+        for key in [f"p{pct}" for pct in PERCENTILES]:
+            before, after = old.get(key, 0.0), new.get(key, 0.0)
+            change = ((after - before) / before * 100.0) if before else 0.0
+            parts.append(f"{key} {before:.1f} -> {after:.1f} ({change:+.1f}%)")
+        lines.append(f"{label:<32} " + "  ".join(parts))
+
+    old_tp, new_tp = baseline["summary"].get("throughput_rps", 0.0), current["summary"].get("throughput_rps", 0.0)
+    lines.append(f"{'throughput_rps':<32} {old_tp:.2f} -> {new_tp:.2f}")
+    delta("latency_ms", baseline["summary"].get("latency_ms"), current["summary"].get("latency_ms"))
+    delta("ttft_ms", baseline["summary"].get("ttft_ms"), current["summary"].get("ttft_ms"))
+    for stage_name in sorted(set(baseline.get("stages_ms", {})) | set(current.get("stages_ms", {}))):
+        delta(f"stage:{stage_name}", baseline.get("stages_ms", {}).get(stage_name), current.get("stages_ms", {}).get(stage_name))
+    return lines
+
+def print_report(report: Dict[str, Any]):
+    summary = report["summary"]
+    print(f"\nRequests: {summary['requests']} ({summary['failed']} failed) in {summary['duration_seconds']}s "
+          f"-> {summary['throughput_rps']} req/s, routing accuracy {summary['routing_accuracy']}")
+    print(f"{'':<32} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [("latency_ms", summary["latency_ms"])]
+    if "ttft_ms" in summary:
+        rows.append(("ttft_ms", summary["ttft_ms"]))
+    rows += [(f"agent:{agent}", stats["latency_ms"]) for agent, stats in report["agents"].items()]
+    rows += [(f"stage:{name}", stats) for name, stats in report["stages_ms"].items()]
+    for label, stats in rows:
+        print(f"{label:<32} {stats['count']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+
+
+# --- Processes ---
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=backend_dir, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def _start(module: str, args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module, *args], cwd=backend_dir, env=env)
+
+async def _wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Process serving {url} exited with code {process.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+async def _fetch_server_stats(base_url: str) -> Dict[str, Any]:
+    stats = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        for name, path in (("llm_queue", "/api/v1/chat/queue"), ("caches", "/api/v1/chat/cache")):
+            try:
+                stats[name] = (await client.get(path)).json()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+    return stats
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    aliases = {"general": "GeneralAgent", "admissions": "AdmissionsAgent", "ai": "AIExpertAgent", "ai_expert": "AIExpertAgent"}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        agent = aliases.get(name.strip().lower(), name.strip())
+        if agent not in QUERIES:
+            raise argparse.ArgumentTypeError(f"Unknown agent in mix: {name}")
+        mix[agent] = float(weight or 1)
+    return mix
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test the chat API against local stand-ins.")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests.")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests sent first.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent virtual users.")
+    parser.add_argument("--mode", choices=["blocking", "stream"], default="blocking", help="POST /chat/ or SSE /chat/stream.")
+    parser.add_argument("--mix", type=_parse_mix, default="general=1,admissions=1,ai=1", help="Agent weights, e.g. general=2,admissions=1,ai=1.")
+    parser.add_argument("--follow-up-ratio", type=float, default=0.2, help="Fraction of requests continuing the user's conversation.")
+    parser.add_argument("--seed", type=int, default=474)
+    parser.add_argument("--request-timeout", type=float, default=180.0)
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for the app to start.")
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--baseline", default=None, help="Previous results file to compare against.")
+    parser.add_argument("--target", default=None, help="Use an already running app at this URL instead of starting one.")
+    parser.add_argument("--app-port", type=int, default=8600)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="Extra settings for the app process (repeatable).")
+    # Fake Ollama
+    parser.add_argument("--ollama-url", default=None, help="Use this Ollama (real or fake) instead of starting the fake one.")
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--token-rate", type=float, default=40.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.25)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--ollama-parallel", type=int, default=1)
+    # Fake knowledge clients
+    parser.add_argument("--wikipedia-latency", type=float, default=0.3)
+    parser.add_argument("--arxiv-latency", type=float, default=0.8)
+    parser.add_argument("--github-latency", type=float, default=0.5)
+    parser.add_argument("--web-search-latency", type=float, default=0.6)
+    parser.add_argument("--knowledge-miss-rate", type=float, default=0.0)
+    return parser
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    processes: List[subprocess.Popen] = []
+    env = dict(os.environ)
+    env["PYTHONPATH"] = backend_dir + os.pathsep + env.get("PYTHONPATH", "")
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key.strip()] = value
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+
+    try:
+        ollama_url = args.ollama_url
+        if ollama_url is None and args.target is None:
+            ollama_url = f"http://127.0.0.1:{args.ollama_port}"
+            fake_ollama = _start("app.tests.loadtest.fake_ollama", [
+                "--port", str(args.ollama_port),
+                "--token-rate", str(args.token_rate),
+                "--first-token-latency", str(args.first_token_latency),
+                "--response-tokens", str(args.response_tokens),
+                "--parallel", str(args.ollama_parallel),
+            ], env)
+            processes.append(fake_ollama)
+            await _wait_until_ready(f"{ollama_url}/api/tags", fake_ollama, 30.0)
+
+        base_url = args.target
+        if base_url is None:
+            base_url = f"http://127.0.0.1:{args.app_port}"
+            app_process = _start("app.tests.loadtest.app_server", [
+                "--port", str(args.app_port),
+                "--ollama-url", ollama_url,
+                "--database-url", f"sqlite+aiosqlite:///{os.path.join(workdir, 'chat_history.db')}",
+                "--wikipedia-latency", str(args.wikipedia_latency),
+                "--arxiv-latency", str(args.arxiv_latency),
+                "--github-latency", str(args.github_latency),
+                "--web-search-latency", str(args.web_search_latency),
+                "--knowledge-miss-rate", str(args.knowledge_miss_rate),
+            ], env)
+            processes.append(app_process)
+            # Ready only after the app's warm-up, so cold-start costs stay out of the measurements
+            await _wait_until_ready(f"{base_url}/health/ready", app_process, args.ready_timeout)
+        print(f"Target ready at {base_url}; running {args.warmup} warm-up + {args.requests} measured requests at concurrency {args.concurrency} ({args.mode}).")
+
+        if args.warmup:
+            await run_traffic(base_url, build_plan(args.warmup, args.mix, 0.0, args.seed + 1), args.concurrency, args.mode, args.request_timeout)
+
+        plan = build_plan(args.requests, args.mix, args.follow_up_ratio, args.seed)
+        started = time.perf_counter()
+        results = await run_traffic(base_url, plan, args.concurrency, args.mode, args.request_timeout)
+        duration = time.perf_counter() - started
+
+        config = {key: value for key, value in vars(args).items() if key not in ("baseline", "output")}
+        return build_report(results, duration, config, await _fetch_server_stats(base_url))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def main():
+    args = build_arg_parser().parse_args()
+    report = asyncio.run(main_async(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print_report(report)
+    print(f"\nResults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparison with {args.baseline}:")
+        for line in compare_reports(baseline, report):
+            print(line)
+
+if __name__ == "__main__":
+    main()
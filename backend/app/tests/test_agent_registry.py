@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.agents.registry import agent_model_tiers
+from app.core.config import Settings, settings
+
+def test_agent_model_tiers_parses_overrides(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_MODEL_TIERS", "GeneralAgent=small, AIExpertAgent = large,")
+    assert agent_model_tiers() == {"GeneralAgent": "small", "AIExpertAgent": "large"}
+
+def test_agent_model_tiers_is_empty_when_unset(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_MODEL_TIERS", None)
+    assert agent_model_tiers() == {}
+
+@pytest.mark.parametrize("value", ["GeneralAgent=tiny", "GeneralAgent", "=small"])
+def test_agent_model_tiers_rejects_bad_entries(monkeypatch, value):
+    monkeypatch.setattr(settings, "AGENT_MODEL_TIERS", value)
+    with pytest.raises(ValueError):
+        agent_model_tiers()
+
+@pytest.mark.parametrize("value", ["GeneralAgent=tiny", "GeneralAgent", "=small"])
+def test_settings_reject_bad_agent_model_tiers(value):
+    with pytest.raises(ValidationError, match="AGENT_MODEL_TIERS"):
+        Settings(AGENT_MODEL_TIERS=value)
+
+def test_startup_fails_on_a_bad_agent_model_tier():
+    # The app module can't even be imported, so the server never starts (no warm-up retry loop)
+    env = dict(os.environ, AGENT_MODEL_TIERS="GeneralAgent=tiny")
+    result = subprocess.run([sys.executable, "-c", "import app.main"], cwd=backend_dir, env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "AGENT_MODEL_TIERS" in result.stderr
+    assert "unknown model tier 'tiny'" in result.stderr
@@ -0,0 +1,243 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.agents.base import BaseAgent, PreparedPrompt
+from app.agents.registry import AgentRegistry
+from app.core.config import settings
+from app.core.database import Base
+from app.models.chat_history import Conversation
+from app.services.agent_router import EmbeddingRouter, FollowUpDetector
+from app.services.agent_service import AgentService
+from app.services.chat_service import ChatService
+
+# Three topics, one per axis: admissions, AI, general knowledge
+VECTORS: Dict[str, List[float]] = {
+    "when is the application deadline?": [1.0, 0.0, 0.0],
+    "how much is tuition?": [0.9, 0.1, 0.0],
+    "what is a neural network?": [0.0, 1.0, 0.0],
+    "find papers on transformers": [0.1, 0.9, 0.0],
+    "what is the capital of france?": [0.0, 0.0, 1.0],
+    # Queries
+    "how do i apply?": [0.95, 0.05, 0.0],
+    "explain backpropagation": [0.05, 1.0, 0.1],
+    "ai admissions": [0.7, 0.7, 0.0],
+    "gibberish": [-1.0, -1.0, -1.0],
+}
+
+class TableEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents_embedded = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        return VECTORS[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents_embedded += len(texts)
+        return [VECTORS[text] for text in texts]
+
+class StubAgent(BaseAgent):
+    name = "StubAgent"
+    keyword_score = 0.1
+
+    def get_name(self) -> str:
+        return self.name
+
+    async def should_handle(self, query: str, history: List[Dict[str, str]]) -> float:
+        return self.keyword_score
+
+    async def prepare(self, query, history, context_docs=None) -> PreparedPrompt:
+        return PreparedPrompt(direct_response=f"{self.name} answer")
+
+class Admissions(StubAgent):
+    name = "AdmissionsAgent"
+    routing_exemplars = ["when is the application deadline?", "how much is tuition?"]
+
+class AIExpert(StubAgent):
+    name = "AIExpertAgent"
+    routing_exemplars = ["what is a neural network?", "find papers on transformers"]
+    routing_keywords = {"neural network": 0.8, "model": 0.3}
+
+class KeywordAdmissions(Admissions):
+    """Scores high only on an explicit admissions keyword."""
+
+    async def should_handle(self, query: str, history: List[Dict[str, str]]) -> float:
+        return 0.9 if "apply" in query else 0.1
+
+class General(StubAgent):
+    name = "GeneralAgent"
+    routing_exemplars = ["what is the capital of france?"]
+    keyword_score = 0.5
+
+AGENT_CLASSES = [General, Admissions, AIExpert]
+
+def _agents():
+    return [agent_class(ollama_service=None) for agent_class in AGENT_CLASSES]
+
+def _router(**kwargs) -> EmbeddingRouter:
+    return EmbeddingRouter(TableEmbeddings(), _agents(), **kwargs)
+
+def _agent_service() -> AgentService:
+    registry = AgentRegistry({agent_class.name: agent_class for agent_class in AGENT_CLASSES})
+    return AgentService(
+        ollama_service=object(), knowledge_service=object(), registry=registry,
+        agent_names=[agent_class.name for agent_class in AGENT_CLASSES],
+    )
+
+def test_exemplars_are_embedded_once_into_one_unit_centroid_per_agent():
+    embeddings = TableEmbeddings()
+    router = EmbeddingRouter(embeddings, _agents())
+    assert router.agent_names == ["GeneralAgent", "AdmissionsAgent", "AIExpertAgent"]
+    assert router.centroids.shape == (3, 3)
+    assert router.centroids[0] @ router.centroids[0] == pytest.approx(1.0)
+    assert embeddings.documents_embedded == 5
+    router.route(VECTORS["how do i apply?"])
+    assert embeddings.documents_embedded == 5
+
+def test_queries_go_to_the_nearest_centroid():
+    router = _router()
+    decision = router.route(VECTORS["how do i apply?"])
+    assert decision.agent_name == "AdmissionsAgent"
+    assert not decision.fallback
+    assert decision.scores["AdmissionsAgent"] > 0.9
+    assert decision.margin > 0.5
+    assert router.route(VECTORS["explain backpropagation"]).agent_name == "AIExpertAgent"
+
+def test_ambiguous_or_weak_matches_go_to_the_fallback_agent():
+    router = _router(min_similarity=0.25, min_margin=0.03)
+    ambiguous = router.route(VECTORS["ai admissions"])
+    assert ambiguous.fallback and ambiguous.agent_name == "GeneralAgent"
+    assert ambiguous.margin < 0.03
+    weak = router.route(VECTORS["gibberish"])
+    assert weak.fallback and weak.agent_name == "GeneralAgent"
+
+def test_an_exemplars_file_overrides_the_agents_own(tmp_path):
+    path = tmp_path / "exemplars.json"
+    # AI questions now count as general knowledge
+    path.write_text(json.dumps({"GeneralAgent": ["what is a neural network?"]}))
+    router = _router(exemplars_file=str(path))
+    assert router.route(VECTORS["explain backpropagation"]).margin < 0.1
+
+def test_agents_without_exemplars_are_left_out_and_none_at_all_is_an_error():
+    class NoExemplars(StubAgent):
+        name = "NoExemplars"
+
+    router = EmbeddingRouter(TableEmbeddings(), _agents() + [NoExemplars(ollama_service=None)])
+    assert "NoExemplars" not in router.agent_names
+    with pytest.raises(ValueError):
+        EmbeddingRouter(TableEmbeddings(), [NoExemplars(ollama_service=None)])
+
+def test_agent_selection_uses_the_router_when_the_query_is_embedded():
+    service = _agent_service()
+    service.router = EmbeddingRouter(TableEmbeddings(), service.agents)
+
+    async def run():
+        routed = await service.select("how do i apply?", [], query_embedding=VECTORS["how do i apply?"])
+        assert (routed.agent.get_name(), routed.reason) == ("AdmissionsAgent", "router")
+        assert routed.confidence > 0.9
+        fallback = await service.select("ai admissions", [], query_embedding=VECTORS["ai admissions"])
+        assert (fallback.agent.get_name(), fallback.reason) == ("GeneralAgent", "router_fallback")
+        # Without an embedding, the agents' keyword scores decide
+        scored = await service.select("how do i apply?", [])
+        assert (scored.agent.get_name(), scored.reason) == ("GeneralAgent", "keywords")
+
+    asyncio.run(run())
+
+# --- Sticky follow-ups ---
+
+@pytest.mark.parametrize("query", [
+    "and the deadline?", "What about international students?", "more details", "can you explain that?", "Why is it so high?",
+])
+def test_follow_ups_are_detected(query):
+    assert FollowUpDetector(max_words=8).is_follow_up(query)
+
+@pytest.mark.parametrize("query", [
+    "", "What are the admission requirements for computer science?",
+    "Can you recommend three recent papers about diffusion models for images?",
+    # A back-reference alone counts only in short queries
+    "Can you explain how that compares with the requirements of other Canadian universities?",
+])
+def test_standalone_queries_are_not_follow_ups(query):
+    assert not FollowUpDetector(max_words=8).is_follow_up(query)
+
+def test_a_follow_up_stays_with_the_previous_agent_with_decayed_confidence():
+    selection = _agent_service().follow_up_selection("and the deadline?", "AdmissionsAgent", 0.8)
+    assert (selection.agent.get_name(), selection.reason) == ("AdmissionsAgent", "follow_up")
+    assert selection.confidence == pytest.approx(0.8 * settings.AGENT_STICKY_DECAY)
+
+@pytest.mark.parametrize("query, previous_agent, confidence", [
+    # Not a follow-up
+    ("What are the admission requirements for computer science?", "AdmissionsAgent", 0.8),
+    # Another agent's strong keyword
+    ("and a neural network?", "AdmissionsAgent", 0.8),
+    # Stickiness worn off
+    ("and the deadline?", "AdmissionsAgent", 0.1),
+    # No (known) previous agent
+    ("and the deadline?", None, None),
+    ("and the deadline?", "RetiredAgent", 0.8),
+])
+def test_other_queries_are_rescored(query, previous_agent, confidence):
+    assert _agent_service().follow_up_selection(query, previous_agent, confidence) is None
+
+def test_sticky_routing_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_STICKY_ROUTING", False)
+    assert _agent_service().follow_up_selection("and the deadline?", "AdmissionsAgent", 0.8) is None
+
+def test_an_unclear_routing_match_keeps_the_previous_agent_instead_of_the_fallback():
+    service = _agent_service()
+    service.router = EmbeddingRouter(TableEmbeddings(), service.agents)
+
+    async def run():
+        kept = await service.select("ai admissions", [], query_embedding=VECTORS["ai admissions"], previous_agent="AIExpertAgent", previous_confidence=0.6)
+        assert (kept.agent.get_name(), kept.reason) == ("AIExpertAgent", "sticky")
+        # A clear match still switches agents
+        switched = await service.select("how do i apply?", [], query_embedding=VECTORS["how do i apply?"], previous_agent="AIExpertAgent", previous_confidence=0.6)
+        assert switched.agent.get_name() == "AdmissionsAgent"
+
+    asyncio.run(run())
+
+def test_a_conversations_follow_up_turn_is_answered_by_its_previous_agent(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    classes = [General, KeywordAdmissions]
+    agent_service = AgentService(
+        ollama_service=object(), knowledge_service=object(),
+        registry=AgentRegistry({agent_class.name: agent_class for agent_class in classes}),
+        agent_names=[agent_class.name for agent_class in classes],
+    )
+
+    async def turn(query, conversation_id=None):
+        async with Session() as session:
+            service = ChatService(session, ollama_service=object(), vector_store_service=object(), agent_service=agent_service)
+            result = await service.process_user_message(query, conversation_id)
+            await session.commit()
+            return result
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        first = await turn("how do i apply?")
+        assert first["agent_name"] == "AdmissionsAgent"
+        # Scored on its own, GeneralAgent would win this one
+        follow_up = await turn("and the deadline?", first["conversation_id"])
+        assert follow_up["agent_name"] == "AdmissionsAgent"
+        async with Session() as session:
+            conversation = await session.get(Conversation, int(first["conversation_id"]))
+        assert conversation.last_agent == "AdmissionsAgent"
+        assert conversation.last_agent_confidence == pytest.approx(0.9 * settings.AGENT_STICKY_DECAY)
+        # A new conversation is scored afresh
+        assert (await turn("and the deadline?"))["agent_name"] == "GeneralAgent"
+        await engine.dispose()
+
+    asyncio.run(run())
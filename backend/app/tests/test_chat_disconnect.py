@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+from typing import Dict, List
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.agents.base import BaseAgent, PreparedPrompt
+from app.agents.registry import AgentRegistry
+from app.api.v1.endpoints import chat
+from app.core.config import settings
+from app.core.database import Base
+from app.models.chat_history import Conversation, Message
+from app.services.agent_service import AgentService
+from app.services.chat_service import ChatService
+
+class FakeRequest:
+    """Starlette Request stand-in: reports a disconnect once `gone` is set."""
+
+    def __init__(self):
+        self.gone = False
+
+    async def is_disconnected(self) -> bool:
+        return self.gone
+
+class StuckAgent(BaseAgent):
+    """Never finishes answering (an LLM call in progress); records being cancelled."""
+
+    cancelled = 0
+
+    def get_name(self) -> str:
+        return "StuckAgent"
+
+    async def should_handle(self, query: str, history: List[Dict[str, str]]) -> float:
+        return 1.0
+
+    async def prepare(self, query, history, context_docs=None) -> PreparedPrompt:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            StuckAgent.cancelled += 1
+            raise
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_DISCONNECT_POLL_SECONDS", 0.01)
+
+def test_work_finishing_first_is_returned():
+    async def run():
+        async def answer():
+            await asyncio.sleep(0.03)
+            return "answer"
+
+        assert await chat._cancel_on_disconnect(FakeRequest(), answer()) == "answer"
+
+    asyncio.run(run())
+
+def test_a_disconnect_cancels_the_work_and_waits_for_it_to_unwind():
+    async def run():
+        request = FakeRequest()
+        unwound = []
+
+        async def generate():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                # Cleanup (e.g. recording the user message) still gets to await
+                await asyncio.sleep(0.02)
+                unwound.append(True)
+                raise
+
+        async def disconnect():
+            await asyncio.sleep(0.05)
+            request.gone = True
+
+        asyncio.create_task(disconnect())
+        with pytest.raises(chat.ClientDisconnected):
+            await chat._cancel_on_disconnect(request, generate())
+        assert unwound == [True]
+
+    asyncio.run(run())
+
+def test_an_abandoned_turn_keeps_the_user_message_and_stores_no_reply(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    agent_service = AgentService(
+        ollama_service=object(), knowledge_service=object(),
+        registry=AgentRegistry({"StuckAgent": StuckAgent}), agent_names=["StuckAgent"],
+    )
+    StuckAgent.cancelled = 0
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        request = FakeRequest()
+        async with Session() as session:
+            service = ChatService(session, ollama_service=object(), vector_store_service=object(), agent_service=agent_service)
+
+            async def disconnect():
+                await asyncio.sleep(0.1)
+                request.gone = True
+
+            asyncio.create_task(disconnect())
+            with pytest.raises(chat.ClientDisconnected):
+                await chat._cancel_on_disconnect(request, service.process_user_message("hello?", None))
+
+        async with Session() as session:
+            conversations = (await session.execute(select(Conversation))).scalars().all()
+            messages = (await session.execute(select(Message))).scalars().all()
+        assert len(conversations) == 1
+        assert [(m.sender_type, m.content) for m in messages] == [("user", "hello?")]
+        assert StuckAgent.cancelled == 1
+        await engine.dispose()
+
+    asyncio.run(run())
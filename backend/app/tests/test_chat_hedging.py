@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sys
+from typing import Dict, List
+
+import pytest
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.agents.base import BaseAgent, PreparedPrompt
+from app.agents.registry import AgentRegistry
+from app.core.config import settings
+from app.models.chat_history import Conversation
+from app.services.agent_service import AgentSelection, AgentService
+from app.services.chat_service import ChatService
+
+VECTORS: Dict[str, List[float]] = {
+    "how do transformers work?": [0.0, 1.0],
+    "Transformers are attention-based neural networks.": [0.1, 0.9],
+    "Admissions require a CEGEP diploma.": [1.0, 0.0],
+}
+
+class TableVectorStore:
+    """The embedding calls ChatService makes on VectorStoreService."""
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return VECTORS[text]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [VECTORS[text] for text in texts]
+
+class Candidate(BaseAgent):
+    """Gathers `material` after `delay` seconds (or fails); records being cancelled."""
+
+    def __init__(self, name: str, material: str = "", delay: float = 0.0, fails: bool = False):
+        super().__init__(ollama_service=None)
+        self.name, self.material, self.delay, self.fails = name, material, delay, fails
+        self.cancelled = False
+
+    def get_name(self) -> str:
+        return self.name
+
+    async def should_handle(self, query, history) -> float:
+        return 0.5
+
+    async def prepare(self, query, history, context_docs=None) -> PreparedPrompt:
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fails:
+            raise ConnectionError(f"{self.name} tool unavailable")
+        return PreparedPrompt(direct_response=self.material)
+
+def _service(query: str = "how do transformers work?") -> ChatService:
+    service = ChatService(db_session=None, ollama_service=object(), vector_store_service=TableVectorStore(), agent_service=object())
+    service._query_embedding = asyncio.ensure_future(service.vector_store_service.aembed_query(query))
+    return service
+
+def _hedge(service: ChatService, primary: BaseAgent, runner_up: BaseAgent):
+    return service._hedged_prepare(primary, runner_up, "how do transformers work?", [], None)
+
+def test_the_candidate_with_the_more_relevant_material_answers():
+    async def run():
+        primary = Candidate("AdmissionsAgent", "Admissions require a CEGEP diploma.")
+        runner_up = Candidate("AIExpertAgent", "Transformers are attention-based neural networks.")
+        winner, prepared, _ = await _hedge(_service(), primary, runner_up)
+        assert winner is runner_up
+        assert prepared.direct_response == "Transformers are attention-based neural networks."
+
+    asyncio.run(run())
+
+def test_the_primary_answers_when_its_material_is_as_relevant_or_there_is_none():
+    async def run():
+        primary = Candidate("AIExpertAgent", "Transformers are attention-based neural networks.")
+        runner_up = Candidate("GeneralAgent", "Transformers are attention-based neural networks.")
+        assert (await _hedge(_service(), primary, runner_up))[0] is primary
+        # Nothing gathered by either: no signal, the router's choice stands
+        assert (await _hedge(_service(), Candidate("AdmissionsAgent"), Candidate("AIExpertAgent")))[0].get_name() == "AdmissionsAgent"
+
+    asyncio.run(run())
+
+def test_a_failed_candidate_leaves_the_other():
+    async def run():
+        primary = Candidate("AIExpertAgent", fails=True)
+        runner_up = Candidate("AdmissionsAgent", "Admissions require a CEGEP diploma.")
+        assert (await _hedge(_service(), primary, runner_up))[0] is runner_up
+
+    asyncio.run(run())
+
+def test_a_candidate_missing_the_deadline_is_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_HEDGE_TIMEOUT_SECONDS", 0.05)
+
+    async def run():
+        primary = Candidate("AdmissionsAgent", "Admissions require a CEGEP diploma.")
+        slow = Candidate("AIExpertAgent", "Transformers are attention-based neural networks.", delay=10)
+        winner, _, _ = await _hedge(_service(), primary, slow)
+        assert winner is primary
+        await asyncio.sleep(0)
+        assert slow.cancelled
+
+        # Neither ready by the deadline: the primary alone is awaited, the runner-up cancelled
+        late_primary = Candidate("AdmissionsAgent", "Admissions require a CEGEP diploma.", delay=0.1)
+        slow = Candidate("AIExpertAgent", delay=10)
+        winner, prepared, _ = await _hedge(_service(), late_primary, slow)
+        assert winner is late_primary and prepared.direct_response == "Admissions require a CEGEP diploma."
+        await asyncio.sleep(0)
+        assert slow.cancelled
+
+    asyncio.run(run())
+
+def test_the_routing_record_names_the_agent_that_answered():
+    primary = Candidate("AdmissionsAgent")
+    runner_up = Candidate("AIExpertAgent")
+    service = ChatService(db_session=None, ollama_service=object(), vector_store_service=TableVectorStore(), agent_service=object())
+    selection = AgentSelection(primary, 0.5, "router")
+    selection.runner_up, selection.runner_up_confidence = runner_up, 0.48
+    service._conversation, service._selection = Conversation(last_agent="AdmissionsAgent", last_agent_confidence=0.5), selection
+    assert service._record_answering_agent(runner_up) == "AIExpertAgent"
+    assert (service._conversation.last_agent, service._conversation.last_agent_confidence) == ("AIExpertAgent", 0.48)
+
+class Scored(Candidate):
+    scores = {"AdmissionsAgent": 0.6, "AIExpertAgent": 0.5, "GeneralAgent": 0.1}
+
+    def __init__(self, ollama_service=None, knowledge_service=None):
+        super().__init__(type(self).__name__)
+
+    async def should_handle(self, query, history) -> float:
+        return self.scores[self.name]
+
+class AdmissionsAgent(Scored):
+    pass
+
+class AIExpertAgent(Scored):
+    pass
+
+class GeneralAgent(Scored):
+    pass
+
+@pytest.mark.parametrize("enabled, margin, expected", [(True, 0.25, "AIExpertAgent"), (True, 0.05, None), (False, 0.25, None)])
+def test_close_scores_mark_a_runner_up_when_hedging_is_on(monkeypatch, enabled, margin, expected):
+    monkeypatch.setattr(settings, "AGENT_HEDGING_ENABLED", enabled)
+    monkeypatch.setattr(settings, "AGENT_HEDGE_KEYWORD_MARGIN", margin)
+    classes = [AdmissionsAgent, AIExpertAgent, GeneralAgent]
+    service = AgentService(
+        ollama_service=object(), knowledge_service=object(),
+        registry=AgentRegistry({agent_class.__name__: agent_class for agent_class in classes}),
+        agent_names=[agent_class.__name__ for agent_class in classes],
+    )
+    selection = asyncio.run(service.select("query", []))
+    assert selection.agent.get_name() == "AdmissionsAgent"
+    assert (selection.runner_up.get_name() if selection.runner_up else None) == expected
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+import sys
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.api.v1.endpoints.chat import ClientConnection
+
+class SlowWebSocket:
+    """Records sent frames; sending waits until the test releases the reader."""
+
+    def __init__(self):
+        self.sent = []
+        self.reading = asyncio.Event()
+
+    async def send_text(self, text: str):
+        await self.reading.wait()
+        self.sent.append(json.loads(text))
+
+def test_control_frames_neither_block_nor_drop_when_the_stream_queue_is_full():
+    async def run():
+        websocket = SlowWebSocket()
+        connection = ClientConnection(websocket, "client", max_queue_size=2)
+        connection.sender_task = asyncio.create_task(connection.sender_loop())
+
+        async def generate():
+            for i in range(5):
+                await connection.send({"type": "token", "content": str(i)})
+
+        generation = asyncio.create_task(generate())
+        await asyncio.sleep(0.05)
+        # The reader is stuck and the stream queue full: the generation waits...
+        assert not generation.done()
+        assert connection.send_queue.full()
+        # ...but control frames still queue immediately, however many
+        for i in range(10):
+            connection.send_control({"type": "error", "detail": str(i)})
+        connection.send_control({"type": "accepted", "request_id": "r2"})
+
+        websocket.reading.set()
+        await generation
+        while not (connection.send_queue.empty() and connection.control_queue.empty()):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        connection.sender_task.cancel()
+
+        types = [frame["type"] for frame in websocket.sent]
+        # One token was already being sent; every control frame follows it, ahead of the queued tokens
+        assert types[0] == "token"
+        assert types[1:12] == ["error"] * 10 + ["accepted"]
+        assert [frame["content"] for frame in websocket.sent if frame["type"] == "token"] == ["0", "1", "2", "3", "4"]
+
+    asyncio.run(run())
+
+def test_a_terminal_frame_drops_the_ended_generations_queued_frames():
+    async def run():
+        websocket = SlowWebSocket()
+        connection = ClientConnection(websocket, "client", max_queue_size=10)
+        connection.sender_task = asyncio.create_task(connection.sender_loop())
+
+        async def generate(name: str, count: int):
+            for i in range(count):
+                await connection.send({"type": "token", "request_id": name, "content": str(i)})
+            await asyncio.Event().wait()
+
+        cancelled = asyncio.create_task(generate("r1", 3))
+        kept = asyncio.create_task(generate("r2", 2))
+        await asyncio.sleep(0.05)
+        connection.send_control({"type": "cancelled", "request_id": "r1"}, ends=cancelled)
+
+        websocket.reading.set()
+        await asyncio.sleep(0.05)
+        for task in (cancelled, kept, connection.sender_task):
+            task.cancel()
+
+        r1 = [frame["type"] for frame in websocket.sent if frame["request_id"] == "r1"]
+        # At most the token already in flight precedes the terminal frame; nothing follows it
+        assert r1[-1] == "cancelled"
+        assert r1.count("token") <= 1
+        assert [frame["content"] for frame in websocket.sent if frame["request_id"] == "r2"] == ["0", "1"]
+        assert connection._ended == set()
+
+    asyncio.run(run())
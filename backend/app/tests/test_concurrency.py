@@ -0,0 +1,196 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.concurrency import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    LLMAdmissionController,
+    LLMQueueFullError,
+    SingleFlight,
+)
+
+async def _settle():
+    """Lets every runnable task reach its next await."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+# --- LLMAdmissionController ---
+
+async def _queue(controller, order, key, priority, name):
+    await controller.acquire(key, priority)
+    order.append(name)
+
+def test_admission_serves_higher_priority_first():
+    async def run():
+        controller = LLMAdmissionController(max_concurrency=1, max_queue_size=10)
+        order = []
+        await controller.acquire("holder")
+        tasks = [
+            asyncio.create_task(_queue(controller, order, "a", PRIORITY_BACKGROUND, "background")),
+            asyncio.create_task(_queue(controller, order, "b", PRIORITY_INTERACTIVE, "interactive")),
+        ]
+        await _settle()
+        assert controller.queue_depth == 2
+        controller.release()
+        await _settle()
+        controller.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "background"]
+
+    asyncio.run(run())
+
+def test_admission_round_robins_conversations_within_a_priority():
+    async def run():
+        controller = LLMAdmissionController(max_concurrency=1, max_queue_size=10)
+        order = []
+        await controller.acquire("holder")
+        tasks = []
+        # Conversation "a" queues three calls before "b" queues one
+        for name in ("a1", "a2", "a3", "b1"):
+            tasks.append(asyncio.create_task(_queue(controller, order, name[0], PRIORITY_INTERACTIVE, name)))
+            await _settle()
+        for _ in tasks:
+            controller.release()
+            await _settle()
+        await asyncio.gather(*tasks)
+        assert order == ["a1", "b1", "a2", "a3"]
+
+    asyncio.run(run())
+
+def test_admission_cancelled_waiter_leaves_the_queue():
+    async def run():
+        controller = LLMAdmissionController(max_concurrency=1, max_queue_size=10)
+        order = []
+        await controller.acquire("holder")
+        cancelled = asyncio.create_task(_queue(controller, order, "a", PRIORITY_INTERACTIVE, "cancelled"))
+        waiting = asyncio.create_task(_queue(controller, order, "b", PRIORITY_INTERACTIVE, "waiting"))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        assert controller.queue_depth == 1
+        controller.release()
+        await waiting
+        assert order == ["waiting"]
+        assert controller.in_flight == 1
+
+    asyncio.run(run())
+
+def test_admission_slot_is_released_when_the_holder_is_cancelled():
+    async def run():
+        controller = LLMAdmissionController(max_concurrency=1, max_queue_size=10)
+        entered = asyncio.Event()
+
+        async def hold():
+            async with controller.slot("a"):
+                entered.set()
+                await asyncio.sleep(3600)
+
+        holder = asyncio.create_task(hold())
+        await entered.wait()
+        assert controller.in_flight == 1
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+        assert controller.in_flight == 0
+        # The freed slot is usable without queueing
+        assert await controller.acquire("b") == 0.0
+
+    asyncio.run(run())
+
+def test_admission_fails_fast_when_saturated():
+    async def run():
+        controller = LLMAdmissionController(max_concurrency=1, max_queue_size=1)
+        await controller.acquire("holder")
+        queued = asyncio.create_task(controller.acquire("a"))
+        await _settle()
+        assert controller.is_saturated()
+        with pytest.raises(LLMQueueFullError) as error:
+            await controller.acquire("b")
+        assert error.value.retry_after >= 1
+        assert controller.total_rejected == 1
+        controller.release()
+        await queued
+
+    asyncio.run(run())
+
+# --- SingleFlight ---
+
+def test_single_flight_shares_the_leader_execution():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+        joined = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await _settle()
+        follower = asyncio.create_task(flight.do("key", work, on_join=lambda: joined.append(1)))
+        await _settle()
+        release.set()
+        assert await asyncio.gather(leader, follower) == ["answer", "answer"]
+        assert calls == [1]
+        assert joined == [1]
+        assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 1}
+
+    asyncio.run(run())
+
+def test_single_flight_cancels_work_only_when_the_last_waiter_leaves():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(flight.do("key", work))
+        await started.wait()
+        second = asyncio.create_task(flight.do("key", work))
+        await _settle()
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await _settle()
+        assert not cancelled.is_set()
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await _settle()
+        assert cancelled.is_set()
+        assert flight.in_flight() == 0
+
+    asyncio.run(run())
+
+def test_single_flight_raises_the_error_to_every_waiter():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            raise ValueError("boom")
+
+        waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(3)]
+        await _settle()
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.database import Base
+from app.models.chat_history import Conversation, Message
+from app.repositories.chat_history_repository import ChatHistoryRepository
+from app.services import conversation_memory
+from app.services.conversation_memory import ConversationMemory
+
+T0 = datetime.datetime(2024, 1, 1, 12, 0)
+
+class FakeOllamaService:
+    """Answers summary prompts with a fixed text; `before_answer` runs first (to simulate races)."""
+
+    def __init__(self, summary: str = "new summary"):
+        self.summary = summary
+        self.calls = 0
+        self.before_answer = None
+
+    async def generate_response(self, prompt, inputs, options=None, tier=None):
+        self.calls += 1
+        if self.before_answer is not None:
+            await self.before_answer()
+        return self.summary
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Points ConversationMemory at a fresh SQLite file holding one conversation with six
+    messages a minute apart. Yields an async factory (run inside the test's event loop)
+    that returns the session maker.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'memory.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session_scope():
+        async with Session() as session:
+            yield session
+            await session.commit()
+
+    monkeypatch.setattr(conversation_memory, "session_scope", session_scope)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with Session() as session:
+            session.add(Conversation(id=1))
+            session.add_all(
+                Message(conversation_id=1, sender_type="user" if i % 2 == 0 else "ai", content=f"message {i}", timestamp=T0 + datetime.timedelta(minutes=i))
+                for i in range(6)
+            )
+            await session.commit()
+        return Session
+
+    yield setup
+    asyncio.run(engine.dispose())
+
+async def _conversation(Session) -> Conversation:
+    async with Session() as session:
+        return await session.get(Conversation, 1)
+
+def test_fold_stores_the_summary_and_advances_the_watermark(database):
+    async def run():
+        Session = await database()
+        memory = ConversationMemory(FakeOllamaService())
+        await memory._fold(1, None, None, T0 + datetime.timedelta(minutes=3))
+        conversation = await _conversation(Session)
+        assert conversation.summary == "new summary"
+        assert conversation.summary_until.replace(tzinfo=None) == T0 + datetime.timedelta(minutes=3)
+        assert memory.summaries_written == 1
+
+    asyncio.run(run())
+
+def test_fold_is_discarded_when_the_summary_changed_concurrently(database):
+    async def run():
+        Session = await database()
+        ollama = FakeOllamaService("stale summary")
+
+        async def concurrent_update():
+            # Another worker folds the same conversation while this fold waits on the LLM
+            async with Session() as session:
+                assert await ChatHistoryRepository(session).update_summary(1, "winner", T0 + datetime.timedelta(minutes=1), None)
+                await session.commit()
+
+        ollama.before_answer = concurrent_update
+        memory = ConversationMemory(ollama)
+        await memory._fold(1, None, None, T0 + datetime.timedelta(minutes=3))
+        conversation = await _conversation(Session)
+        assert conversation.summary == "winner"
+        assert conversation.summary_until.replace(tzinfo=None) == T0 + datetime.timedelta(minutes=1)
+        assert memory.summaries_written == 0
+
+    asyncio.run(run())
+
+def test_fold_builds_on_the_previous_watermark(database):
+    async def run():
+        Session = await database()
+        memory = ConversationMemory(FakeOllamaService("first"))
+        await memory._fold(1, None, None, T0 + datetime.timedelta(minutes=1))
+        conversation = await _conversation(Session)
+
+        memory.ollama_service = FakeOllamaService("second")
+        previous_until = conversation.summary_until.replace(tzinfo=None)
+        await memory._fold(1, conversation.summary, previous_until, T0 + datetime.timedelta(minutes=4))
+        conversation = await _conversation(Session)
+        assert conversation.summary == "second"
+        assert conversation.summary_until.replace(tzinfo=None) == T0 + datetime.timedelta(minutes=4)
+
+        # A fold scheduled from the old watermark no longer matches and changes nothing
+        await memory._fold(1, None, None, T0 + datetime.timedelta(minutes=2))
+        conversation = await _conversation(Session)
+        assert conversation.summary == "second"
+        assert memory.summaries_written == 2
+
+    asyncio.run(run())
+
+def test_only_one_fold_runs_per_conversation(database):
+    async def run():
+        Session = await database()
+        ollama = FakeOllamaService()
+        release = asyncio.Event()
+
+        async def wait_for_release():
+            await release.wait()
+
+        ollama.before_answer = wait_for_release
+        # Tiny budget: every turn overflows and wants a fold
+        memory = ConversationMemory(ollama, token_budget=30)
+        conversation = await _conversation(Session)
+        async with Session() as session:
+            repository = ChatHistoryRepository(session)
+            await memory.load(repository, conversation, "query")
+            await memory.load(repository, conversation, "query")
+        await asyncio.sleep(0.1)
+        assert len(memory._tasks) == 1
+        assert ollama.calls == 1
+        release.set()
+        await asyncio.gather(*memory._tasks)
+        assert memory._folding == set()
+        assert memory.summaries_written == 1
+
+    asyncio.run(run())
+
+def test_an_oversized_latest_exchange_is_kept_truncated(database):
+    async def run():
+        Session = await database()
+        async with Session() as session:
+            session.add_all([
+                Message(conversation_id=1, sender_type="user", content="tell me everything " * 200, timestamp=T0 + datetime.timedelta(minutes=10)),
+                Message(conversation_id=1, sender_type="ai", content="here is everything " * 400, timestamp=T0 + datetime.timedelta(minutes=11)),
+            ])
+            await session.commit()
+        memory = ConversationMemory(FakeOllamaService(), token_budget=100)
+        conversation = await _conversation(Session)
+        async with Session() as session:
+            history = await memory.load(ChatHistoryRepository(session), conversation, "and then?")
+        assert [m["role"] for m in history] == ["user", "assistant", "user"]
+        assert history[0]["content"].startswith("tell me everything")
+        assert history[1]["content"].startswith("here is everything")
+        assert len(history[1]["content"]) < len("here is everything " * 400)
+        assert history[-1]["content"] == "and then?"
+        # Everything older is still folded into the summary
+        assert len(memory._tasks) == 1
+        await asyncio.gather(*memory._tasks)
+
+    asyncio.run(run())
+
+def test_has_messages_sees_stored_messages_only_for_their_conversation(database):
+    async def run():
+        Session = await database()
+        async with Session() as session:
+            session.add(Conversation(id=2))
+            await session.commit()
+            repository = ChatHistoryRepository(session)
+            assert await repository.has_messages(1)
+            assert not await repository.has_messages(2)
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sys
+import threading
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.config import settings
+from app.vectorstores.faiss_store import FAISSVectorStore
+
+class HashEmbeddings(Embeddings):
+    """Deterministic 16-dimensional embeddings, so no model has to be loaded."""
+
+    def embed_query(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255.0 for byte in digest[:16]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+def _documents(prefix: str, count: int):
+    return [(f"{prefix} document {i}", {"source": f"{prefix}-{i}"}) for i in range(count)]
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path))
+    return tmp_path
+
+def test_adding_documents_leaves_the_index_searches_hold_untouched(store_path):
+    store = FAISSVectorStore(embedding_function=HashEmbeddings(), mmap_mode=False)
+    store.add_documents(_documents("first", 5))
+    held = store.index
+    store.add_documents(_documents("second", 5))
+    assert held.index.ntotal == 5
+    assert len(held.docstore._dict) == 5
+    assert store.index is not held
+    assert store.index.index.ntotal == 10
+    # The saved copy has everything
+    reloaded = FAISSVectorStore(embedding_function=HashEmbeddings(), mmap_mode=False)
+    assert reloaded.index.index.ntotal == 10
+
+def test_searches_run_safely_while_documents_are_added(store_path):
+    store = FAISSVectorStore(embedding_function=HashEmbeddings(), mmap_mode=False)
+    store.add_documents(_documents("seed", 20))
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        embedding = HashEmbeddings().embed_query("seed document 3")
+        while not stop.is_set():
+            try:
+                results = store.similarity_search_by_vector(embedding, k=4)
+                # Every hit resolves to a real document
+                assert len(results) == 4
+                assert all(doc.page_content for doc, _ in results)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for batch in range(5):
+        store.add_documents(_documents(f"batch{batch}", 20))
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert store.index.index.ntotal == 120
+
+def test_mmap_store_replaced_by_an_add_stays_open_for_running_searches(store_path):
+    store = FAISSVectorStore(embedding_function=HashEmbeddings(), mmap_mode=True)
+    store.add_documents(_documents("first", 5))
+    assert store.read_only
+    embedding = HashEmbeddings().embed_query("first document 1")
+    with store._reading() as held:
+        store.add_documents(_documents("second", 5))
+        assert store.index is not held
+        # The replaced mapping is still readable by the search that holds it
+        results = held.similarity_search_with_score_by_vector(embedding, k=2)
+        assert results[0][0].page_content == "first document 1"
+        assert held.docstore._data is not None and not held.docstore._data.closed
+    # Closed once that search finished
+    assert held.docstore._data.closed
+    assert store.read_only
+    assert store.index.index.ntotal == 10
+
+def test_mmap_searches_run_safely_while_documents_are_added(store_path):
+    store = FAISSVectorStore(embedding_function=HashEmbeddings(), mmap_mode=True)
+    store.add_documents(_documents("seed", 20))
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        embedding = HashEmbeddings().embed_query("seed document 3")
+        while not stop.is_set():
+            results = store.similarity_search_by_vector(embedding, k=4)
+            if len(results) != 4 or not all(doc.page_content for doc, _ in results):
+                errors.append(results)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for batch in range(5):
+        store.add_documents(_documents(f"batch{batch}", 20))
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert store.index.index.ntotal == 120
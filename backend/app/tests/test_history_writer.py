@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.database import Base
+from app.models.chat_history import Conversation, Message
+from app.repositories import history_writer
+from app.repositories.chat_history_repository import ChatHistoryRepository
+from app.repositories.history_writer import HistoryWriteBehind
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Points the writer at a fresh SQLite file. Yields an async factory that creates the
+    tables (inside the test's event loop) and returns the session maker.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'history.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session_scope():
+        async with Session() as session:
+            yield session
+            await session.commit()
+
+    monkeypatch.setattr(history_writer, "session_scope", session_scope)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with Session() as session:
+            session.add_all([Conversation(id=1), Conversation(id=2)])
+            await session.commit()
+        return Session
+
+    yield setup
+    asyncio.run(engine.dispose())
+
+async def _count_messages(Session) -> int:
+    async with Session() as session:
+        return (await session.execute(select(func.count(Message.id)))).scalar()
+
+def test_messages_queued_together_are_written_in_one_batch(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.05)
+        for i in range(5):
+            await writer.add(1, "user", f"message {i}")
+        assert writer.pending_count == 5
+        await asyncio.sleep(0.2)
+        assert writer.flushes == 1
+        assert writer.written == 5
+        assert writer.pending_count == 0
+        assert await _count_messages(Session) == 5
+        await writer.stop()
+
+    asyncio.run(run())
+
+def test_batches_are_capped_at_batch_size(database):
+    async def run():
+        await database()
+        writer = HistoryWriteBehind(flush_interval=0.05, batch_size=2)
+        for i in range(5):
+            await writer.add(1, "user", f"message {i}")
+        await writer.stop()
+        assert writer.written == 5
+        assert writer.flushes == 3
+
+    asyncio.run(run())
+
+def test_history_reads_merge_queued_messages(database):
+    async def run():
+        Session = await database()
+        async with Session() as session:
+            session.add_all([
+                Message(conversation_id=1, sender_type="user", content="committed question", timestamp=datetime.datetime(2024, 1, 1, 12, 0)),
+                Message(conversation_id=1, sender_type="ai", content="committed answer", timestamp=datetime.datetime(2024, 1, 1, 12, 1)),
+            ])
+            await session.commit()
+        # Long interval: these stay queued while history is read (the writer task is
+        # cancelled with the event loop)
+        writer = HistoryWriteBehind(flush_interval=60)
+        await writer.add(1, "user", "queued question")
+        await writer.add(2, "user", "other conversation")
+
+        assert [r["content"] for r in writer.pending_for(1)] == ["queued question"]
+        async with Session() as session:
+            repository = ChatHistoryRepository(session, writer=writer)
+            messages = await repository.get_recent_messages(1, limit=10)
+            assert [(m["role"], m["content"]) for m in messages] == [
+                ("user", "committed question"),
+                ("assistant", "committed answer"),
+                ("user", "queued question"),
+            ]
+            # The limit keeps the newest messages, queued ones included
+            latest = await repository.get_recent_messages(1, limit=2)
+            assert [m["content"] for m in latest] == ["committed answer", "queued question"]
+
+    asyncio.run(run())
+
+def test_history_reads_do_not_duplicate_messages_committed_after_the_snapshot(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.05)
+        await writer.add(1, "user", "question")
+        # A record still listed as pending that is already committed (the flush raced the read)
+        pending = writer.pending_for(1)
+        await asyncio.sleep(0.2)
+        writer._pending[1] = pending
+        async with Session() as session:
+            messages = await ChatHistoryRepository(session, writer=writer).get_recent_messages(1, limit=10)
+        assert [m["content"] for m in messages] == ["question"]
+        writer._pending.clear()
+        await writer.stop()
+
+    asyncio.run(run())
+
+def test_stop_flushes_everything_queued(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.05)
+        for i in range(3):
+            await writer.add(1, "user", f"message {i}")
+        assert writer.written == 0
+        await writer.stop()
+        assert writer.written == 3
+        assert writer.pending_count == 0
+        assert await _count_messages(Session) == 3
+        with pytest.raises(RuntimeError):
+            await writer.add(1, "user", "too late")
+
+    asyncio.run(run())
+
+def test_failed_batches_are_retried_then_dropped(monkeypatch):
+    attempts = []
+
+    @asynccontextmanager
+    async def failing_session_scope():
+        attempts.append(1)
+        raise ConnectionError("database unavailable")
+        yield
+
+    monkeypatch.setattr(history_writer, "session_scope", failing_session_scope)
+
+    async def run():
+        writer = HistoryWriteBehind(flush_interval=0.001, max_retries=3)
+        await writer.add(1, "user", "lost")
+        await writer.stop()
+        assert len(attempts) == 3
+        assert writer.dropped == 1
+        assert writer.written == 0
+        assert writer.pending_for(1) == []
+
+    asyncio.run(run())
+
+def test_a_batch_that_fails_once_is_written_on_retry(database, monkeypatch):
+    async def run():
+        Session = await database()
+        working_session_scope = history_writer.session_scope
+        attempts = []
+
+        @asynccontextmanager
+        async def flaky_session_scope():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("database busy")
+            async with working_session_scope() as session:
+                yield session
+
+        monkeypatch.setattr(history_writer, "session_scope", flaky_session_scope)
+        writer = HistoryWriteBehind(flush_interval=0.001)
+        await writer.add(1, "user", "kept")
+        await writer.stop()
+        assert len(attempts) == 2
+        assert writer.written == 1
+        assert writer.dropped == 0
+        assert await _count_messages(Session) == 1
+
+    asyncio.run(run())
+
+def test_messages_of_a_rolled_back_conversation_are_never_written(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.01)
+        async with Session() as session:
+            repository = ChatHistoryRepository(session, writer=writer)
+            conversation = await repository.create_conversation()
+            # Written in the request's transaction, not queued for the writer's
+            await repository.add_message(conversation.id, "user", "question")
+            assert writer.pending_count == 0
+            assert await repository.has_messages(conversation.id)
+            await session.rollback()
+        await writer.stop()
+        async with Session() as session:
+            assert await session.get(Conversation, conversation.id) is None
+        assert await _count_messages(Session) == 0
+
+    asyncio.run(run())
+
+def test_a_new_conversations_messages_are_queued_once_it_is_committed(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.01)
+        async with Session() as session:
+            repository = ChatHistoryRepository(session, writer=writer)
+            conversation = await repository.create_conversation()
+            await repository.add_message(conversation.id, "user", "question")
+            await session.commit()
+            await repository.add_message(conversation.id, "ai", "answer")
+            assert [r["content"] for r in writer.pending_for(conversation.id)] == ["answer"]
+        await writer.stop()
+        async with Session() as session:
+            repository = ChatHistoryRepository(session)
+            messages = await repository.get_recent_messages(conversation.id, limit=10)
+        assert [m["content"] for m in messages] == ["question", "answer"]
+
+    asyncio.run(run())
+
+def test_messages_queued_for_a_committed_conversation_survive_a_request_rollback(database):
+    async def run():
+        Session = await database()
+        writer = HistoryWriteBehind(flush_interval=0.01)
+        async with Session() as session:
+            repository = ChatHistoryRepository(session, writer=writer)
+            await repository.add_message(1, "user", "question")
+            conversation = await session.get(Conversation, 1)
+            repository.record_routing(conversation, "GeneralAgent", 0.9)
+            # The routing update is lost, the queued message is not
+            await session.rollback()
+        await writer.stop()
+        assert await _count_messages(Session) == 1
+        async with Session() as session:
+            assert (await session.get(Conversation, 1)).last_agent is None
+
+    asyncio.run(run())
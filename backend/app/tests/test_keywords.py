@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.keywords import KeywordMatcher
+
+def _matcher() -> KeywordMatcher:
+    return KeywordMatcher({
+        "ai": {"ai": 0.5, "machine learning": 0.4},
+        "github": {"github": 0.3, "find github": 0.5, "repository": 0.3},
+        "courses": {"course": 0.4, "class": 0.2},
+    })
+
+def test_phrases_match_whole_words_only():
+    matcher = _matcher()
+    assert not matcher.match("He said we should maintain it").matched("ai")
+    assert matcher.match("What is AI?").phrases("ai") == ["ai"]
+    assert matcher.match("ai-powered search").matched("ai")
+    assert not matcher.match("classroom booking").matched("courses")
+
+def test_multi_word_phrases_allow_any_whitespace_or_hyphens():
+    matcher = _matcher()
+    assert matcher.match("Intro to machine-learning").phrases("ai") == ["machine learning"]
+    assert matcher.match("MACHINE   LEARNING basics").phrases("ai") == ["machine learning"]
+    assert not matcher.match("machinelearning").matched("ai")
+
+def test_plural_forms_match():
+    matcher = _matcher()
+    assert matcher.match("Which courses are open?").phrases("courses") == ["course"]
+    assert matcher.match("two classes today").phrases("courses") == ["class"]
+    assert matcher.match("list the repositorys").matched("github")
+    assert not matcher.match("coursework due").matched("courses")
+
+def test_contained_phrases_are_credited_too():
+    hits = _matcher().match("please find github projects")
+    assert sorted(hits.phrases("github")) == ["find github", "github"]
+    assert hits.score("github") == pytest.approx(0.8)
+
+def test_overlapping_phrases_at_later_words_are_found():
+    hits = _matcher().match("find github repository for machine learning course")
+    assert sorted(hits.phrases("github")) == ["find github", "github", "repository"]
+    assert hits.phrases("ai") == ["machine learning"]
+    assert hits.phrases("courses") == ["course"]
+
+def test_score_is_capped_and_phrases_count_once():
+    hits = _matcher().match("github github github repository find github")
+    assert hits.score("github") == 1.0
+    assert hits.score("github", cap=2.0) == pytest.approx(1.1)
+    assert hits.score("ai") == 0.0
+
+def test_a_phrase_shared_by_groups_credits_each():
+    matcher = KeywordMatcher({"a": {"course": 0.4}, "b": {"Course": 0.1}})
+    hits = matcher.match("course")
+    assert hits.score("a") == 0.4
+    assert hits.score("b") == 0.1
+
+def test_results_are_memoized_per_query():
+    matcher = _matcher()
+    assert matcher.match("what is ai") is matcher.match("what is ai")
+
+def test_no_phrases_match_nothing():
+    assert not KeywordMatcher({}).match("anything").hits
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.services import llm_cache
+from app.services.llm_cache import PromptResponseCache
+from app.services.ollama_client import OllamaHTTPClient
+from app.services.ollama_pool import OllamaBackendPool
+from app.services.ollama_service import OllamaService
+
+MESSAGES = [SystemMessage(content="You are helpful."), HumanMessage(content="What is RAG?")]
+
+class Clock:
+    """Replaces time.time() in the cache module."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def _service(cache: PromptResponseCache, answers: list) -> OllamaService:
+    """Native-mode service whose single backend answers /api/chat from `answers`."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        answers.append(request)
+        return httpx.Response(200, json={"message": {"content": f"answer {len(answers)}"}, "done": True})
+
+    client = OllamaHTTPClient("http://ollama:11434")
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    service = OllamaService(response_cache=cache, pool=OllamaBackendPool([client], probe_interval=0))
+    service.native = True
+    return service
+
+def _rows(db_path) -> int:
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT COUNT(*) FROM prompt_cache").fetchone()[0]
+
+def test_sqlite_tier_is_capped_without_a_ttl(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = PromptResponseCache(max_entries=5, ttl_seconds=None, db_path=db_path, db_max_entries=20)
+
+    async def run():
+        for i in range(100):
+            await cache.set(f"key-{i}", f"response {i}")
+
+    asyncio.run(run())
+    # At most a tenth past the cap between prunes
+    assert _rows(db_path) <= 22
+    cache.close()
+    # The newest entries are the ones kept
+    reopened = PromptResponseCache(ttl_seconds=None, db_path=db_path, db_max_entries=20)
+    assert asyncio.run(reopened.get("key-99")) == "response 99"
+    assert asyncio.run(reopened.get("key-0")) is None
+    reopened.close()
+
+def test_reopening_with_a_smaller_cap_prunes_the_file(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = PromptResponseCache(ttl_seconds=None, db_path=db_path)
+
+    async def fill():
+        for i in range(50):
+            await cache.set(f"key-{i}", "response")
+
+    asyncio.run(fill())
+    cache.close()
+    assert _rows(db_path) == 50
+    PromptResponseCache(ttl_seconds=None, db_path=db_path, db_max_entries=10).close()
+    assert _rows(db_path) == 10
+
+def test_close_waits_for_a_running_query_and_later_calls_miss(tmp_path):
+    cache = PromptResponseCache(db_path=str(tmp_path / "cache.db"))
+    asyncio.run(cache.set("key", "response"))
+    cache._memory.clear()
+
+    async def run():
+        # Hold the lock as a worker-thread query in progress would
+        cache._db_lock.acquire()
+        closer = threading.Thread(target=cache.close)
+        closer.start()
+        await asyncio.sleep(0.05)
+        assert closer.is_alive()
+        assert cache._db is not None
+        cache._db_lock.release()
+        closer.join()
+        assert cache._db is None
+        # A call that saw the file open before close() no longer touches it
+        assert await asyncio.to_thread(cache._db_get, "key") is None
+        await asyncio.to_thread(cache._db_set, "key", "response", 0.0)
+        assert await cache.get("key") is None
+
+    asyncio.run(run())
+
+# --- Keys ---
+
+def test_the_key_depends_on_messages_model_and_options_only():
+    key = PromptResponseCache.make_key(MESSAGES, "mistral", {"temperature": 0, "seed": 1})
+    assert key == PromptResponseCache.make_key(list(MESSAGES), "mistral", {"seed": 1, "temperature": 0})
+    assert key != PromptResponseCache.make_key(MESSAGES, "llama3", {"temperature": 0, "seed": 1})
+    assert key != PromptResponseCache.make_key(MESSAGES, "mistral", {"temperature": 0, "seed": 2})
+    assert key != PromptResponseCache.make_key(MESSAGES[:1] + [HumanMessage(content="What is RAG")], "mistral", {"temperature": 0, "seed": 1})
+    # Same text, different role
+    assert key != PromptResponseCache.make_key(MESSAGES[:1] + [AIMessage(content="What is RAG?")], "mistral", {"temperature": 0, "seed": 1})
+
+# --- TTL and size ---
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    cache = PromptResponseCache(ttl_seconds=60)
+
+    async def run():
+        await cache.set("key", "response")
+        clock.now += 59
+        assert await cache.get("key") == "response"
+        clock.now += 2
+        assert await cache.get("key") is None
+        assert "key" not in cache._memory
+
+    asyncio.run(run())
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_expired_entries_are_not_served_from_disk(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    db_path = str(tmp_path / "cache.db")
+    cache = PromptResponseCache(ttl_seconds=60, db_path=db_path)
+    asyncio.run(cache.set("old", "response"))
+    cache.close()
+
+    reopened = PromptResponseCache(ttl_seconds=60, db_path=db_path)
+    assert asyncio.run(reopened.get("old")) == "response"
+    assert reopened.disk_hits == 1
+    reopened._memory.clear()
+    clock.now += 61
+    assert asyncio.run(reopened.get("old")) is None
+    # Writing prunes expired rows
+    asyncio.run(reopened.set("new", "response"))
+    reopened.close()
+    assert _rows(db_path) == 1
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = PromptResponseCache(max_entries=2)
+
+    async def run():
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1"
+
+    asyncio.run(run())
+
+# --- OllamaService ---
+
+def test_deterministic_calls_are_answered_from_the_cache():
+    prompt = ChatPromptTemplate.from_messages([("system", "You are helpful."), ("human", "{question}")])
+    requests = []
+    service = _service(PromptResponseCache(), requests)
+    service.generation_options = {"temperature": 0}
+
+    async def run():
+        first = await service.generate_response(prompt, {"question": "What is RAG?"})
+        again = await service.generate_response(prompt, {"question": "What is RAG?"})
+        # Per-call options are part of the key
+        capped = await service.generate_response(prompt, {"question": "What is RAG?"}, options={"num_predict": 10})
+        streamed = [chunk async for chunk in service.stream_response(prompt, {"question": "What is RAG?"})]
+        await service.aclose()
+        return first, again, capped, streamed
+
+    first, again, capped, streamed = asyncio.run(run())
+    assert first == again == "answer 1"
+    assert capped == "answer 2"
+    assert streamed == ["answer 1"]
+    assert len(requests) == 2
+
+def test_sampled_calls_bypass_the_cache():
+    prompt = ChatPromptTemplate.from_messages([("human", "{question}")])
+    requests = []
+    cache = PromptResponseCache()
+    service = _service(cache, requests)
+    service.generation_options = {"temperature": 0.7}
+
+    async def run():
+        answers = [await service.generate_response(prompt, {"question": "Tell me a joke"}) for _ in range(2)]
+        await service.aclose()
+        return answers
+
+    assert asyncio.run(run()) == ["answer 1", "answer 2"]
+    assert cache.stats()["entries"] == 0
+    assert cache.hits + cache.misses == 0
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, ChatMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import ValidationError
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.core.config import Settings
+from app.services.ollama_client import GenerationStats, OllamaHTTPClient, to_ollama_messages
+from app.services.ollama_pool import OllamaBackendPool
+from app.services.ollama_service import OllamaService
+
+@pytest.mark.parametrize("value, expected", [("native", "native"), ("langchain", "langchain"), (" LangChain ", "langchain")])
+def test_client_mode_accepts_known_modes(value, expected):
+    assert Settings(OLLAMA_CLIENT_MODE=value).OLLAMA_CLIENT_MODE == expected
+
+@pytest.mark.parametrize("value", ["langchian", "", "http"])
+def test_client_mode_rejects_typos(value):
+    with pytest.raises(ValidationError, match="OLLAMA_CLIENT_MODE"):
+        Settings(OLLAMA_CLIENT_MODE=value)
+
+# --- Native client ---
+
+def _client(handler) -> OllamaHTTPClient:
+    client = OllamaHTTPClient("http://ollama:11434/", max_connections=4)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+FINAL = {
+    "done": True, "done_reason": "stop", "prompt_eval_count": 12, "eval_count": 4,
+    "total_duration": 3_000_000_000, "load_duration": 1_000_000, "prompt_eval_duration": 500_000_000, "eval_duration": 2_000_000_000,
+}
+
+def test_messages_keep_their_roles():
+    messages = [SystemMessage(content="rules"), HumanMessage(content="hi"), AIMessage(content="hello"), ChatMessage(role="tool", content="42")]
+    assert to_ollama_messages(messages) == [
+        {"role": "system", "content": "rules"},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "tool", "content": "42"},
+    ]
+
+def test_chat_posts_one_request_and_reports_ollamas_stats():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        assert request.url.path == "/api/chat"
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "Hi!"}, **FINAL})
+
+    async def run():
+        client = _client(handler)
+        result = await client.chat("mistral", [{"role": "user", "content": "hi"}], options={"num_predict": 8}, keep_alive="10m")
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+    assert result.content == "Hi!"
+    assert sent == [{"model": "mistral", "stream": False, "messages": [{"role": "user", "content": "hi"}], "options": {"num_predict": 8}, "keep_alive": "10m"}]
+    stats = result.stats
+    assert (stats.prompt_tokens, stats.generated_tokens, stats.done_reason) == (12, 4, "stop")
+    assert stats.eval_duration == pytest.approx(2.0)
+    assert stats.tokens_per_second == pytest.approx(2.0)
+
+def test_chat_stream_yields_chunks_then_the_stats():
+    lines = [
+        {"message": {"content": "Hel"}, "done": False},
+        {"message": {"content": ""}, "done": False},
+        {"message": {"content": "lo"}, "done": False},
+        {"message": {"content": ""}, **FINAL},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content="\n".join(json.dumps(line) for line in lines) + "\n")
+
+    async def run():
+        client = _client(handler)
+        items = [item async for item in client.chat_stream("mistral", [{"role": "user", "content": "hi"}])]
+        await client.aclose()
+        return items
+
+    items = asyncio.run(run())
+    assert items[:2] == ["Hel", "lo"]
+    assert isinstance(items[2], GenerationStats) and items[2].generated_tokens == 4
+    assert len(items) == 3
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(404, json={"error": "model 'mistral' not found"}),
+    httpx.Response(200, content=json.dumps({"error": "out of memory"}) + "\n"),
+])
+def test_chat_stream_errors_are_raised(response):
+    async def run():
+        client = _client(lambda request: response)
+        try:
+            return [item async for item in client.chat_stream("mistral", [])]
+        finally:
+            await client.aclose()
+
+    with pytest.raises((httpx.HTTPStatusError, RuntimeError)):
+        asyncio.run(run())
+
+def test_one_pooled_http_client_serves_every_call():
+    client = OllamaHTTPClient("http://ollama:11434", max_connections=4)
+
+    async def run():
+        first = client.client
+        assert client.client is first
+        await client.aclose()
+        assert client._client is None
+
+    asyncio.run(run())
+
+def test_running_models_are_reported_by_canonical_name():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/ps"
+        return httpx.Response(200, json={"models": [{"name": "mistral"}, {"model": "llama3:8b"}]})
+
+    async def run():
+        client = _client(handler)
+        models = await client.running_models()
+        await client.aclose()
+        return models
+
+    assert asyncio.run(run()) == ["mistral:latest", "llama3:8b"]
+
+def test_the_service_sends_rendered_role_separated_messages_with_merged_options():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={"message": {"content": "Paris."}, **FINAL})
+
+    prompt = ChatPromptTemplate.from_messages([("system", "Be brief."), ("human", "{question}")])
+    service = OllamaService(pool=OllamaBackendPool([_client(handler)], probe_interval=0))
+    service.native = True
+    service.generation_options = {"temperature": 0.2, "num_ctx": 4096}
+
+    async def run():
+        answer = await service.generate_response(prompt, {"question": "Capital of France?"}, options={"num_predict": 16})
+        await service.aclose()
+        return answer
+
+    assert asyncio.run(run()) == "Paris."
+    assert sent[0]["messages"] == [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Capital of France?"}]
+    assert sent[0]["options"] == {"temperature": 0.2, "num_ctx": 4096, "num_predict": 16}
+    # The service-wide options are not changed by a per-call override
+    assert service.generation_options == {"temperature": 0.2, "num_ctx": 4096}
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.services.ollama_pool import OllamaBackendPool
+
+class FakeClient:
+    """Stands in for OllamaHTTPClient: `up` controls whether it answers, `models` what /api/ps reports."""
+
+    def __init__(self, name: str, models=(), up: bool = True):
+        self.base_url = f"http://{name}:11434"
+        self.models = list(models)
+        self.up = up
+        self.calls = 0
+
+    def _check(self):
+        if not self.up:
+            raise httpx.ConnectError(f"{self.base_url} is down")
+
+    async def running_models(self, timeout=None):
+        self._check()
+        return self.models
+
+    async def answer(self):
+        self.calls += 1
+        self._check()
+        return self.base_url
+
+    async def stream(self, fail_after=None):
+        self.calls += 1
+        self._check()
+        for i in range(3):
+            if fail_after is not None and i == fail_after:
+                raise httpx.ConnectError("connection lost")
+            yield f"{self.base_url}:{i}"
+
+    async def aclose(self):
+        pass
+
+def _pool(*clients, **kwargs) -> OllamaBackendPool:
+    # probe_interval=0: no background probing, tests probe explicitly
+    kwargs.setdefault("probe_interval", 0)
+    return OllamaBackendPool(list(clients), **kwargs)
+
+def _server_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://a:11434/api/chat")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+# --- Health ---
+
+def test_failing_probes_eject_a_backend_after_the_threshold():
+    async def run():
+        a, b = FakeClient("a", up=False), FakeClient("b")
+        pool = _pool(a, b, failure_threshold=2, eject_seconds=30)
+        backend = pool.backends[0]
+        assert not await pool.probe(backend)
+        assert not backend.ejected
+        assert not await pool.probe(backend)
+        assert backend.ejected
+        assert pool.select("mistral").url == b.base_url
+
+    asyncio.run(run())
+
+def test_a_backend_answering_probes_again_is_readmitted_after_its_ejection():
+    async def run():
+        a = FakeClient("a", models=["mistral:latest"], up=False)
+        pool = _pool(a, FakeClient("b"), failure_threshold=1, eject_seconds=30)
+        backend = pool.backends[0]
+        await pool.probe(backend)
+        assert backend.ejected
+        a.up = True
+        assert await pool.probe(backend)
+        assert backend.failures == 0
+        assert backend.loaded_models == {"mistral:latest"}
+        # Still serving its ejection period
+        assert backend.ejected
+        backend.ejected_until = time.monotonic()
+        assert not backend.ejected
+
+    asyncio.run(run())
+
+def test_server_errors_count_as_failures_but_client_errors_do_not():
+    async def run():
+        pool = _pool(FakeClient("a"), failure_threshold=2)
+        backend = pool.backends[0]
+
+        async def failing(error):
+            async def request(client):
+                raise error
+            with pytest.raises(type(error)):
+                await pool.call("mistral", request)
+
+        await failing(_server_error(404))
+        assert backend.failures == 0
+        await failing(_server_error(500))
+        await failing(_server_error(503))
+        assert backend.ejected
+        assert backend.errors == 2
+        assert backend.outstanding == 0
+
+    asyncio.run(run())
+
+def test_a_success_resets_failures_and_records_the_model():
+    async def run():
+        pool = _pool(FakeClient("a"), failure_threshold=3)
+        backend = pool.backends[0]
+        backend.failures = 2
+        await pool.call("mistral", lambda client: client.answer())
+        assert backend.failures == 0
+        assert "mistral:latest" in backend.loaded_models
+        assert pool.resident_models() == {"mistral:latest"}
+
+    asyncio.run(run())
+
+def test_when_every_backend_is_ejected_the_soonest_readmitted_is_used():
+    pool = _pool(FakeClient("a"), FakeClient("b"))
+    now = time.monotonic()
+    pool.backends[0].ejected_until = now + 60
+    pool.backends[1].ejected_until = now + 10
+    assert pool.select("mistral") is pool.backends[1]
+
+# --- Routing ---
+
+def test_calls_go_to_the_least_busy_backend():
+    pool = _pool(FakeClient("a"), FakeClient("b"))
+    pool.backends[0].outstanding = 3
+    assert pool.select("mistral") is pool.backends[1]
+
+def test_a_backend_with_the_model_loaded_is_preferred_unless_much_busier():
+    pool = _pool(FakeClient("a"), FakeClient("b"), loaded_bonus=4)
+    loaded = pool.backends[1]
+    loaded.loaded_models = {"mistral:latest"}
+    loaded.outstanding = 3
+    assert pool.select("mistral") is loaded
+    loaded.outstanding = 5
+    assert pool.select("mistral") is pool.backends[0]
+
+def test_a_conversation_stays_on_its_backend_when_it_costs_nothing():
+    async def run():
+        pool = _pool(FakeClient("a"), FakeClient("b"))
+        first = await pool.call("mistral", lambda client: client.answer(), affinity_key="conversation-1")
+        for _ in range(3):
+            assert await pool.call("mistral", lambda client: client.answer(), affinity_key="conversation-1") == first
+
+    asyncio.run(run())
+
+# --- Failover ---
+
+def test_calls_that_cannot_connect_are_retried_on_another_backend():
+    async def run():
+        a, b = FakeClient("a", up=False), FakeClient("b")
+        pool = _pool(a, b)
+        # Make the down backend the first choice
+        pool.backends[1].outstanding = 1
+        assert await pool.call("mistral", lambda client: client.answer()) == b.base_url
+        assert (a.calls, b.calls) == (1, 1)
+        assert pool.retries == 1
+        assert pool.backends[0].failures == 1
+
+    asyncio.run(run())
+
+def test_the_connect_error_is_raised_once_every_backend_was_tried():
+    async def run():
+        pool = _pool(FakeClient("a", up=False), FakeClient("b", up=False))
+        with pytest.raises(httpx.ConnectError):
+            await pool.call("mistral", lambda client: client.answer())
+        assert pool.retries == 1
+
+    asyncio.run(run())
+
+def test_streams_fail_over_only_before_anything_was_received():
+    async def run():
+        a, b = FakeClient("a", up=False), FakeClient("b")
+        pool = _pool(a, b)
+        pool.backends[1].outstanding = 1
+        chunks = [chunk async for chunk in pool.stream("mistral", lambda client: client.stream())]
+        assert chunks == [f"{b.base_url}:{i}" for i in range(3)]
+
+        # Lost mid-stream: the partial answer can't be replayed elsewhere
+        a, b = FakeClient("a"), FakeClient("b")
+        pool = _pool(a, b)
+        pool.backends[1].outstanding = 1
+        received = []
+        with pytest.raises(httpx.ConnectError):
+            async for chunk in pool.stream("mistral", lambda client: client.stream(fail_after=1)):
+                received.append(chunk)
+        assert received == [f"{a.base_url}:0"]
+        assert b.calls == 0
+
+    asyncio.run(run())
+
+def test_broadcast_reaches_every_available_backend_and_tolerates_failures():
+    async def run():
+        a, b, c = FakeClient("a"), FakeClient("b", up=False), FakeClient("c")
+        pool = _pool(a, b, c)
+        pool.backends[2].ejected_until = time.monotonic() + 60
+        assert await pool.broadcast("mistral", lambda client: client.answer()) == [a.base_url]
+        assert (a.calls, b.calls, c.calls) == (1, 1, 0)
+
+        a.up = False
+        with pytest.raises(httpx.ConnectError):
+            await pool.broadcast("mistral", lambda client: client.answer())
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.agents.admissions import AdmissionsAgent
+from app.agents.ai_expert import AIExpertAgent
+from app.agents.general import GeneralAgent
+from app.services.prefix_state import ConversationPrefixState
+
+AGENTS = [GeneralAgent, AdmissionsAgent, AIExpertAgent]
+
+def _render(agent, history, query, material):
+    """The agent's prompt for one turn, with `material` as every per-turn input (tool results, documents)."""
+    inputs = {name: material for name in agent.prompt.input_variables}
+    inputs.update(history=history, query=query)
+    return agent.prompt.format_messages(**inputs)
+
+@pytest.mark.parametrize("agent_class", AGENTS)
+def test_a_follow_up_prompt_starts_with_the_previous_prompts_history(agent_class):
+    agent = agent_class(ollama_service=None)
+    history = [{"role": "user", "content": "first question"}, {"role": "assistant", "content": "first answer"}]
+    first = _render(agent, history, "second question", "material for turn two")
+    follow_up = _render(
+        agent,
+        history + [{"role": "user", "content": "second question"}, {"role": "assistant", "content": "second answer"}],
+        "third question",
+        "different material for turn three",
+    )
+    # System prompt + history: everything before the per-turn material
+    shared = 1 + len(history)
+    assert follow_up[:shared] == first[:shared]
+    # Per-turn material only comes after the history, right before the query
+    assert all("material" not in str(message.content) for message in first[:shared])
+    assert "material for turn two" in str(first[-2].content)
+    assert first[-1].content == "second question"
+
+@pytest.mark.parametrize("agent_class", AGENTS)
+def test_the_static_prefix_is_the_fixed_system_prompt(agent_class):
+    agent = agent_class(ollama_service=None)
+    prefix = agent.static_prefix()
+    assert len(prefix) == 1
+    assert isinstance(prefix[0], SystemMessage)
+    assert "{" not in prefix[0].content
+    assert _render(agent, [], "question", "material")[0] == prefix[0]
+
+def _prompt(*texts):
+    return [SystemMessage(content="You are helpful.")] + [HumanMessage(content=text) for text in texts]
+
+def test_follow_up_turns_reuse_the_previous_prompt_up_to_the_first_change():
+    state = ConversationPrefixState(kv_capacity_tokens=10000)
+    reused, total = state.observe("c1", "mistral", _prompt("question one"))
+    assert reused == 0
+    reused, total_two = state.observe("c1", "mistral", _prompt("question one", "question two"))
+    assert reused == total
+    # An edit early in the prompt invalidates everything after it
+    reused, _ = state.observe("c1", "mistral", _prompt("question 1", "question two"))
+    _, system_tokens = ConversationPrefixState().observe("x", "mistral", _prompt())
+    assert reused == system_tokens
+    # Another model has its own KV cache
+    assert state.observe("c1", "llama3", _prompt("question 1", "question two"))[0] == 0
+
+def test_new_conversations_reuse_the_shared_system_prompt():
+    state = ConversationPrefixState()
+    system = _prompt()
+    state.mark_shared("mistral", system)
+    reused, _ = state.observe("new", "mistral", _prompt("hello"))
+    assert reused == state.observe("other", "mistral", system)[1]
+    assert state.observe("third", "mistral", [SystemMessage(content="Another agent.")])[0] == 0
+
+def test_conversations_beyond_the_kv_capacity_are_treated_as_evicted():
+    state = ConversationPrefixState(kv_capacity_tokens=100)
+    long_text = "word " * 30
+    state.observe("c1", "mistral", _prompt(long_text))
+    state.observe("c2", "mistral", _prompt(long_text))
+    state.observe("c3", "mistral", _prompt(long_text))
+    assert len(state) < 3
+    assert state.evictions >= 1
+    # The evicted conversation's next turn is evaluated again (beyond the shared system prompt)
+    reused, total = state.observe("c1", "mistral", _prompt(long_text, "more"))
+    assert 0 < reused < total // 2
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.vector_store_service import VectorStoreService
+from app.vectorstores.base_store import BaseVectorStore
+
+class TableEmbeddings(Embeddings):
+    """Looks embeddings up in a table; counts the queries it had to embed."""
+
+    VECTORS: Dict[str, List[float]] = {
+        "how do i apply?": [1.0, 0.0, 0.0],
+        "what is the application process?": [0.97, 0.2, 0.0], # cosine ~0.98 to the above
+        "when are the deadlines?": [0.6, 0.8, 0.0], # cosine 0.6
+        "what is a neural network?": [0.0, 0.0, 1.0],
+    }
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self.VECTORS[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+class KnowledgeStore(BaseVectorStore):
+    """Accepts documents without indexing them (only the knowledge version matters here)."""
+
+    def add_documents(self, documents):
+        pass
+
+    def similarity_search(self, query, k=4):
+        return []
+
+    def save_local(self, path):
+        pass
+
+    def load_local(self, path):
+        pass
+
+def test_paraphrases_hit_and_other_queries_miss():
+    cache = SemanticAnswerCache(TableEmbeddings(), threshold=0.9)
+
+    async def run():
+        await cache.store("how do i apply?", "AdmissionsAgent", "Apply online.")
+        hit = await cache.lookup("what is the application process?", "AdmissionsAgent")
+        assert hit["answer"] == "Apply online."
+        assert hit["matched_query"] == "how do i apply?"
+        assert hit["similarity"] > 0.9
+        # Related but below the threshold
+        assert await cache.lookup("when are the deadlines?", "AdmissionsAgent") is None
+        assert await cache.lookup("what is a neural network?", "AdmissionsAgent") is None
+        # Answers are kept per agent
+        assert await cache.lookup("how do i apply?", "GeneralAgent") is None
+
+    asyncio.run(run())
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_a_given_embedding_is_used_instead_of_embedding_again():
+    embeddings = TableEmbeddings()
+    cache = SemanticAnswerCache(embeddings, threshold=0.9)
+
+    async def run():
+        await cache.store("how do i apply?", "AdmissionsAgent", "Apply online.", embedding=[1.0, 0.0, 0.0])
+        hit = await cache.lookup("anything", "AdmissionsAgent", embedding=[2.0, 0.1, 0.0])
+        assert hit["answer"] == "Apply online."
+
+    asyncio.run(run())
+    assert embeddings.calls == 0
+
+def test_new_knowledge_invalidates_cached_answers():
+    vector_store = VectorStoreService(KnowledgeStore())
+    cache = SemanticAnswerCache(TableEmbeddings(), threshold=0.9, version_fn=vector_store.knowledge_version)
+
+    async def run():
+        await cache.store("how do i apply?", "AdmissionsAgent", "Apply online.")
+        assert await cache.lookup("how do i apply?", "AdmissionsAgent") is not None
+        await vector_store.aadd_documents([("Applications now close in May.", {"source": "news"})])
+        assert await cache.lookup("how do i apply?", "AdmissionsAgent") is None
+        # Answers stored after the change are served again
+        await cache.store("how do i apply?", "AdmissionsAgent", "Apply online before May.")
+        hit = await cache.lookup("what is the application process?", "AdmissionsAgent")
+        assert hit["answer"] == "Apply online before May."
+
+    asyncio.run(run())
+    assert cache.invalidations == 1
+
+def test_entries_expire_and_the_oldest_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(TableEmbeddings(), threshold=0.9, max_entries_per_agent=2, ttl_seconds=60)
+
+    async def run():
+        await cache.store("how do i apply?", "AdmissionsAgent", "Apply online.")
+        await cache.store("when are the deadlines?", "AdmissionsAgent", "In May.")
+        await cache.store("what is a neural network?", "AdmissionsAgent", "A model.")
+        # Capacity 2: the first answer was evicted
+        assert await cache.lookup("how do i apply?", "AdmissionsAgent") is None
+        assert (await cache.lookup("when are the deadlines?", "AdmissionsAgent"))["answer"] == "In May."
+        now[0] += 61
+        assert await cache.lookup("what is a neural network?", "AdmissionsAgent") is None
+        assert cache.stats()["entries"] == {"AdmissionsAgent": 1}
+
+    asyncio.run(run())
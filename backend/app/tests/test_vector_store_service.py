@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+# Go up two levels from test dir to get 'backend' dir
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, backend_dir)
+
+from app.services.vector_store_service import VectorStoreService
+from app.vectorstores.base_store import BaseVectorStore
+
+class TextOnlyStore(BaseVectorStore):
+    """A store implementing only the required methods (no search by vector)."""
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def add_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
+        pass
+
+    def similarity_search(self, query: str, k: int = 4):
+        self.queries.append(query)
+        return [(Document(page_content=f"about {query}"), 0.1)]
+
+    def save_local(self, path: str):
+        pass
+
+    def load_local(self, path: str):
+        pass
+
+class VectorStore(TextOnlyStore):
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4):
+        return [(Document(page_content="by vector"), 0.1)]
+
+def test_stores_report_whether_they_search_by_vector():
+    assert not VectorStoreService(TextOnlyStore()).supports_search_by_vector
+    assert VectorStoreService(VectorStore()).supports_search_by_vector
+
+def test_search_by_vector_falls_back_to_the_query_text():
+    store = TextOnlyStore()
+    service = VectorStoreService(store)
+    documents = asyncio.run(service.asearch_by_vector([0.1, 0.2], k=3, query="admissions"))
+    assert [doc.page_content for doc in documents] == ["about admissions"]
+    assert store.queries == ["admissions"]
+
+def test_search_by_vector_uses_the_vector_when_supported():
+    documents = asyncio.run(VectorStoreService(VectorStore()).asearch_by_vector([0.1, 0.2], query="admissions"))
+    assert [doc.page_content for doc in documents] == ["by vector"]
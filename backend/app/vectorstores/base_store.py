@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List, Tuple, Any, Dict
 
@@ -31,6 +32,37 @@ class BaseVectorStore(ABC):
         """
         pass
 
+    async def aadd_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Async version of add_documents. The default runs it in a worker thread;
+        implementations should override it to use their own executor.
+        """
+        await asyncio.to_thread(self.add_documents, documents)
+
+    async def asimilarity_search(self, query: str, k: int = 4) -> List[Tuple[Any, float]]:
+        """
+        Async version of similarity_search, safe to call from request handlers
+        (embedding and search never run on the event loop).
+        """
+        return await asyncio.to_thread(self.similarity_search, query, k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Any, float]]:
+        """
+        Same as similarity_search, for a query that has already been embedded (with the
+        store's embedding function). Optional for implementations: callers check
+        supports_search_by_vector and search by text otherwise.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support search by vector.")
+
+    @property
+    def supports_search_by_vector(self) -> bool:
+        """True if the implementation provides similarity_search_by_vector."""
+        return type(self).similarity_search_by_vector is not BaseVectorStore.similarity_search_by_vector
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Any, float]]:
+        """Async version of similarity_search_by_vector."""
+        return await asyncio.to_thread(self.similarity_search_by_vector, embedding, k)
+
     @abstractmethod
     def save_local(self, path: str):
         """Saves the vector store index to a local path."""
@@ -1,15 +1,22 @@
 # backend/app/vectorstores/faiss_store.py
+import asyncio
 import os
-from typing import List, Tuple, Any, Dict, Optional
+import threading
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple, Any, Dict, Optional
 import faiss # Import faiss directly if needed for specific index types
 from sentence_transformers import SentenceTransformer # Use directly for embedding
 from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings # Import base class for type hint
 
 from app.vectorstores.base_store import BaseVectorStore
+from app.vectorstores.mmap_docstore import MmapDocstore, PositionIds
 from app.core.logger import logger
 from app.core.config import settings
+from app.core.concurrency import run_inference
 
 # Helper class to wrap SentenceTransformer for LangChain compatibility if needed,
 # although FAISS.from_texts/FAISS.load_local directly accept sentence_transformers models.
@@ -35,17 +42,48 @@ class SentenceTransformerEmbeddings(Embeddings):
         logger.debug("Finished embedding query.")
         return embedding
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds documents on the bounded inference executor."""
+        return await run_inference(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embeds a query on the bounded inference executor."""
+        return await run_inference(self.embed_query, text)
+
+# Read the index through mmap and never write it back. IO_FLAG_MMAP alone only maps
+# inverted lists; IO_FLAG_MMAP_IFC (FAISS >= 1.11) also maps flat indexes' vectors, which
+# is what lets workers share our IndexFlatL2 instead of each reading a private copy.
+MMAP_IFC_FLAG: Optional[int] = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+MMAP_READ_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | (MMAP_IFC_FLAG or 0)
+
 class FAISSVectorStore(BaseVectorStore):
     """FAISS implementation of the vector store."""
 
-    def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2"):
-        self.embedding_function = SentenceTransformerEmbeddings(model_name=embedding_model_name)
+    def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2", embedding_function: Optional[Embeddings] = None, mmap_mode: Optional[bool] = None):
+        # Reuse a shared embedding model when one is injected (e.g. by the ServiceContainer)
+        # so the SentenceTransformer weights are only loaded once per process.
+        self.embedding_function = embedding_function or SentenceTransformerEmbeddings(model_name=embedding_model_name)
         self.index: Optional[FAISS] = None
         self.index_path = settings.VECTOR_STORE_PATH
+        # Read-only serving mode: index and documents are memory-mapped and shared
+        # between worker processes through the page cache
+        self.mmap_mode = settings.VECTOR_STORE_MMAP if mmap_mode is None else mmap_mode
+        self.read_only = False
+        # Serializes writers. Searches run concurrently on the inference executor without a
+        # lock: writers change a copy of the index and swap it in (see add_documents)
+        self._write_lock = asyncio.Lock()
+        # Makes "read self.index and register as its reader" atomic with respect to _swap
+        self._swap_lock = threading.Lock()
         self.load_local(str(self.index_path)) # Attempt to load existing index on init
 
     def add_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
-        """Adds text documents with metadata to the FAISS index."""
+        """
+        Adds text documents with metadata to the FAISS index.
+
+        The documents are added to a copy of the index, which is saved and then swapped in
+        with a single reference assignment: searches running meanwhile keep using the index
+        they started with and never see it half-updated.
+        """
         if not documents:
             logger.warning("No documents provided to add.")
             return
@@ -54,11 +92,12 @@ class FAISSVectorStore(BaseVectorStore):
         # Convert tuples to LangChain Document objects
         lc_documents = [Document(page_content=text, metadata=meta) for text, meta in documents]
 
-        if self.index is None:
+        store = self._writable_copy()
+        if store is None:
             logger.info("Creating new FAISS index.")
             # Use class method from_documents to create index if it doesn't exist
             try:
-                 self.index = FAISS.from_documents(
+                 store = FAISS.from_documents(
                      documents=lc_documents,
                      embedding=self.embedding_function
                  )
@@ -72,43 +111,132 @@ class FAISSVectorStore(BaseVectorStore):
                 # Extract texts and metadata for add_documents method
                 texts = [doc.page_content for doc in lc_documents]
                 metadatas = [doc.metadata for doc in lc_documents]
-                # TODO: Check if FAISS add_documents supports async or requires sync execution
-                # For simplicity, using sync add_texts here. Consider running in thread pool if blocking.
-                self.index.add_texts(texts=texts, metadatas=metadatas)
+                store.add_texts(texts=texts, metadatas=metadatas)
                 logger.info("Successfully added documents to FAISS index.")
             except Exception as e:
                 logger.exception(f"Error adding documents to FAISS index: {e}")
                 raise
 
         # Persist index after adding documents
-        self.save_local(str(self.index_path))
+        self._save(store, str(self.index_path))
+        # Back to the shared, memory-mapped copy of what was just written in mmap mode
+        mapped = self._open_mmap(str(self.index_path)) if self.mmap_mode else None
+        if mapped is not None:
+            self._swap(mapped, read_only=True)
+        else:
+            self._swap(store, read_only=False)
+
+    def _writable_copy(self) -> Optional[FAISS]:
+        """A private, modifiable copy of the current index (None when there is no index yet)."""
+        current = self.index
+        if current is None:
+            return None
+        if self.read_only:
+            # The mmapped index can't be modified; read a writable copy from disk
+            logger.info("Loading a writable copy of the memory-mapped FAISS index to add documents.")
+            return self._read_writable(str(self.index_path))
+        return FAISS(
+            embedding_function=self.embedding_function,
+            index=faiss.clone_index(current.index),
+            docstore=InMemoryDocstore(dict(current.docstore._dict)),
+            index_to_docstore_id=dict(current.index_to_docstore_id),
+        )
 
     def similarity_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
         """Performs similarity search with scores."""
-        if self.index is None:
-            logger.error("FAISS index is not loaded or initialized.")
-            return []
+        # A concurrent add swaps in a new index, never edits this one
+        with self._reading() as index:
+            if index is None:
+                logger.error("FAISS index is not loaded or initialized.")
+                return []
+
+            logger.debug(f"Performing similarity search for query: '{query}' with k={k}")
+            try:
+                # Use similarity_search_with_score for better results handling
+                results_with_scores = index.similarity_search_with_score(query, k=k)
+                logger.debug(f"Found {len(results_with_scores)} similar documents.")
+                # results_with_scores is List[Tuple[Document, float]]
+                return results_with_scores
+            except Exception as e:
+                logger.exception(f"Error during similarity search: {e}")
+                return []
 
-        logger.debug(f"Performing similarity search for query: '{query}' with k={k}")
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """Similarity search with scores for an already-embedded query (skips the encode)."""
+        with self._reading() as index:
+            if index is None:
+                logger.error("FAISS index is not loaded or initialized.")
+                return []
+            try:
+                return index.similarity_search_with_score_by_vector(embedding, k=k)
+            except Exception as e:
+                logger.exception(f"Error during similarity search by vector: {e}")
+                return []
+
+    @contextmanager
+    def _reading(self) -> Iterator[Optional[FAISS]]:
+        """
+        The current index, held for the duration of a search: a memory-mapped docstore
+        replaced meanwhile is only closed once its last search has finished.
+        """
+        with self._swap_lock:
+            index = self.index
+            docstore = index.docstore if index is not None and isinstance(index.docstore, MmapDocstore) else None
+            if docstore is not None:
+                docstore.acquire()
         try:
-            # Use similarity_search_with_score for better results handling
-            results_with_scores = self.index.similarity_search_with_score(query, k=k)
-            logger.debug(f"Found {len(results_with_scores)} similar documents.")
-            # results_with_scores is List[Tuple[Document, float]]
-            return results_with_scores
-        except Exception as e:
-            logger.exception(f"Error during similarity search: {e}")
-            return []
+            yield index
+        finally:
+            if docstore is not None:
+                docstore.release()
+
+    def _swap(self, store: Optional[FAISS], read_only: bool):
+        """Makes `store` the index searches use; a replaced mmap docstore closes when its searches finish."""
+        with self._swap_lock:
+            old, self.index = self.index, store
+            self.read_only = read_only
+        if old is not None and old is not store and isinstance(old.docstore, MmapDocstore):
+            old.docstore.retire()
+
+    async def aadd_documents(self, documents: List[Tuple[str, Dict[str, Any]]]):
+        """Adds documents (embedding, index update and save) on the inference executor, one writer at a time."""
+        async with self._write_lock:
+            await run_inference(self.add_documents, documents)
+
+    async def asimilarity_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Query embedding and FAISS search on the bounded inference executor."""
+        return await run_inference(self.similarity_search, query, k)
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """FAISS search for an already-embedded query on the bounded inference executor."""
+        return await run_inference(self.similarity_search_by_vector, embedding, k)
 
     def save_local(self, path: str):
         """Saves the FAISS index and embeddings to a local folder."""
-        if self.index:
+        if self.read_only:
+            logger.warning("FAISS index is memory-mapped read-only; nothing to save.")
+            return
+        self._save(self.index, path)
+
+    def _save(self, store: Optional[FAISS], path: str):
+        """Writes `store` to `path`, replacing the files other workers may be reading atomically."""
+        if store:
             # Ensure path uses OS-specific separators if needed, though LangChain usually handles it
             # index_file = os.path.join(path, "index.faiss")
             logger.info(f"Saving FAISS index to path: {path}")
             try:
-                # LangChain's save_local saves index and embeddings (docstore.pkl)
-                self.index.save_local(folder_path=path)
+                # LangChain's save_local saves index and embeddings (docstore.pkl).
+                # Written to a temp dir and renamed into place: other workers may have the
+                # current index.faiss memory-mapped, and truncating it under them would crash them.
+                os.makedirs(path, exist_ok=True)
+                tmp_dir = tempfile.mkdtemp(dir=path, prefix=".save-")
+                store.save_local(folder_path=tmp_dir)
+                for name in ("index.faiss", "index.pkl"):
+                    os.replace(os.path.join(tmp_dir, name), os.path.join(path, name))
+                os.rmdir(tmp_dir)
+                # Keep the memory-mappable copy of the documents in sync for read-only serving
+                with MmapDocstore.export_lock(path):
+                    MmapDocstore.write(path, self._ordered_documents(store))
                 logger.info("FAISS index saved successfully.")
             except Exception as e:
                 logger.exception(f"Error saving FAISS index to {path}: {e}")
@@ -116,23 +244,82 @@ class FAISSVectorStore(BaseVectorStore):
             logger.warning("Attempted to save an empty or non-existent FAISS index.")
 
     def load_local(self, path: str):
-        """Loads the FAISS index and embeddings from a local folder."""
-        # index_file = os.path.join(path, "index.faiss")
+        """Loads the FAISS index from a local folder (memory-mapped read-only when mmap_mode is on)."""
+        mapped = self._open_mmap(path) if self.mmap_mode else None
+        if mapped is not None:
+            self._swap(mapped, read_only=True)
+        else:
+            self._swap(self._read_writable(path), read_only=False)
+
+    def _open_mmap(self, path: str) -> Optional[FAISS]:
+        """
+        Opens index.faiss with FAISS memory-mapping and the documents from the mmap docstore,
+        so N workers share one copy in the page cache. Returns None if it cannot (the
+        caller then falls back to the regular private load).
+        """
+        index_file = os.path.join(path, "index.faiss")
+        if not os.path.exists(index_file):
+            return None
+        if not MmapDocstore.is_current(path, index_file):
+            with MmapDocstore.export_lock(path):
+                # Another worker may have exported it while this one waited for the lock
+                if not MmapDocstore.is_current(path, index_file):
+                    # Index was written by an older version (or re-ingested without the mmap file): export once
+                    logger.info(f"Exporting FAISS docstore to the memory-mappable format in {path}...")
+                    store = self._read_writable(path)
+                    if store is None:
+                        return None
+                    MmapDocstore.write(path, self._ordered_documents(store))
+        docstore = None
+        try:
+            faiss_index = faiss.read_index(index_file, MMAP_READ_FLAGS)
+            docstore = MmapDocstore(path)
+            if docstore.count != faiss_index.ntotal:
+                raise ValueError(f"docstore has {docstore.count} documents but the index has {faiss_index.ntotal} vectors")
+            mapped = FAISS(
+                embedding_function=self.embedding_function,
+                index=faiss_index,
+                docstore=docstore,
+                index_to_docstore_id=PositionIds(docstore.count),
+            )
+            if MMAP_IFC_FLAG is None:
+                # Documents are still shared; the vectors are not
+                logger.warning(
+                    f"FAISS {faiss.__version__} has no IO_FLAG_MMAP_IFC: the index vectors in {path} are read into "
+                    f"each worker's private memory ({faiss_index.ntotal} vectors), only the docstore is shared. "
+                    "Upgrade faiss-cpu to 1.11 or newer to share them."
+                )
+            else:
+                logger.info(f"FAISS index memory-mapped read-only from {path} ({faiss_index.ntotal} vectors).")
+            return mapped
+        except Exception as e:
+            if docstore is not None:
+                docstore.close()
+            logger.exception(f"Could not memory-map FAISS index from {path}, loading it into memory instead: {e}")
+            return None
+
+    @staticmethod
+    def _ordered_documents(store: FAISS) -> List[Document]:
+        """The store's documents in FAISS row order (the order the mmap docstore uses)."""
+        return [store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)]
+
+    def _read_writable(self, path: str) -> Optional[FAISS]:
+        """The FAISS index saved in `path`, read into private memory (None if missing or unreadable)."""
         # Check if the path and essential files exist
         if os.path.isdir(path) and os.path.exists(os.path.join(path, "index.faiss")) and os.path.exists(os.path.join(path, "index.pkl")):
             logger.info(f"Loading FAISS index from path: {path}")
             try:
                 # FAISS.load_local requires the embedding function
-                self.index = FAISS.load_local(
+                store = FAISS.load_local(
                     folder_path=path,
                     embeddings=self.embedding_function,
                     # Allow dangerous deserialization if using older pickle formats (use with caution)
                     allow_dangerous_deserialization=True
                 )
                 logger.info("FAISS index loaded successfully.")
+                return store
             except Exception as e:
                 logger.exception(f"Error loading FAISS index from {path}: {e}")
-                self.index = None # Ensure index is None if loading fails
-        else:
-            logger.warning(f"FAISS index path not found or incomplete: {path}. Index not loaded.")
-            self.index = None 
\ No newline at end of file
+                return None
+        logger.warning(f"FAISS index path not found or incomplete: {path}. Index not loaded.")
+        return None
@@ -0,0 +1,185 @@
+# backend/app/vectorstores/mmap_docstore.py
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Iterator, List, Union
+
+try:
+    import fcntl
+except ImportError: # Windows: exports are still atomic, just not deduplicated across workers
+    fcntl = None
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+from app.core.logger import logger
+
+# File written next to index.faiss / index.pkl
+DOCSTORE_FILE = "docstore.mmap"
+# Held while a process exports the docstore, so concurrent workers export it only once
+DOCSTORE_LOCK_FILE = ".docstore.lock"
+# Trailer: magic, then the number of documents
+_TRAILER = struct.Struct("<8sq")
+_MAGIC = b"MMDOCS01"
+
+class MmapDocstore(Docstore):
+    """
+    Read-only docstore backed by memory-mapped files, for serving a FAISS index from
+    several worker processes without each one unpickling its own copy of index.pkl.
+
+    Documents are stored in FAISS row order in one file (docstore.mmap): the concatenated
+    JSON records, then an int64 array of their byte offsets, then a trailer holding the
+    document count. The file is opened with mmap, so the pages are shared through the OS
+    page cache and only the records actually returned by a search are ever decoded.
+    Records and offsets live in the same file so that replacing it swaps both at once.
+    Document IDs are the FAISS row positions as strings (see PositionIds).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(os.path.join(path, DOCSTORE_FILE), "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._data)
+        if size < _TRAILER.size:
+            self.close()
+            raise ValueError(f"{DOCSTORE_FILE} in {path} is truncated.")
+        magic, count = _TRAILER.unpack_from(self._data, size - _TRAILER.size)
+        offsets_start = size - _TRAILER.size - 8 * (count + 1)
+        if magic != _MAGIC or count < 0 or offsets_start < 0:
+            self.close()
+            raise ValueError(f"{DOCSTORE_FILE} in {path} is not a valid mmap docstore.")
+        self._offsets = np.frombuffer(self._data, dtype="<i8", count=count + 1, offset=offsets_start)
+        self.count = count
+        # Searches currently reading the mapping; a retired store closes when the last one ends
+        self._readers = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Returns the document at FAISS row `search`, or an error string like InMemoryDocstore."""
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= position < self.count:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._data[start:end].decode("utf-8"))
+        return Document(page_content=record["page_content"], metadata=record.get("metadata") or {}, id=record.get("id"))
+
+    def add(self, texts):
+        raise NotImplementedError("MmapDocstore is read-only; add documents through a writable FAISS store.")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("MmapDocstore is read-only.")
+
+    def acquire(self):
+        """Registers a search reading this store (it won't be closed until release())."""
+        with self._lock:
+            self._readers += 1
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            close = self._retired and self._readers == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Closes the store once no search is reading it (it has been replaced by a newer one)."""
+        with self._lock:
+            self._retired = True
+            close = self._readers == 0
+        if close:
+            self.close()
+
+    def close(self):
+        # The offsets view pins the mmap; it must go first
+        self._offsets = None
+        if isinstance(getattr(self, "_data", None), mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, documents: List[Document]):
+        """
+        Writes `documents` (in FAISS row order) in the mmap format. The file is written to a
+        per-process temporary and renamed into place, so readers (and concurrent writers)
+        only ever see a complete store; readers that mapped the old file keep their copy.
+        """
+        offsets = np.zeros(len(documents) + 1, dtype="<i8")
+        fd, tmp_path = tempfile.mkstemp(dir=path, prefix=".docstore-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                position = 0
+                for i, doc in enumerate(documents):
+                    record = {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+                    encoded = json.dumps(record, ensure_ascii=False, default=str).encode("utf-8")
+                    f.write(encoded)
+                    position += len(encoded)
+                    offsets[i + 1] = position
+                f.write(offsets.tobytes())
+                f.write(_TRAILER.pack(_MAGIC, len(documents)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(path, DOCSTORE_FILE))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        logger.info(f"Wrote memory-mappable docstore with {len(documents)} documents to {path}")
+
+    @staticmethod
+    @contextmanager
+    def export_lock(path: str):
+        """
+        Exclusive lock held while exporting the docstore into `path`. Workers starting
+        together wait for the first one's export instead of each writing their own.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(path, DOCSTORE_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def is_current(path: str, index_file: str) -> bool:
+        """True if the mmap docstore exists and was written after the FAISS index file."""
+        try:
+            return os.path.getmtime(os.path.join(path, DOCSTORE_FILE)) >= os.path.getmtime(index_file)
+        except OSError:
+            return False
+
+
+class PositionIds(Mapping):
+    """
+    FAISS row -> docstore ID mapping for MmapDocstore (the ID is the row itself), so no
+    per-process dict of every ID needs to be built or unpickled.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, position) -> str:
+        position = int(position)
+        if not 0 <= position < self.count:
+            raise KeyError(position)
+        return str(position)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.count))